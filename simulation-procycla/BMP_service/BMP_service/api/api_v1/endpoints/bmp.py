@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, HTTPException
 from BMP_service.core.schemas.substrate import SubstrateList
 from BMP_service.core.schemas.bmp_result import BMPResultList
-from BMP_service.core.services.bmp_service import BMPService
+from BMP_service.core.services.bmp_service import fit_substrates
+from BMP_service.core.exceptions.executor_exception import ExecutorBusyException, ExecutorUnavailableException
+from BMP_service.core.settings import settings
 
 router = APIRouter()
+RETRY_AFTER = settings.config.get('execution', "retry-after")
 
 @router.post("/run")
-async def run_bmp(data: SubstrateList, bmp_service: BMPService = Depends(BMPService)) -> BMPResultList:
+async def run_bmp(data: SubstrateList) -> BMPResultList:
     try:
-        result = bmp_service.run_bmp(data=data)
+        result = await fit_substrates(data)
         return result
+    except ExecutorBusyException as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={'Retry-After': RETRY_AFTER})
+    except ExecutorUnavailableException as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': RETRY_AFTER})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,9 @@
+class ExecutorBusyException(Exception):
+     
+     def __init__(self, message):            
+        super().__init__(message)
+
+class ExecutorUnavailableException(Exception):
+     
+     def __init__(self, message):            
+        super().__init__(message)
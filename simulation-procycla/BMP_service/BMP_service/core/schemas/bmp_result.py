@@ -1,5 +1,10 @@
-from pydantic import BaseModel
-from typing import List
+from math import isfinite
+from pydantic import BaseModel, validator
+from typing import List, Optional
+
+def finite_or_none(value):
+    # a perfect fit has an infinite information criterion, which JSON cannot carry
+    return value if value is None or isfinite(value) else None
 
 class Energy(BaseModel):
     name: str
@@ -24,6 +29,8 @@ class Parameter(BaseModel):
     value: float
     ci_inf: float = None
     ci_sup: float = None
+    # method that produced ci_inf and ci_sup, None when there is no interval
+    ci_method: Optional[str]
     se: float
     covar_list: List[Covariance]
 
@@ -31,6 +38,20 @@ class ParameterList(BaseModel):
     status_code: int
     params: List[Parameter]
 
+class ModelFit(BaseModel):
+    model: str
+    status_code: int
+    predicted_values: List[float]
+    params: ParameterList
+    metrics: MetricList
+    energy: List[Energy]
+    # information criteria of the fit, None when it failed or is not finite
+    aic: Optional[float]
+    bic: Optional[float]
+    error: Optional[str]
+
+    _criteria = validator('aic', 'bic', pre=True, allow_reuse=True)(finite_or_none)
+
 class BMPResultBase(BaseModel):
     status_code: int
     name: str
@@ -39,6 +60,16 @@ class BMPResultBase(BaseModel):
     params: ParameterList
     metrics: MetricList
     energy: List[Energy]
+    # set when the fit of this substrate failed, its other results are then empty
+    error: Optional[str]
+    # kinetic model of this fit, the best ranked when several were selected
+    model: Optional[str]
+    aic: Optional[float]
+    bic: Optional[float]
+    # fits of every selected model, best first, when there are several
+    ranking: List[ModelFit] = []
+
+    _criteria = validator('aic', 'bic', pre=True, allow_reuse=True)(finite_or_none)
 
 class BMPResultList(BaseModel):
     status_code: int
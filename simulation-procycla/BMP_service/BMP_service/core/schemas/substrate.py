@@ -1,5 +1,16 @@
-from pydantic import BaseModel
-from typing import List
+from enum import Enum
+from pydantic import BaseModel, validator
+from typing import List, Optional
+from BMP_service.core.simulation.models import MODELS
+
+class CIMethod(str, Enum):
+    asymptotic = 'asymptotic'
+    profile = 'profile'
+    parallel_profile = 'parallel-profile'
+
+class Criterion(str, Enum):
+    aic = 'aic'
+    bic = 'bic'
 
 class SubstrateBase(BaseModel):
     name: str
@@ -9,4 +20,20 @@ class SubstrateList(BaseModel):
     flow: float
     volatile_solid: float
     time: List[float]
-    substrates: List[SubstrateBase]
\ No newline at end of file
+    substrates: List[SubstrateBase]
+    # method of the parameter intervals, the [confidence-interval] default when not given
+    ci_method: Optional[CIMethod]
+    # kinetic models fitted to every substrate, first-order only when not given
+    models: Optional[List[str]]
+    # information criterion the models of a substrate are ranked by
+    criterion: Criterion = Criterion.aic
+
+    @validator('models')
+    def known_models(cls, v):
+        if v is not None:
+            unknown = [name for name in v if name not in MODELS]
+            if unknown or not v:
+                raise ValueError("models must be a non-empty list of {}, got {}".format(list(MODELS), unknown))
+            # a model selected twice is fitted once
+            v = list(dict.fromkeys(v))
+        return v
@@ -1,119 +1,172 @@
-from BMP_service.core.simulation.optimizer import Optimizer
-from BMP_service.core.simulation.models.po import PO
+from BMP_service.core.simulation.optimizer import Optimizer, PARALLEL_PROFILE
+from BMP_service.core.simulation.models import MODELS, FIRST_ORDER
 from BMP_service.core.schemas.bmp_result import BMPResultList
 from BMP_service.core.settings import settings
+from BMP_service.core.services.executor import executor
+from BMP_service.core.services.rules import rules
 from BMP_service.core.exceptions.bmp_exception import BMPException
-import configparser
-from fastapi import Depends
+from BMP_service.core.exceptions.executor_exception import ExecutorUnavailableException
+import asyncio
 import numpy as np
 
+CI_METHOD = settings.config.get('confidence-interval', "method")
+
+def fit_substrate_process(data, index, model_name, ci_method, ci=None):
+    """Process pool entry point: the fit of model_name to data.substrates[index]."""
+    return bmp_service.fit_substrate(data, data.substrates[index], model_name, ci_method, ci)
+
+def profile_parameter_process(data, index, model_name, name):
+    """Process pool entry point: the profile interval of one parameter of model_name for data.substrates[index]."""
+    substrate = data.substrates[index]
+    return bmp_service.optimizers[model_name].profile_parameter(data.time, substrate.values, name)
+
+async def profile_fits(data, fits):
+    """
+    Profile intervals of every parameter of every (substrate index, model
+    name) of fits for parallel-profile, one pool task each. A fit with a
+    failed profile gets None and is computed with the profile method instead.
+    """
+    tasks = [(data, index, model_name, name) for index, model_name in fits for name in bmp_service.optimizers[model_name].base_model.param_names]
+    futures = executor.submit_all(profile_parameter_process, tasks)
+    results = await asyncio.gather(*(executor.wait(future) for future in futures), return_exceptions=True)
+
+    cis = {fit: {} for fit in fits}
+    for (_, index, model_name, name), result in zip(tasks, results):
+        if isinstance(result, ExecutorUnavailableException):
+            raise result
+        if cis[(index, model_name)] is not None and not isinstance(result, Exception):
+            cis[(index, model_name)][name] = result
+        else:
+            cis[(index, model_name)] = None
+    return [cis[fit] for fit in fits]
+
+async def fit_substrates(data):
+    """
+    Fits the selected models to the substrates of data concurrently, one
+    pool task per substrate and model, and gathers their results in input
+    order. A fit that fails gets status_code 1 and its error, the others are
+    returned as usual. With several models each substrate gets the fit that
+    ranks first by data.criterion and the ranking of all of them. With
+    parallel-profile the profiles of the parameters are computed first, in
+    tasks of their own.
+    """
+    ci_method = data.ci_method.value if data.ci_method is not None else CI_METHOD
+    model_names = data.models or [FIRST_ORDER]
+    fits = [(index, model_name) for index in range(len(data.substrates)) for model_name in model_names]
+    cis = [None]*len(fits)
+    if ci_method == PARALLEL_PROFILE:
+        cis = await profile_fits(data, fits)
+    futures = executor.submit_all(fit_substrate_process, [(data, index, model_name, ci_method, ci) for (index, model_name), ci in zip(fits, cis)])
+    results = await asyncio.gather(*(executor.wait(future) for future in futures), return_exceptions=True)
+
+    # the fits of each model are checked together, across the substrates
+    checked = {}
+    model_fits = {}
+    for fit, result in zip(fits, results):
+        if isinstance(result, ExecutorUnavailableException):
+            raise result
+        if isinstance(result, Exception):
+            checked[fit] = dict(failed_substrate(data.substrates[fit[0]], result), model=fit[1])
+        else:
+            model_fits.setdefault(fit[1], []).append((fit, result))
+    for fits_results in model_fits.values():
+        substrates = [data.substrates[index] for (index, _), _ in fits_results]
+        checked.update(zip((fit for fit, _ in fits_results), bmp_service.check_fits(data, substrates, [result for _, result in fits_results])))
+
+    substrate_fits = [[] for _ in data.substrates]
+    for index, model_name in fits:
+        substrate_fits[index].append(checked[(index, model_name)])
+
+    result_list = [rank_models(results, data.criterion.value) for results in substrate_fits]
+    final_status_code = 1 if any(result['status_code'] == 1 for result in result_list) else 0
+    return BMPResultList.parse_obj({'status_code': final_status_code, 'time': data.time, 'substrates': result_list})
+
+def rank_models(results, criterion):
+    """
+    Result of the model ranking first by criterion ('aic' or 'bic'), with
+    the ranking when there are several. Criteria are compared as floats, so a
+    perfect fit (-inf) ranks first; failed fits and NaN criteria rank last.
+    """
+    def key(result):
+        value = result.get(criterion)
+        missing = value is None or np.isnan(value)
+        return (missing, 0 if missing else value)
+
+    ranking = sorted(results, key=key)
+    best = dict(ranking[0])
+    if len(ranking) > 1:
+        best['ranking'] = ranking
+    return best
+
+def failed_substrate(substrate, error):
+    return {'status_code': 1, 'name': substrate.name, 'values': substrate.values, 'predicted_values': [],
+            'params': {'status_code': 1, 'params': []}, 'metrics': {'status_code': 1, 'metrics': []}, 'energy': [], 'error': str(error)}
+
 class BMPService:
+    """
+    Fits and checks of the BMP substrates. The optimizers of the models and
+    the rule table are built once per process and shared by every request:
+    the workers fit (fit_substrate), the API process checks the fits of a
+    request against the thresholds all at once (check_fits).
+    """
+
+    def __init__(self, config, rules):
+        self.optimizers = {}
+        for model_name, model in MODELS.items():
+            self.optimizers[model_name] = Optimizer()
+            self.optimizers[model_name].init(model())
+        self.rules = rules
+        self.pc_biogas_inf = float(config['energy']['pc-biogas-inf'])
+        self.r_chp_caldera = float(config['energy']['r-chp-caldera'])
+        self.r_chp_motor = float(config['energy']['r-chp-motor'])
 
-    def  __init__(self, optimizer: Optimizer = Depends(Optimizer)):
-        model = PO()
-        optimizer.init(model)
-        self.optimizer = optimizer
-        self.config = configparser.ConfigParser(allow_no_value=True)
-        self.config.read(settings.CONFIG_FILE_PATH)
-        self.pc_biogas_inf = float(self.config['energy']['pc-biogas-inf'])
-        self.r_chp_caldera = float(self.config['energy']['r-chp-caldera'])
-        self.r_chp_motor = float(self.config['energy']['r-chp-motor'])
-
-    def run_bmp(self, data):
+    def fit_substrate(self, data, substrate, model_name=FIRST_ORDER, ci_method=CI_METHOD, ci=None):
+        """Unchecked fit of model_name to one substrate of data, see Optimizer.fit_goodness for ci_method and ci."""
         try:
-            final_status_code = 0
-            result_list = []
-            xdata = data.time
-            for substrate in data.substrates:
-                ydata = substrate.values
-                parameters, goodness = self.optimizer.fit_goodness(xdata=xdata, ydata=ydata)
-                metric_dict, param_dict, status_code = self.check_values(parameters, goodness)
-                energy = self.get_energy(parameters['values']['a'], data.flow, data.volatile_solid)
-                if status_code == 1:
-                    final_status_code = 1
-
-                result_list.append({'status_code': status_code, 'name':substrate.name, 'values':ydata, 'predicted_values':goodness['data']['model_data'].tolist(), 'params':param_dict, 'metrics':metric_dict, 'energy': energy})
-            
-            result = {'status_code': final_status_code, 'time':data.time, 'substrates':result_list}
-            bmp_result_object = BMPResultList.parse_obj(result)
-            return bmp_result_object
+            parameters, goodness = self.optimizers[model_name].fit_goodness(xdata=data.time, ydata=substrate.values, ci_method=ci_method, ci=ci)
+            return {'model': model_name, 'parameters': parameters, 'metrics': goodness['metrics'], 'predicted_values': goodness['data']['model_data'].tolist(),
+                    'aic': float(goodness['aic']), 'bic': float(goodness['bic'])}
         except:
-            raise BMPException("BMP module failed for given data: {}".format(data))
-
-    def check_values(self, params, goodness):
-        status_code = 0
-        metric_dict = self.check_metrics(goodness)
-        params_dict = self.check_params(params)
-
-        if metric_dict['status_code'] == 1 or params_dict['status_code'] == 1:
-            status_code = 1
-        
-        return metric_dict, params_dict, status_code
-    
-    def check_params(self, params):
-        parameters = []
-        param_status_code = 0
-        for key, value in params['values'].items():
-            status_codes = []
-            if key in self.config.sections():
-
-                # first condition
-                a1 = self.config[key]['greater-than']
-                a2 = self.config[key]['less-than']
-                if ((a1 is not None) and (not value > float(a1))) or ((a2 is not None) and (not value < float(a2))):
-                    status_codes.append(int(self.config[key]['status-code']))
-
-                # second condition
-                a1 = self.config[key+'-cinf']['greater-than']
-                a2 = self.config[key+'-cinf']['less-than']
-                cinf = params['ci'][key][0]
-                if ((a1 is not None) and (not cinf > float(a1))) or ((a2 is not None) and (not cinf < float(a2))):
-                    status_codes.append(int(self.config[key+'-cinf']['status-code']))
-
-                # second condition
-                a1 = self.config[key+'-cinf-relation']['greater-than']
-                a2 = self.config[key+'-cinf-relation']['less-than']
-                if ((a1 is not None) and (not (value-cinf) > (float(a1)*value))) or ((a2 is not None) and (not (value-cinf) < (float(a2)*value))):
-                    status_codes.append(int(self.config[key+'-cinf-relation']['status-code']))
-
-            if len(status_codes) == 0:
-                status_codes.append(0)
-            else:
-                param_status_code = 1
-
-            covar_list = []
-            for covar_key, covar_value in params['co'][key].items():
-                covar_list.append({'covar_to': covar_key, 'value': covar_value})
-
-            if key in self.config.sections():
-                parameters.append({'status_codes':status_codes, 'name':key, 'value':value, 'ci_inf':params['ci'][key][0], 'ci_sup':params['ci'][key][1], 'se':params['se'][key], 'covar_list':covar_list})
-
-        return {'status_code': param_status_code, 'params':parameters}
-    
-    def check_metrics(self, goodness):
-        metrics = []
-        metric_status_code = 0
-        for key, value in goodness['metrics'].items():
-            if key in self.config.sections():
-                status_code = 0
-                a1 = self.config[key]['greater-than']
-                a2 = self.config[key]['less-than']
-                if ((a1 is not None) and (not value > float(a1))) or ((a2 is not None) and (not value < float(a2))):
-                    status_code = int(self.config[key]['status-code'])
-                    metric_status_code = status_code
-                if np.isnan(value) or np.isinf(value):
-                    value = -1
-                    status_code = int(self.config[key]['status-code'])
-                    metric_status_code = status_code
-                metrics.append({'status_code': status_code, 'name': key, 'value': value})
-            else:
-                metrics.append({'status_code': 0, 'name': key, 'value': value})
-        
-        return {'status_code':metric_status_code, 'metrics':metrics}
-    
+            raise BMPException("BMP module failed for substrate {}: {}".format(substrate.name, substrate.values))
+
+    def run_substrate(self, data, substrate, model_name=FIRST_ORDER, ci_method=CI_METHOD, ci=None):
+        """Result dict of the fit of one substrate of data."""
+        fit = self.fit_substrate(data, substrate, model_name, ci_method, ci)
+        return self.check_fits(data, [substrate], [fit])[0]
+
+    def check_fits(self, data, substrates, fits):
+        """Result dicts of the fits of one model to substrates of data, checked against the rules at once."""
+        names = list(fits[0]['parameters']['values'])
+        values = np.array([[fit['parameters']['values'][name] for name in names] for fit in fits], dtype=float)
+        cinf = np.array([[np.nan if fit['parameters']['ci'][name][0] is None else fit['parameters']['ci'][name][0] for name in names] for fit in fits], dtype=float)
+        param_codes, param_status = self.rules.check_params(names, values, cinf)
+
+        metric_names = list(fits[0]['metrics'])
+        metric_codes, metric_values, metric_status = self.rules.check_metrics(metric_names, [[fit['metrics'][name] for name in metric_names] for fit in fits])
+        energy = self.get_energy(values[:, names.index('a')], data.flow, data.volatile_solid)
+
+        results = []
+        for i, (substrate, fit) in enumerate(zip(substrates, fits)):
+            parameters = fit['parameters']
+            params = []
+            for j, name in enumerate(names):
+                covar_list = [{'covar_to': covar_key, 'value': covar_value} for covar_key, covar_value in parameters['co'][name].items()]
+                params.append({'status_codes': param_codes[i][j], 'name': name, 'value': values[i, j], 'ci_inf': parameters['ci'][name][0], 'ci_sup': parameters['ci'][name][1],
+                               'ci_method': parameters['ci_method'][name], 'se': parameters['se'][name], 'covar_list': covar_list})
+            metrics = [{'status_code': metric_codes[i, j], 'name': name, 'value': metric_values[i, j]} for j, name in enumerate(metric_names)]
+            status_code = 1 if metric_status[i] == 1 or param_status[i] == 1 else 0
+
+            results.append({'status_code': status_code, 'name': substrate.name, 'values': substrate.values, 'predicted_values': fit['predicted_values'],
+                            'params': {'status_code': param_status[i], 'params': params}, 'metrics': {'status_code': metric_status[i], 'metrics': metrics},
+                            'energy': [{'name': name, 'value': value[i]} for name, value in energy], 'model': fit['model'], 'aic': fit['aic'], 'bic': fit['bic']})
+        return results
+
     def get_energy(self, bo, flow, volatile_solid):
         EBG = bo*(flow*volatile_solid)*3.65*self.pc_biogas_inf
         ETG = EBG*self.r_chp_caldera
         EEG = EBG*self.r_chp_motor
 
-        return [{'name': 'EBG', 'value': EBG}, {'name': 'ETG', 'value': ETG}, {'name': 'EEG', 'value': EEG}]
\ No newline at end of file
+        return [('EBG', EBG), ('ETG', ETG), ('EEG', EEG)]
+
+
+bmp_service = BMPService(settings.config, rules)
@@ -0,0 +1,82 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from os import cpu_count, sched_getaffinity
+from threading import Lock
+from BMP_service.core.settings import settings
+from BMP_service.core.exceptions.executor_exception import ExecutorBusyException, ExecutorUnavailableException
+
+def available_cores():
+    """Cores this process may run on, which honours the cpuset of a container."""
+    try:
+        return len(sched_getaffinity(0))
+    except AttributeError:
+        return cpu_count() or 1
+
+
+class Executor:
+    """
+    Process pool for the BMP fits, kept off the event loop. At most
+    `workers` fits run at once and at most `queue_depth` more wait for
+    a worker; beyond that submissions are rejected with ExecutorBusyException.
+    A pool broken by a dead worker is replaced on the next submission, the
+    fits it was running fail with ExecutorUnavailableException.
+    """
+
+    def __init__(self, workers, queue_depth):
+        self.workers = workers or available_cores()
+        self.capacity = self.workers + queue_depth
+        self.pending = 0
+        self.lock = Lock()
+        self.pool = None
+
+    def submit_all(self, fn, args_list):
+        """
+        Submits fn(*args) for every args of args_list, all of them or none.
+        A batch larger than the capacity is taken when nothing is pending, so
+        every request can run eventually.
+        """
+        with self.lock:
+            if self.pending and self.pending + len(args_list) > self.capacity:
+                raise ExecutorBusyException("BMP queue is full ({} pending), retry later".format(self.pending))
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            try:
+                futures = [self.pool.submit(fn, *args) for args in args_list]
+            except BrokenProcessPool:
+                # a worker died earlier, the pool cannot take new work
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+                futures = [self.pool.submit(fn, *args) for args in args_list]
+            self.pending += len(futures)
+
+        for future in futures:
+            future.add_done_callback(self.release)
+        return futures
+
+    def submit(self, fn, *args):
+        return self.submit_all(fn, [args])[0]
+
+    def release(self, future):
+        with self.lock:
+            self.pending -= 1
+
+    def result(self, future):
+        """Blocking result of a submitted future, with a dead worker reported as ExecutorUnavailableException."""
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            raise ExecutorUnavailableException("A BMP worker died, retry later")
+
+    async def run(self, fn, *args):
+        """Runs fn(*args) in the pool and waits for it without blocking the event loop."""
+        return await self.wait(self.submit(fn, *args))
+
+    async def wait(self, future):
+        """Waits for a submitted future without blocking the event loop."""
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            raise ExecutorUnavailableException("A BMP worker died, retry later")
+
+
+executor = Executor(int(settings.config.get('execution', "workers")), int(settings.config.get('execution', "queue-depth")))
@@ -0,0 +1,98 @@
+import numpy as np
+from BMP_service.core.settings import settings
+
+RULE_KEYS = {'greater-than', 'less-than', 'status-code'}
+
+
+class RuleTable:
+    """
+    Threshold sections of config.init (those with greater-than, less-than
+    and status-code), compiled once into arrays indexed by section: the
+    lower and upper bounds, NaN when a section has none, and the status
+    codes. A value breaks a rule when it is not strictly within its bounds.
+    The checks take one row per fit, so every substrate of a request is
+    checked at once.
+
+    A parameter `p` has up to three rules: `p` on its value, `p-cinf` on the
+    lower end of its interval, and `p-cinf-relation` on value - ci_inf with
+    the bounds taken as fractions of the value.
+    """
+
+    def __init__(self, config):
+        self.index = {}
+        lower, upper, codes = [], [], []
+        for section in config.sections():
+            if not RULE_KEYS <= set(config[section]):
+                continue
+            self.index[section] = len(codes)
+            lower.append(self.bound(config[section]['greater-than']))
+            upper.append(self.bound(config[section]['less-than']))
+            codes.append(int(config[section]['status-code']))
+        self.lower = np.array(lower)
+        self.upper = np.array(upper)
+        self.codes = np.array(codes, dtype=int)
+
+    def bound(self, value):
+        return float(value) if value is not None else np.nan
+
+    def broken(self, name, values, scale=1.0):
+        """Whether each of values breaks the rule name, with its bounds multiplied by scale."""
+        i = self.index[name]
+        values = np.asarray(values, dtype=float)
+        broken = np.zeros(values.shape, dtype=bool)
+        if not np.isnan(self.lower[i]):
+            broken |= ~(values > self.lower[i]*scale)
+        if not np.isnan(self.upper[i]):
+            broken |= ~(values < self.upper[i]*scale)
+        return broken
+
+    def check_params(self, names, values, cinf):
+        """
+        Status codes of the parameters names, given their values and the
+        lower ends of their intervals (NaN when unbounded) with one row per
+        fit: a list per fit of the codes of every parameter ([0] when it
+        passes), and per fit 1 when any parameter fails, else 0.
+        """
+        status_codes = [[[] for _ in names] for _ in range(len(values))]
+        for j, name in enumerate(names):
+            if name not in self.index:
+                continue
+            checks = [(name, self.broken(name, values[:, j]))]
+            if name + '-cinf' in self.index:
+                checks.append((name + '-cinf', self.broken(name + '-cinf', cinf[:, j])))
+            if name + '-cinf-relation' in self.index:
+                checks.append((name + '-cinf-relation', self.broken(name + '-cinf-relation', values[:, j] - cinf[:, j], values[:, j])))
+            for rule, broken in checks:
+                for i in np.nonzero(broken)[0]:
+                    status_codes[i][j].append(int(self.codes[self.index[rule]]))
+
+        status = [0]*len(values)
+        for i, codes in enumerate(status_codes):
+            for j, param_codes in enumerate(codes):
+                if param_codes:
+                    status[i] = 1
+                else:
+                    param_codes.append(0)
+        return status_codes, status
+
+    def check_metrics(self, names, values):
+        """
+        Status codes of the metrics names, one row per fit. A metric that is
+        not finite breaks its rule and is reported as -1. Returns the codes,
+        the values and per fit the code of its last failed metric, else 0.
+        """
+        values = np.array(values, dtype=float)
+        codes = np.zeros(values.shape, dtype=int)
+        status = np.zeros(len(values), dtype=int)
+        for j, name in enumerate(names):
+            if name not in self.index:
+                continue
+            not_finite = ~np.isfinite(values[:, j])
+            broken = self.broken(name, values[:, j]) | not_finite
+            values[not_finite, j] = -1
+            codes[broken, j] = self.codes[self.index[name]]
+            status = np.where(broken, self.codes[self.index[name]], status)
+        return codes, values, status
+
+
+rules = RuleTable(settings.config)
@@ -0,0 +1,16 @@
+from BMP_service.core.simulation.models.po import PO
+from BMP_service.core.simulation.models.gompertz import Gompertz
+from BMP_service.core.simulation.models.cone import Cone
+from BMP_service.core.simulation.models.transference import Transference
+from BMP_service.core.simulation.models.two_pool import TwoPool
+
+FIRST_ORDER = 'first-order'
+
+# kinetic models by the name a request selects them with
+MODELS = {
+    FIRST_ORDER: PO,
+    'gompertz': Gompertz,
+    'cone': Cone,
+    'transference': Transference,
+    'two-pool': TwoPool,
+}
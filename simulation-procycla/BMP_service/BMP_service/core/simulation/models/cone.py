@@ -0,0 +1,26 @@
+import numpy as np
+from BMP_service.core.simulation.models.kinetic_model import KineticModel
+
+class Cone(KineticModel):
+    """Cone model: a/(1 + (k*x)^-n), written a*(k*x)^n/(1 + (k*x)^n) so x = 0 gives 0."""
+
+    def __init__(self):
+        self.param_names = ['a', 'k', 'n']
+        self.initial_values = [300.0, 0.2, 1.5]
+
+    def function(self, x, a, k, n):
+        p = (k*x)**n
+        return a*p/(1 + p)
+
+    def derivatives(self, x, a, k, n):
+        kx = k*x
+        p = kx**n
+        dy_dp = a/(1 + p)**2
+        # p*log(k*x) tends to 0 at x = 0
+        log_kx = np.log(np.where(kx > 0, kx, 1.0))
+        return {'a': p/(1 + p),
+                'k': dy_dp*n*p/k,
+                'n': dy_dp*p*log_kx}
+
+    def guess(self, x, y):
+        return {'a': np.max(y), 'k': 1/self.half_time(x, y), 'n': 1.5}
@@ -0,0 +1,25 @@
+import numpy as np
+from BMP_service.core.simulation.models.kinetic_model import KineticModel
+
+class Gompertz(KineticModel):
+    """Modified Gompertz: a*exp(-exp(rm*e/a*(lag - x) + 1)), rm the maximum rate and lag the lag time."""
+
+    def __init__(self):
+        self.param_names = ['a', 'rm', 'lag']
+        self.initial_values = [300.0, 30.0, 0.5]
+
+    def function(self, x, a, rm, lag):
+        return a*np.exp(-np.exp(rm*np.e/a*(lag - x) + 1))
+
+    def derivatives(self, x, a, rm, lag):
+        exponent = np.exp(rm*np.e/a*(lag - x) + 1)
+        y = a*np.exp(-exponent)
+        # dy/du of the inner exponent u
+        dy_du = -y*exponent
+        return {'a': y/a - dy_du*rm*np.e*(lag - x)/a**2,
+                'rm': dy_du*np.e*(lag - x)/a,
+                'lag': dy_du*rm*np.e/a}
+
+    def guess(self, x, y):
+        a = np.max(y)
+        return {'a': a, 'rm': a/(2*self.half_time(x, y)), 'lag': 0.1}
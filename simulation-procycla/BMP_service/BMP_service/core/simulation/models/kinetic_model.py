@@ -0,0 +1,42 @@
+import numpy as np
+
+class KineticModel():
+    """
+    Cumulative production curve of a BMP test, fitted by the Optimizer. A
+    model gives its param_names, initial_values (upper_bounds when a
+    parameter has one, all of them are positive), the curve function(x,
+    **values) and its derivatives(x, **values) by parameter, both vectorized
+    over x. guess(x, y) may give initial values from the data. 'a' is the
+    ultimate production in every model, the energy is computed from it.
+    """
+    param_names = []
+    initial_values = []
+    upper_bounds = {}
+
+    def function(self, x, **values):
+        raise NotImplementedError
+
+    def derivatives(self, x, **values):
+        raise NotImplementedError
+
+    def guess(self, x, y):
+        """Initial values for the data, None keeps initial_values."""
+        return None
+
+    def values(self, params):
+        return {name: params[name].value for name in self.param_names}
+
+    def residual(self, params, x, y):
+        """Model minus data, the lmfit Minimizer objective."""
+        return self.function(x, **self.values(params)) - y
+
+    def jacobian(self, params, x, y):
+        """Jacobian of residual, one row per varying parameter (col_deriv): the profile refits of the CI fix the others."""
+        derivatives = self.derivatives(x, **self.values(params))
+        return np.stack([derivatives[name] for name in self.param_names if params[name].vary])
+
+    def half_time(self, x, y):
+        """First x where y reaches half its maximum, the scale of the rate guesses."""
+        reached = np.nonzero(y >= np.max(y)/2)[0]
+        t50 = x[reached[0]] if len(reached) else x[-1]
+        return t50 if t50 > 0 else max(x[-1], 1.0)
@@ -1,8 +1,11 @@
 import numpy as np
+from BMP_service.core.simulation.models.kinetic_model import KineticModel
 
-class PO():
+class PO(KineticModel):
+    """First-order kinetics: a*(1 - exp(-b*x))."""
 
     def __init__(self):
+        self.param_names = ['a', 'b']
         self.initial_values = [300.0, 0.5]
 
     def function(self, x, a, b):
@@ -12,4 +15,7 @@ class PO():
         return (1-np.exp(-b*x))
 
     def derivate_b(self, x, a, b):
-        return a*x*np.exp(-b*x)
\ No newline at end of file
+        return a*x*np.exp(-b*x)
+
+    def derivatives(self, x, a, b):
+        return {'a': self.derivate_a(x, a, b), 'b': self.derivate_b(x, a, b)}
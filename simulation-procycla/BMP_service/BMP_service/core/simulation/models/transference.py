@@ -0,0 +1,25 @@
+import numpy as np
+from BMP_service.core.simulation.models.kinetic_model import KineticModel
+
+class Transference(KineticModel):
+    """Transference function: a*(1 - exp(-rm*(x - lag)/a)) after the lag time lag, 0 before it."""
+
+    def __init__(self):
+        self.param_names = ['a', 'rm', 'lag']
+        self.initial_values = [300.0, 30.0, 0.5]
+
+    def function(self, x, a, rm, lag):
+        return np.where(x > lag, a*(1 - np.exp(-rm*(x - lag)/a)), 0.0)
+
+    def derivatives(self, x, a, rm, lag):
+        after = x > lag
+        elapsed = np.where(after, x - lag, 0.0)
+        s = rm*elapsed/a
+        e = np.exp(-s)
+        return {'a': np.where(after, 1 - e - e*s, 0.0),
+                'rm': np.where(after, e*elapsed, 0.0),
+                'lag': np.where(after, -rm*e, 0.0)}
+
+    def guess(self, x, y):
+        a = np.max(y)
+        return {'a': a, 'rm': a*np.log(2)/self.half_time(x, y), 'lag': 0.1}
@@ -0,0 +1,25 @@
+import numpy as np
+from BMP_service.core.simulation.models.kinetic_model import KineticModel
+
+class TwoPool(KineticModel):
+    """Two-pool first-order: a*(1 - alpha*exp(-kf*x) - (1 - alpha)*exp(-ks*x)), alpha the fraction of the pool degraded at kf."""
+
+    def __init__(self):
+        self.param_names = ['a', 'alpha', 'kf', 'ks']
+        self.initial_values = [300.0, 0.5, 1.0, 0.1]
+        self.upper_bounds = {'alpha': 1.0}
+
+    def function(self, x, a, alpha, kf, ks):
+        return a*(1 - alpha*np.exp(-kf*x) - (1 - alpha)*np.exp(-ks*x))
+
+    def derivatives(self, x, a, alpha, kf, ks):
+        fast = np.exp(-kf*x)
+        slow = np.exp(-ks*x)
+        return {'a': 1 - alpha*fast - (1 - alpha)*slow,
+                'alpha': a*(slow - fast),
+                'kf': a*alpha*x*fast,
+                'ks': a*(1 - alpha)*x*slow}
+
+    def guess(self, x, y):
+        k = np.log(2)/self.half_time(x, y)
+        return {'a': np.max(y), 'alpha': 0.5, 'kf': 3*k, 'ks': k/3}
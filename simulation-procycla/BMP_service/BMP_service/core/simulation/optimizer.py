@@ -2,52 +2,95 @@ from collections import OrderedDict
 import lmfit
 import numpy as np
 import math
+from scipy import special, stats
+
+# CI methods, the profile ones fall back to ASYMPTOTIC when the profile fails
+ASYMPTOTIC = 'asymptotic'
+PROFILE = 'profile'
+PARALLEL_PROFILE = 'parallel-profile'
+CI_METHODS = (ASYMPTOTIC, PROFILE, PARALLEL_PROFILE)
+
+# the intervals reported are at 2 sigma, the level taken from conf_interval
+CI_SIGMA = 2
+CI_PROBABILITY = special.erf(CI_SIGMA/math.sqrt(2))
 
 class Optimizer():
+    """
+    Least-squares fit of a KineticModel with its analytic Jacobian. The model
+    gives residual(params, x, y) and jacobian(params, x, y) with one row per
+    parameter, which MINPACK uses as Dfun for the fit, for the covariance and
+    for every refit of the confidence intervals, and may guess the initial
+    values from the data.
+
+    The confidence intervals are asymptotic (covariance and Student-t, no
+    refit) or profile likelihood (conf_interval, dozens of refits per
+    parameter). parallel-profile computes each profile in its own task with
+    profile_parameter() and hands them to fit_goodness(ci=...).
+    """
 
     def init(self, model):
         self.base_model = model
-        self.model = lmfit.Model(model.function)
         self.initial_values = self.init_values()
         self.params = self.init_params()
 
     def init_values(self):
         initial_values = {}
         param_values = self.base_model.initial_values
-        for idx, param in enumerate(self.model.param_names):
+        for idx, param in enumerate(self.base_model.param_names):
                 initial_values[param] = param_values[idx]
         return initial_values
     
     def init_params(self):
         params = lmfit.Parameters()
-        for p in self.initial_values:
-            params.add(p, min=0)
+        for p, value in self.initial_values.items():
+            params.add(p, value=value, min=0, max=self.base_model.upper_bounds.get(p, np.inf))
         return params
     
-    def fit_goodness(self, xdata, ydata):
+    def fit(self, xdata, ydata):
+        """Minimizer and leastsq result of the model for ydata over the first len(ydata) points of xdata."""
+        xdata = np.asarray(xdata[:len(ydata)], dtype=float)
+        ydata = np.asarray(ydata, dtype=float)
+
+        params = self.params
+        guess = self.base_model.guess(xdata, ydata)
+        if guess is not None:
+            params = self.params.copy()
+            for name, value in guess.items():
+                params[name].value = value
+
+        minimizer = lmfit.Minimizer(self.base_model.residual, params, fcn_args=(xdata, ydata), Dfun=self.base_model.jacobian, col_deriv=1)
+        return minimizer, minimizer.leastsq()
+
+    def fit_goodness(self, xdata, ydata, ci_method=PROFILE, ci=None):
+        """
+        Fit of ydata with its parameters and goodness. The intervals come
+        from ci_method, or from ci when given: the (interval, method) of every
+        parameter, as profile_parameter() gives them for parallel-profile.
+        parameters['ci_method'] tells the method that actually produced each
+        interval.
+        """
         goodness = {'data':{}, 'metrics':{}}
         parameters = {}
 
         # fit
-        xdata = xdata[:len(ydata)]
-        
-        fit_result = self.model.fit(ydata, self.params, x=xdata, **self.initial_values)
-        parameters_values = OrderedDict(sorted(fit_result.best_values.items(), key=lambda t: t[0]))
+        minimizer, fit_result = self.fit(xdata, ydata)
+        xdata, ydata = minimizer.userargs
+        parameters_values = OrderedDict(sorted(fit_result.params.valuesdict().items(), key=lambda t: t[0]))
+        best_fit = self.base_model.function(xdata, **parameters_values)
 
-        parameters_ci = OrderedDict()
         parameters_se = OrderedDict()
         parameters_co = OrderedDict()
 
-        try:
-            ci = fit_result.conf_interval()
-            for par in fit_result.var_names:
-                parameters_ci[par] = [ci[par][1][1], ci[par][len(ci[par])-2][1]]
-        except:
-            for par in fit_result.var_names:
-                parameters_ci[par] = [0, 0]
+        if ci is None and ci_method == ASYMPTOTIC:
+            ci = self.asymptotic_ci(fit_result)
+        elif ci is None:
+            ci = self.profile_ci(minimizer, fit_result)
+        parameters_ci = OrderedDict((par, ci[par][0]) for par in fit_result.var_names)
+        parameters_ci_method = OrderedDict((par, ci[par][1]) for par in fit_result.var_names)
 
         for idx, var in enumerate(fit_result.var_names):
-            parameters_se[var] = fit_result.covar[idx][idx] if fit_result.covar is not None else 0
+            # standard error, the square root of the variance on the diagonal of the covariance
+            parameters_se[var] = math.sqrt(abs(fit_result.covar[idx][idx])) if fit_result.covar is not None else 0
             parameters_co[var] = OrderedDict()
             for idx2, var2 in enumerate(fit_result.var_names):
                 if var != var2:
@@ -55,13 +98,17 @@ class Optimizer():
 
         r2 = self.get_r2(ydata, fit_result.residual)
         rmse = self.get_rmse(ydata, fit_result.residual)
-        fb = self.get_fb(ydata, fit_result.best_fit)
+        fb = self.get_fb(ydata, best_fit)
 
-        parameters = {'values': parameters_values, 'ci': parameters_ci, 'se': parameters_se, 'co': parameters_co}
+        parameters = {'values': parameters_values, 'ci': parameters_ci, 'ci_method': parameters_ci_method, 'se': parameters_se, 'co': parameters_co}
 
         # saves the data
         goodness['data']['exp_data'] = ydata
-        goodness['data']['model_data'] = fit_result.best_fit
+        goodness['data']['model_data'] = best_fit
+
+        # information criteria, to rank the fits of several models
+        goodness['aic'] = fit_result.aic
+        goodness['bic'] = fit_result.bic
 
         # saves metrics
         goodness['metrics']['r2'] = r2
@@ -70,6 +117,47 @@ class Optimizer():
 
         return parameters, goodness
 
+    def asymptotic_ci(self, fit_result):
+        """
+        (value -+ t*sqrt(variance), 'asymptotic') of every parameter, with the
+        Student-t of the residual degrees of freedom. ([0, 0], None) without
+        a covariance.
+        """
+        if fit_result.covar is None or fit_result.nfree <= 0:
+            return OrderedDict((par, ([0, 0], None)) for par in fit_result.var_names)
+        t = stats.t.ppf((1 + CI_PROBABILITY)/2, fit_result.nfree)
+        half_widths = t*np.sqrt(np.abs(np.diag(fit_result.covar)))
+        ci = OrderedDict()
+        for par, half_width in zip(fit_result.var_names, half_widths):
+            value = fit_result.params[par].value
+            ci[par] = ([value - half_width, value + half_width], ASYMPTOTIC)
+        return ci
+
+    def profile_ci(self, minimizer, fit_result, p_names=None):
+        """
+        (profile-likelihood interval, 'profile') of p_names (all by default),
+        the asymptotic ones when the profile fails. A profile that does not
+        reach the level on a side ends at the bound of the parameter, None
+        when it has none.
+        """
+        p_names = p_names or fit_result.var_names
+        try:
+            ci = lmfit.conf_interval(minimizer, fit_result, p_names=p_names, sigmas=[CI_SIGMA])
+            profile = OrderedDict()
+            for par in p_names:
+                lower = max(ci[par][0][1], fit_result.params[par].min)
+                upper = min(ci[par][-1][1], fit_result.params[par].max)
+                profile[par] = ([lower if np.isfinite(lower) else None, upper if np.isfinite(upper) else None], PROFILE)
+            return profile
+        except Exception:
+            ci = self.asymptotic_ci(fit_result)
+            return OrderedDict((par, ci[par]) for par in p_names)
+
+    def profile_parameter(self, xdata, ydata, name):
+        """(interval, method) of one parameter, the task of parallel-profile."""
+        minimizer, fit_result = self.fit(xdata, ydata)
+        return self.profile_ci(minimizer, fit_result, p_names=[name])[name]
+
     def get_r2(self, ydata, residual):
         diff_sqr = np.power(ydata-np.mean(ydata),2)
         SCT = np.sum(diff_sqr)
@@ -0,0 +1,69 @@
+"""
+check_params and check_metrics as BMPService shipped them before the
+RuleTable, kept verbatim (methods of BMPService turned into functions of
+its config) as the reference of the regression tests.
+"""
+import numpy as np
+
+
+def check_params(config, params):
+    parameters = []
+    param_status_code = 0
+    for key, value in params['values'].items():
+        status_codes = []
+        if key in config.sections():
+
+            # first condition
+            a1 = config[key]['greater-than']
+            a2 = config[key]['less-than']
+            if ((a1 is not None) and (not value > float(a1))) or ((a2 is not None) and (not value < float(a2))):
+                status_codes.append(int(config[key]['status-code']))
+
+            # second condition
+            a1 = config[key+'-cinf']['greater-than']
+            a2 = config[key+'-cinf']['less-than']
+            cinf = params['ci'][key][0]
+            if ((a1 is not None) and (not cinf > float(a1))) or ((a2 is not None) and (not cinf < float(a2))):
+                status_codes.append(int(config[key+'-cinf']['status-code']))
+
+            # second condition
+            a1 = config[key+'-cinf-relation']['greater-than']
+            a2 = config[key+'-cinf-relation']['less-than']
+            if ((a1 is not None) and (not (value-cinf) > (float(a1)*value))) or ((a2 is not None) and (not (value-cinf) < (float(a2)*value))):
+                status_codes.append(int(config[key+'-cinf-relation']['status-code']))
+
+        if len(status_codes) == 0:
+            status_codes.append(0)
+        else:
+            param_status_code = 1
+
+        covar_list = []
+        for covar_key, covar_value in params['co'][key].items():
+            covar_list.append({'covar_to': covar_key, 'value': covar_value})
+
+        if key in config.sections():
+            parameters.append({'status_codes':status_codes, 'name':key, 'value':value, 'ci_inf':params['ci'][key][0], 'ci_sup':params['ci'][key][1], 'se':params['se'][key], 'covar_list':covar_list})
+
+    return {'status_code': param_status_code, 'params':parameters}
+
+
+def check_metrics(config, goodness):
+    metrics = []
+    metric_status_code = 0
+    for key, value in goodness['metrics'].items():
+        if key in config.sections():
+            status_code = 0
+            a1 = config[key]['greater-than']
+            a2 = config[key]['less-than']
+            if ((a1 is not None) and (not value > float(a1))) or ((a2 is not None) and (not value < float(a2))):
+                status_code = int(config[key]['status-code'])
+                metric_status_code = status_code
+            if np.isnan(value) or np.isinf(value):
+                value = -1
+                status_code = int(config[key]['status-code'])
+                metric_status_code = status_code
+            metrics.append({'status_code': status_code, 'name': key, 'value': value})
+        else:
+            metrics.append({'status_code': 0, 'name': key, 'value': value})
+
+    return {'status_code':metric_status_code, 'metrics':metrics}
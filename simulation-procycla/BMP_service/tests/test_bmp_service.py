@@ -0,0 +1,97 @@
+"""
+Tests of /bmp/run on BMP_body.json: the substrates fitted on the process
+pool come back in input order with the fits of BMPService.run_substrate,
+a substrate whose fit fails does not fail the others, and the fits of
+several models are ranked by AIC or BIC.
+"""
+import json
+import math
+from os import path
+import pytest
+from fastapi.testclient import TestClient
+from BMP_service.main import app
+from BMP_service.core.schemas.substrate import SubstrateList
+from BMP_service.core.schemas.bmp_result import BMPResultBase
+from BMP_service.core.services.bmp_service import bmp_service, rank_models
+
+BODY_PATH = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'BMP_body.json')
+
+
+@pytest.fixture(scope='module')
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture(scope='module')
+def body():
+    with open(BODY_PATH) as f:
+        return dict(json.load(f), ci_method='asymptotic')
+
+
+def fitted(result):
+    """The fitted values of a result, as the response gives them."""
+    return result['status_code'], result['predicted_values'], [(param['name'], param['value'], param['ci_inf'], param['ci_sup']) for param in result['params']['params']]
+
+
+def test_substrates_keep_their_input_order(client, body):
+    body = dict(body, substrates=body['substrates'][::-1])
+    response = client.post('/api/v1/bmp/run', json=body)
+    assert response.status_code == 200
+    results = response.json()['substrates']
+    assert [result['name'] for result in results] == [substrate['name'] for substrate in body['substrates']]
+
+    data = SubstrateList.parse_obj(body)
+    for substrate, result in zip(data.substrates, results):
+        assert fitted(result) == fitted(bmp_service.run_substrate(data, substrate, ci_method='asymptotic'))
+
+
+def test_failed_substrate_does_not_fail_the_others(client, body):
+    expected = client.post('/api/v1/bmp/run', json=body).json()['substrates']
+    substrates = body['substrates'][:1] + [{'name': 'empty', 'values': []}] + body['substrates'][1:]
+    response = client.post('/api/v1/bmp/run', json=dict(body, substrates=substrates))
+    assert response.status_code == 200
+    assert response.json()['status_code'] == 1
+
+    results = response.json()['substrates']
+    failed = results.pop(1)
+    assert failed['status_code'] == 1
+    assert 'empty' in failed['error']
+    assert failed['params']['params'] == []
+    assert [fitted(result) for result in results] == [fitted(result) for result in expected]
+
+
+def test_models_are_ranked_by_their_criterion():
+    fits = [{'model': 'a', 'aic': 3.0, 'bic': 1.0}, {'model': 'b', 'aic': 1.0, 'bic': 2.0}, {'model': 'c', 'aic': 2.0, 'bic': 3.0}]
+    for criterion, order in (('aic', ['b', 'c', 'a']), ('bic', ['a', 'b', 'c'])):
+        best = rank_models(fits, criterion)
+        assert best['model'] == order[0]
+        assert [fit['model'] for fit in best['ranking']] == order
+    assert 'ranking' not in rank_models(fits[:1], 'aic')
+
+
+def test_perfect_fits_rank_first_and_failed_fits_last():
+    fits = [{'model': 'failed', 'error': 'no fit'}, {'model': 'nan', 'aic': math.nan}, {'model': 'fit', 'aic': 10.0}, {'model': 'perfect', 'aic': -math.inf}]
+    assert [fit['model'] for fit in rank_models(fits, 'aic')['ranking']] == ['perfect', 'fit', 'failed', 'nan']
+
+
+def test_infinite_criteria_are_sent_as_none():
+    empty = {'status_code': 0, 'predicted_values': [1.0], 'params': {'status_code': 0, 'params': []}, 'metrics': {'status_code': 0, 'metrics': []}, 'energy': []}
+    best = rank_models([dict(empty, model='perfect', aic=-math.inf, bic=-math.inf), dict(empty, model='fit', aic=10.0, bic=12.0)], 'aic')
+    result = BMPResultBase.parse_obj(dict(best, name='substrate', values=[1.0]))
+    assert (result.model, result.aic, result.bic) == ('perfect', None, None)
+    assert [(fit.model, fit.aic) for fit in result.ranking] == [('perfect', None), ('fit', 10.0)]
+    json.loads(result.json())
+
+
+@pytest.mark.parametrize('criterion', ['aic', 'bic'])
+def test_run_ranks_the_selected_models(client, body, criterion):
+    models = ['first-order', 'gompertz', 'cone', 'transference', 'two-pool']
+    response = client.post('/api/v1/bmp/run', json=dict(body, models=models, criterion=criterion))
+    assert response.status_code == 200
+    for result in response.json()['substrates']:
+        ranking = result['ranking']
+        assert sorted(fit['model'] for fit in ranking) == sorted(models)
+        values = [fit[criterion] for fit in ranking]
+        assert values == sorted(values)
+        assert (result['model'], result[criterion]) == (ranking[0]['model'], values[0])
+        assert result['predicted_values'] == ranking[0]['predicted_values']
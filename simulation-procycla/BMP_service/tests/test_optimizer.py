@@ -0,0 +1,153 @@
+"""
+Tests of the Optimizer on BMP_body.json: the analytic Jacobians against
+finite differences, the standard errors and the asymptotic and profile
+intervals of the fits of every kinetic model.
+Run with `python -m pytest tests` from BMP_service.
+"""
+import json
+from os import path
+from types import SimpleNamespace
+import lmfit
+import numpy as np
+import pytest
+from scipy import stats
+from BMP_service.core.simulation.models import MODELS, FIRST_ORDER
+from BMP_service.core.simulation import optimizer as optimizer_module
+from BMP_service.core.simulation.optimizer import Optimizer, ASYMPTOTIC, PROFILE, CI_PROBABILITY
+
+BODY_PATH = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'BMP_body.json')
+
+
+@pytest.fixture(scope='module')
+def body():
+    with open(BODY_PATH) as f:
+        return json.load(f)
+
+
+def optimizer(model_name):
+    optimizer = Optimizer()
+    optimizer.init(MODELS[model_name]())
+    return optimizer
+
+
+def finite_differences(model, params, x, y):
+    """Central differences of model.residual, one row per varying parameter as model.jacobian."""
+    rows = []
+    for name in model.param_names:
+        if not params[name].vary:
+            continue
+        step = 1e-6*max(abs(params[name].value), 1.0)
+        shifted = []
+        for sign in (1, -1):
+            moved = params.copy()
+            # unbounded: a fit may end at a bound (a lag of 0), lmfit would clip the step
+            moved[name].set(min=-np.inf, max=np.inf)
+            moved[name].set(value=params[name].value + sign*step)
+            shifted.append(model.residual(moved, x, y))
+        rows.append((shifted[0] - shifted[1])/(2*step))
+    return np.array(rows)
+
+
+def test_first_order_jacobian_matches_finite_differences(body):
+    first_order = optimizer(FIRST_ORDER)
+    x = np.asarray(body['time'])
+    y = np.asarray(body['substrates'][0]['values'])
+    params = first_order.params.copy()
+    for a, b in ((280.0, 0.3), (50.0, 2.0), (500.0, 0.01)):
+        params['a'].value, params['b'].value = a, b
+        jacobian = first_order.base_model.jacobian(params, x, y)
+        finite = finite_differences(first_order.base_model, params, x, y)
+        np.testing.assert_allclose(jacobian, finite, rtol=1e-5, atol=1e-7*np.max(np.abs(finite)))
+    # the profile refits fix a parameter, its row is left out
+    params['b'].vary = False
+    np.testing.assert_array_equal(first_order.base_model.jacobian(params, x, y), jacobian[:1])
+
+
+def test_analytic_jacobian_fit_matches_finite_differences_fit(body):
+    first_order = optimizer(FIRST_ORDER)
+    for substrate in body['substrates']:
+        minimizer, fit_result = first_order.fit(body['time'], substrate['values'])
+        xdata, ydata = minimizer.userargs
+        finite = lmfit.Minimizer(first_order.base_model.residual, first_order.params, fcn_args=(xdata, ydata)).leastsq()
+        # both stop within the tolerances of MINPACK
+        for name in first_order.base_model.param_names:
+            assert fit_result.params[name].value == pytest.approx(finite.params[name].value, rel=1e-5)
+            assert fit_result.params[name].stderr == pytest.approx(finite.params[name].stderr, rel=1e-3)
+        assert fit_result.nfev < finite.nfev
+
+
+@pytest.mark.parametrize('model_name', sorted(MODELS))
+def test_jacobian_matches_finite_differences(body, model_name):
+    model = optimizer(model_name)
+    x = np.asarray(body['time'])
+    for substrate in body['substrates']:
+        y = np.asarray(substrate['values'])
+        minimizer, fit_result = model.fit(x, y)
+        # at the initial values, the guess and the fit of the substrate
+        guess = model.base_model.guess(x, y) or {}
+        for values in (model.initial_values, guess, fit_result.params.valuesdict()):
+            params = model.params.copy()
+            for name, value in values.items():
+                params[name].value = value
+            jacobian = model.base_model.jacobian(params, x, y)
+            finite = finite_differences(model.base_model, params, x, y)
+            np.testing.assert_allclose(jacobian, finite, rtol=1e-5, atol=1e-7*np.max(np.abs(finite)))
+
+
+@pytest.mark.parametrize('model_name', sorted(MODELS))
+def test_se_is_the_square_root_of_the_variance(body, model_name):
+    for substrate in body['substrates']:
+        minimizer, fit_result = optimizer(model_name).fit(body['time'], substrate['values'])
+        if fit_result.covar is None:
+            continue
+        parameters, goodness = optimizer(model_name).fit_goodness(body['time'], substrate['values'], ci_method=ASYMPTOTIC)
+        t = stats.t.ppf((1 + CI_PROBABILITY)/2, fit_result.nfree)
+        for idx, name in enumerate(fit_result.var_names):
+            se = parameters['se'][name]
+            assert se == pytest.approx(np.sqrt(fit_result.covar[idx][idx]))
+            # the asymptotic interval is value -+ t*se
+            lower, upper = parameters['ci'][name]
+            assert upper - lower == pytest.approx(2*t*se, rel=1e-9)
+
+
+@pytest.mark.parametrize('index', range(3))
+def test_profile_intervals_of_first_order_are_close_to_asymptotic(body, index):
+    time, values = body['time'], body['substrates'][index]['values']
+    asymptotic, _ = optimizer(FIRST_ORDER).fit_goodness(time, values, ci_method=ASYMPTOTIC)
+    profile, _ = optimizer(FIRST_ORDER).fit_goodness(time, values, ci_method=PROFILE)
+    for name, value in profile['values'].items():
+        assert asymptotic['ci_method'][name] == ASYMPTOTIC
+        assert profile['ci_method'][name] == PROFILE
+        lower, upper = profile['ci'][name]
+        assert lower < value < upper
+        # first-order is nearly linear in its parameters around the fit
+        half_width = (asymptotic['ci'][name][1] - asymptotic['ci'][name][0])/2
+        np.testing.assert_allclose(profile['ci'][name], asymptotic['ci'][name], rtol=0, atol=0.25*half_width)
+
+
+def test_parallel_profile_matches_profile(body):
+    time, values = body['time'], body['substrates'][0]['values']
+    first_order = optimizer(FIRST_ORDER)
+    ci = {name: first_order.profile_parameter(time, values, name) for name in first_order.base_model.param_names}
+    parallel, _ = first_order.fit_goodness(time, values, ci=ci)
+    profile, _ = first_order.fit_goodness(time, values, ci_method=PROFILE)
+    for name in first_order.base_model.param_names:
+        assert parallel['ci_method'][name] == PROFILE
+        assert parallel['ci'][name] == pytest.approx(profile['ci'][name], rel=1e-9)
+
+
+def test_failed_profile_falls_back_to_asymptotic(body, monkeypatch):
+    def conf_interval(*args, **kwargs):
+        raise lmfit.minimizer.MinimizerException('profile failed')
+
+    monkeypatch.setattr(optimizer_module.lmfit, 'conf_interval', conf_interval)
+    time, values = body['time'], body['substrates'][0]['values']
+    parameters, _ = optimizer(FIRST_ORDER).fit_goodness(time, values, ci_method=PROFILE)
+    asymptotic, _ = optimizer(FIRST_ORDER).fit_goodness(time, values, ci_method=ASYMPTOTIC)
+    assert parameters['ci_method'] == asymptotic['ci_method']
+    assert parameters['ci'] == asymptotic['ci']
+
+
+def test_asymptotic_interval_needs_a_covariance():
+    fit_result = SimpleNamespace(covar=None, nfree=13, var_names=['a', 'b'])
+    assert optimizer(FIRST_ORDER).asymptotic_ci(fit_result) == {'a': ([0, 0], None), 'b': ([0, 0], None)}
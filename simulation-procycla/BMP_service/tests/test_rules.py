@@ -0,0 +1,83 @@
+"""
+Regression tests of the RuleTable against the original check_params and
+check_metrics of BMPService (baseline.py), over fits on both sides of
+every threshold of config.init, on them, and not finite, and over the fits
+of BMP_body.json.
+"""
+import json
+from os import path
+import numpy as np
+import pytest
+import baseline
+from BMP_service.core.settings import settings
+from BMP_service.core.schemas.substrate import SubstrateList
+from BMP_service.core.services.bmp_service import bmp_service
+from BMP_service.core.services.rules import rules
+
+BODY_PATH = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'BMP_body.json')
+
+PARAMS = ['a', 'b']
+METRICS = ['r2', 'rmse', 'fb']
+
+
+@pytest.fixture(scope='module')
+def fits():
+    """(values, lower ends of the intervals) of the parameters, one row per fit, thresholds included."""
+    rng = np.random.default_rng(0)
+    values = np.column_stack([rng.choice([5.0, 10.0, 250.0, 1000.0, 1500.0], 200), rng.choice([0.0005, 0.001, 0.2, 10.0, 12.0], 200)])
+    # intervals from the value, around the 0 of -cinf and the 0.2 of -cinf-relation
+    cinf = values*(1 - rng.choice([0.0, 0.1, 0.2, 0.5, 1.0, 1.5], values.shape))
+    return values, cinf
+
+
+@pytest.fixture(scope='module')
+def metrics():
+    rng = np.random.default_rng(1)
+    return np.column_stack([rng.choice([0.5, 0.7, 0.95, np.nan], 200), rng.choice([0.0, 3.0, np.inf], 200), rng.choice([-0.1, 0.1, 0.3, 0.5, -np.inf], 200)])
+
+
+def test_compiled_table_has_every_threshold_section():
+    assert sorted(rules.index) == sorted(PARAMS + METRICS + [name + suffix for name in PARAMS for suffix in ('-cinf', '-cinf-relation')])
+    assert np.isnan(rules.upper[rules.index['r2']])
+    assert np.isnan(rules.lower[rules.index['fb']])
+
+
+def test_params_match_baseline(fits):
+    values, cinf = fits
+    codes, status = rules.check_params(PARAMS, values, cinf)
+    for i in range(len(values)):
+        expected = baseline.check_params(settings.config, {
+            'values': dict(zip(PARAMS, values[i])),
+            'ci': {name: [cinf[i, j], None] for j, name in enumerate(PARAMS)},
+            'se': dict.fromkeys(PARAMS, 0.0),
+            'co': {name: {} for name in PARAMS}})
+        assert codes[i] == [param['status_codes'] for param in expected['params']]
+        assert status[i] == expected['status_code']
+
+
+def test_metrics_match_baseline(metrics):
+    codes, values, status = rules.check_metrics(METRICS, metrics.tolist())
+    for i, row in enumerate(metrics):
+        expected = baseline.check_metrics(settings.config, {'metrics': dict(zip(METRICS, row))})
+        assert codes[i].tolist() == [metric['status_code'] for metric in expected['metrics']]
+        assert values[i].tolist() == [metric['value'] for metric in expected['metrics']]
+        assert status[i] == expected['status_code']
+
+
+def test_parameters_without_rules_pass():
+    codes, status = rules.check_params(['a', 'lag'], np.array([[250.0, 3.0]]), np.array([[240.0, 2.0]]))
+    assert codes == [[[0], [0]]]
+    assert status == [0]
+
+
+def test_service_checks_of_real_fits_match_baseline():
+    with open(BODY_PATH) as f:
+        data = SubstrateList.parse_obj(json.load(f))
+    for substrate in data.substrates:
+        fit = bmp_service.fit_substrate(data, substrate)
+        result = bmp_service.check_fits(data, [substrate], [fit])[0]
+        params = baseline.check_params(settings.config, fit['parameters'])
+        metrics = baseline.check_metrics(settings.config, {'metrics': fit['metrics']})
+        assert [param['status_codes'] for param in result['params']['params']] == [param['status_codes'] for param in params['params']]
+        assert [metric['status_code'] for metric in result['metrics']['metrics']] == [metric['status_code'] for metric in metrics['metrics']]
+        assert (result['params']['status_code'], result['metrics']['status_code']) == (params['status_code'], metrics['status_code'])
@@ -1,17 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from starlette.concurrency import run_in_threadpool
 from CSTR_service.core.schemas.cstr_data import CSTRData
-from CSTR_service.core.schemas.cstr_result import CSTRResult
+from CSTR_service.core.schemas.cstr_result import CSTRResult, Dtype
 from CSTR_service.core.schemas.uncertainty import UncertaintyData, UncertaintyResult
-from CSTR_service.core.service.cstr_service import CSTRService
+from CSTR_service.core.schemas.batch import CSTRBatchData, CSTRBatchResult
+from CSTR_service.core.schemas.monte_carlo import CSTRMonteCarloData, CSTRMonteCarloResult
+from CSTR_service.core.schemas.sweep import CSTRSweepData, CSTRSweepResult
+from CSTR_service.core.schemas.job import CSTRJob
+from CSTR_service.core.schemas.parameters import ParameterReload
+from CSTR_service.core.service.cstr_service import CSTRService, submit_adm1, adm1_key, reload_parameters
+from CSTR_service.core.service.jobs import jobs
+from CSTR_service.core.service.cancellation import cancellation
+from CSTR_service.core.service.encoding import NPZ_MEDIA_TYPE, select_fields, to_npz
+from CSTR_service.core.simulation.parameters import parameter_store
+from CSTR_service.core.exceptions.executor_exception import ExecutorBusyException, ExecutorUnavailableException
+from CSTR_service.core.settings import settings
 
 router = APIRouter()
+RETRY_AFTER = settings.config.get('execution', "retry-after")
 
+# fields: comma-separated columns to return (q_gas,pH...), all of them by default.
+# With Accept: application/x-npz the result is a columnar .npz (see encoding.to_npz) of dtype.
 @router.post("/run")
-async def run_cstr(data: CSTRData, cstr_service: CSTRService = Depends(CSTRService)) -> CSTRResult:
+async def run_cstr(data: CSTRData, request: Request, fields: Optional[str] = None, dtype: Dtype = Dtype.float64) -> CSTRResult:
     try:
         data = data.dict()
-        result = cstr_service.run_adm1(user_input=data)
+        # submit_adm1 may read the disk tier of the cache, it runs in the thread pool
+        result = await cancellation.wait(request, await run_in_threadpool(submit_adm1, user_input=data), adm1_key(data))
+        if result is None:
+            # nobody reads it, the run was cancelled unless another request waits for it
+            raise HTTPException(status_code=499, detail="Client disconnected")
+        if fields:
+            result = select_fields(result, fields.split(','))
+        if NPZ_MEDIA_TYPE in request.headers.get('accept', ''):
+            return Response(content=to_npz(result, dtype.value), media_type=NPZ_MEDIA_TYPE)
         return result
+    except HTTPException:
+        raise
+    except ExecutorBusyException as e:
+         raise HTTPException(status_code=429, detail=str(e), headers={'Retry-After': RETRY_AFTER})
+    except ExecutorUnavailableException as e:
+         raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': RETRY_AFTER})
     except Exception as e:
          raise HTTPException(status_code=400, detail=str(e))
     
@@ -22,4 +52,80 @@ async def propagate_uncertainty(data: UncertaintyData, cstr_service: CSTRService
         result = cstr_service.propagate_uncertainty(user_input=data)
         return result
     except Exception as e:
-         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+         raise HTTPException(status_code=400, detail=str(e))
+
+# plain def: FastAPI runs it in its thread pool while the process pool does the simulations
+@router.post("/batch")
+def run_batch(data: CSTRBatchData, cstr_service: CSTRService = Depends(CSTRService)) -> CSTRBatchResult:
+    try:
+        data = data.dict()
+        result = cstr_service.run_batch(batch=data)
+        return result
+    except ExecutorBusyException as e:
+         raise HTTPException(status_code=429, detail=str(e), headers={'Retry-After': RETRY_AFTER})
+    except ExecutorUnavailableException as e:
+         raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': RETRY_AFTER})
+    except Exception as e:
+         raise HTTPException(status_code=400, detail=str(e))
+
+# plain def: the rounds of samples are collected in the thread pool
+@router.post("/monte-carlo")
+def run_monte_carlo(data: CSTRMonteCarloData, cstr_service: CSTRService = Depends(CSTRService)) -> CSTRMonteCarloResult:
+    try:
+        data = data.dict()
+        result = cstr_service.run_monte_carlo(data=data)
+        return result
+    except ExecutorBusyException as e:
+         raise HTTPException(status_code=429, detail=str(e), headers={'Retry-After': RETRY_AFTER})
+    except ExecutorUnavailableException as e:
+         raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': RETRY_AFTER})
+    except Exception as e:
+         raise HTTPException(status_code=400, detail=str(e))
+
+# plain def: the grid is collected in the thread pool
+@router.post("/sweep")
+def run_sweep(data: CSTRSweepData, cstr_service: CSTRService = Depends(CSTRService)) -> CSTRSweepResult:
+    try:
+        data = data.dict()
+        result = cstr_service.run_sweep(data=data)
+        return result
+    except ExecutorBusyException as e:
+         raise HTTPException(status_code=429, detail=str(e), headers={'Retry-After': RETRY_AFTER})
+    except ExecutorUnavailableException as e:
+         raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': RETRY_AFTER})
+    except Exception as e:
+         raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/jobs", status_code=202)
+async def submit_job(data: CSTRData) -> CSTRJob:
+    try:
+        job_id = jobs.submit(user_input=data.dict())
+        return jobs.get(job_id)
+    except ExecutorBusyException as e:
+         raise HTTPException(status_code=429, detail=str(e), headers={'Retry-After': RETRY_AFTER})
+    except ExecutorUnavailableException as e:
+         raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': RETRY_AFTER})
+    except Exception as e:
+         raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/jobs/{job_id}/cancel", status_code=202)
+async def cancel_job(job_id: str) -> CSTRJob:
+    if not jobs.cancel(job_id):
+        raise HTTPException(status_code=404, detail="Unknown job: {}".format(job_id))
+    return jobs.get(job_id)
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> CSTRJob:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job: {}".format(job_id))
+    return job
+
+# plain def: the parameter files are hashed and possibly parsed in the thread pool
+@router.post("/parameters/reload")
+def reload_parameter_set() -> ParameterReload:
+    try:
+        reloaded = reload_parameters()
+        return ParameterReload(digest=parameter_store.get().digest, reloaded=reloaded)
+    except Exception as e:
+         raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,55 @@
+from pydantic import BaseModel, validator
+from typing import List, Optional
+from CSTR_service.core.schemas.cstr_data import Mode
+from CSTR_service.core.schemas.cstr_result import CSTRResult
+from CSTR_service.core.schemas.uncertainty import UncertaintyElement
+
+class SubstrateParams(BaseModel):
+    Bo: float
+    Kh: float
+    BoSE: float
+    KhSE: float
+    BoKhCovariance: float
+    NSamples: int
+
+    @validator('Bo', 'Kh')
+    def prevent_zero(cls, v):
+        if v == 0:
+            raise ValueError('Make sure this value is not 0')
+        return v
+
+
+class CSTRBatchData(BaseModel):
+    V_liq: float
+    V_gas: float
+    q_ad: float
+    COD: float
+    CODs: float
+    SV: float
+    Ni: float
+    Nt: float
+    pH_in: float
+    At: float
+    Ap: float
+    mode: Mode = Mode.dynamic
+    # one forward-sensitivity run per substrate instead of the off, bo and kh runs
+    sensitivity: bool = False
+    substrates: List[SubstrateParams]
+
+    @validator('V_liq', 'V_gas', 'q_ad', 'COD', 'CODs', 'SV', 'Ni', 'Nt', 'pH_in', 'At', 'Ap')
+    def prevent_zero(cls, v):
+        if v == 0:
+            raise ValueError('Make sure this value is not 0')
+        return v
+
+    class Config:
+        use_enum_values = True
+
+
+class SubstrateResult(BaseModel):
+    runs: List[CSTRResult]
+    uncertainty: List[UncertaintyElement]
+    error: Optional[str]
+
+class CSTRBatchResult(BaseModel):
+    substrates: List[SubstrateResult]
@@ -1,3 +1,4 @@
+import re
 from pydantic import BaseModel, validator
 from enum import Enum
 from typing import Optional
@@ -6,6 +7,12 @@ class Delta(str, Enum):
     off='off'
     bo='bo'
     kh='kh'
+    sensitivity='sensitivity'
+
+
+class Mode(str, Enum):
+    dynamic='dynamic'
+    steady_state='steady_state'
 
 
 class CSTRData(BaseModel):
@@ -23,8 +30,21 @@ class CSTRData(BaseModel):
     Bo: float
     Kh: float
     uncertainty: Delta
+    mode: Mode = Mode.dynamic
+    # /run: an 'off' run starts from the converged state of the closest past run, see [warm-start]
+    warm_start: bool = False
     progress_url: Optional[str]
     result_url: Optional[str]
+    # a dynamic run resubmitted with the same id and inputs resumes from its last checkpoint
+    checkpoint_id: Optional[str]
+    # budgets of the run, which stops with status_code 2 and its result so far when one is exhausted
+    max_wall_seconds: Optional[float]
+    max_rhs_evals: Optional[int]
+    # with 'sensitivity', the q_gas and pH bands of these Bo and Kh errors are added as an 'uncertainty' result
+    BoSE: Optional[float]
+    KhSE: Optional[float]
+    BoKhCovariance: Optional[float]
+    NSamples: Optional[int]
 
     @validator('V_liq', 'V_gas', 'q_ad', 'COD', 'CODs', 'SV', 'Ni', 'Nt', 'pH_in', 'At', 'Ap', 'Bo', 'Kh')
     def prevent_zero(cls, v):
@@ -32,5 +52,24 @@ class CSTRData(BaseModel):
             raise ValueError('Make sure this value is not 0')
         return v
 
+    @validator('max_wall_seconds', 'max_rhs_evals')
+    def check_budget(cls, v):
+        if v is not None and v <= 0:
+            raise ValueError('A budget must be greater than 0')
+        return v
+
+    @validator('NSamples')
+    def check_samples(cls, v):
+        # the Student-t of the bands has NSamples - 2 degrees of freedom
+        if v is not None and v <= 2:
+            raise ValueError('NSamples must be greater than 2')
+        return v
+
+    @validator('checkpoint_id')
+    def check_checkpoint_id(cls, v):
+        if v is not None and not re.fullmatch(r'[A-Za-z0-9_-]{1,64}', v):
+            raise ValueError('A checkpoint id has 1 to 64 letters, digits, _ or -')
+        return v
+
     class Config:
         use_enum_values = True
\ No newline at end of file
@@ -1,5 +1,11 @@
 from pydantic import BaseModel
-from typing import List
+from enum import Enum
+from typing import List, Optional
+
+class Dtype(str, Enum):
+    float64='float64'
+    float32='float32'
+
 
 class ResultDict(BaseModel):
     name: str
@@ -9,4 +15,6 @@ class CSTRResult(BaseModel):
     status_code: int
     trh: float
     execution_days: int
-    results: List[ResultDict]
\ No newline at end of file
+    results: List[ResultDict]
+    # status_code 2: the run was stopped by 'cancelled', 'max_wall_seconds' or 'max_rhs_evals'
+    stopped_by: Optional[str]
\ No newline at end of file
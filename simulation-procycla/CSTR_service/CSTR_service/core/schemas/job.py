@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from enum import Enum
+from typing import Optional
+from CSTR_service.core.schemas.cstr_result import CSTRResult
+
+class JobStatus(str, Enum):
+    queued='queued'
+    running='running'
+    finished='finished'
+    failed='failed'
+    cancelled='cancelled'
+
+
+class CSTRJob(BaseModel):
+    id: str
+    status: JobStatus
+    days_simulated: int
+    expected_days: int
+    result: Optional[CSTRResult]
+    error: Optional[str]
+
+    class Config:
+        use_enum_values = True
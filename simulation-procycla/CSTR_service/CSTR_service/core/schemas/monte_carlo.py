@@ -0,0 +1,55 @@
+from pydantic import BaseModel, validator
+from typing import List, Optional
+from CSTR_service.core.schemas.cstr_data import Mode
+
+class CSTRMonteCarloData(BaseModel):
+    V_liq: float
+    V_gas: float
+    q_ad: float
+    COD: float
+    CODs: float
+    SV: float
+    Ni: float
+    Nt: float
+    pH_in: float
+    At: float
+    Ap: float
+    Bo: float
+    Kh: float
+    BoSE: float
+    KhSE: float
+    BoKhCovariance: float
+    mode: Mode = Mode.dynamic
+    # defaults from [monte-carlo] in config.init
+    samples: Optional[int]
+    tol: Optional[float]
+    percentiles: List[float] = [2.5, 50.0, 97.5]
+    seed: Optional[int]
+    progress_url: Optional[str]
+
+    @validator('V_liq', 'V_gas', 'q_ad', 'COD', 'CODs', 'SV', 'Ni', 'Nt', 'pH_in', 'At', 'Ap', 'Bo', 'Kh')
+    def prevent_zero(cls, v):
+        if v == 0:
+            raise ValueError('Make sure this value is not 0')
+        return v
+
+    @validator('percentiles', each_item=True)
+    def check_percentile(cls, v):
+        if not 0 <= v <= 100:
+            raise ValueError('Percentiles must be between 0 and 100')
+        return v
+
+    class Config:
+        use_enum_values = True
+
+
+class PercentileBands(BaseModel):
+    name: str
+    percentiles: List[float]
+    values: List[List[float]]
+
+class CSTRMonteCarloResult(BaseModel):
+    samples: int
+    failed: int
+    converged: bool
+    bands: List[PercentileBands]
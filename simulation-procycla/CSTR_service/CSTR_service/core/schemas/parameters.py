@@ -0,0 +1,5 @@
+from pydantic import BaseModel
+
+class ParameterReload(BaseModel):
+    digest: str
+    reloaded: bool
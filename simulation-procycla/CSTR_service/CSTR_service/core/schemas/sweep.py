@@ -0,0 +1,71 @@
+from pydantic import BaseModel, validator
+from typing import List, Optional
+from CSTR_service.core.schemas.cstr_data import Mode
+
+class SweepRange(BaseModel):
+    start: float
+    stop: float
+    points: int
+
+    @validator('start', 'stop')
+    def prevent_zero(cls, v):
+        if v <= 0:
+            raise ValueError('Make sure this value is greater than 0')
+        return v
+
+    @validator('points')
+    def check_points(cls, v):
+        if v < 1:
+            raise ValueError('A range needs at least one point')
+        return v
+
+class SweepRanges(BaseModel):
+    q_ad: Optional[SweepRange]
+    COD: Optional[SweepRange]
+    Bo: Optional[SweepRange]
+
+
+class CSTRSweepData(BaseModel):
+    V_liq: float
+    V_gas: float
+    q_ad: float
+    COD: float
+    CODs: float
+    SV: float
+    Ni: float
+    Nt: float
+    pH_in: float
+    At: float
+    Ap: float
+    Bo: float
+    Kh: float
+    mode: Mode = Mode.steady_state
+    # inputs swept over np.linspace(start, stop, points), the others keep their value
+    ranges: SweepRanges
+    # a point whose pH falls below it is past the failure boundary, defaults to [sweep] failure-pH
+    failure_pH: Optional[float]
+
+    @validator('V_liq', 'V_gas', 'q_ad', 'COD', 'CODs', 'SV', 'Ni', 'Nt', 'pH_in', 'At', 'Ap', 'Bo', 'Kh')
+    def prevent_zero(cls, v):
+        if v == 0:
+            raise ValueError('Make sure this value is not 0')
+        return v
+
+    class Config:
+        use_enum_values = True
+
+
+class CSTRSweepResult(BaseModel):
+    """
+    One column per field and one row per grid point, COD and Bo outermost
+    and q_ad ascending. status_code is 0 for a viable point, 1 for a failed
+    one and 2 for a point pruned past the failure boundary, which has no values.
+    """
+    q_ad: List[float]
+    COD: List[float]
+    Bo: List[float]
+    status_code: List[int]
+    days_simulated: List[Optional[int]]
+    q_gas: List[Optional[float]]
+    CH4: List[Optional[float]]
+    pH: List[Optional[float]]
@@ -0,0 +1,137 @@
+import logging
+import hashlib
+import pickle
+from collections import OrderedDict
+from concurrent.futures import Future
+from json import dumps
+from os import path, makedirs, listdir, remove, replace, stat
+from threading import Lock
+from CSTR_service.core.settings import settings
+from CSTR_service.core.simulation.parameters import parameter_store
+
+logger = logging.getLogger(__name__)
+
+# inputs that do not change the simulation
+IGNORED_INPUTS = ('progress_url', 'result_url', 'checkpoint_id')
+
+def parameter_digest():
+    """sha256 of the ADM1 parameter set and of the config sections that change a simulation result."""
+    digest = hashlib.sha256(parameter_store.get().digest.encode())
+    for section in ('checkpoint', 'uncertainty', 'solver', 'steady-state', 'warm-start', 'energy'):
+        digest.update(dumps(dict(settings.config[section]), sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of simulation results: an in-memory LRU bounded
+    by the pickled size of the results and an optional on-disk tier. submit()
+    coalesces identical requests, all callers of a key still running share
+    its future (single-flight). Only the results accepted by cacheable() are kept.
+    """
+
+    def __init__(self, max_bytes, disk_path=None, disk_max_bytes=0, cacheable=None):
+        self.max_bytes = max_bytes
+        self.cacheable = cacheable or (lambda result: True)
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.inflight = {}
+        self.lock = Lock()
+        self.digest = parameter_digest()
+        if disk_path:
+            makedirs(disk_path, exist_ok=True)
+
+    def key(self, user_input):
+        """Canonical hash of the validated inputs plus the parameter digest."""
+        inputs = {name: value for name, value in user_input.items() if name not in IGNORED_INPUTS}
+        return hashlib.sha256((self.digest + dumps(inputs, sort_keys=True)).encode()).hexdigest()
+
+    def submit(self, key, submit):
+        """Future of the result of key: cached, shared with a run in flight, or a new one from submit()."""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.done(pickle.loads(self.entries[key]))
+            if key in self.inflight:
+                return self.inflight[key]
+
+        data = self.read(key)
+        with self.lock:
+            if data is not None:
+                self.store(key, data)
+                return self.done(pickle.loads(data))
+            if key in self.inflight:
+                return self.inflight[key]
+            future = submit()
+            self.inflight[key] = future
+        future.add_done_callback(lambda future: self.finish(key, future))
+        return future
+
+    def done(self, result):
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def finish(self, key, future):
+        with self.lock:
+            self.inflight.pop(key, None)
+        if future.cancelled() or future.exception() is not None or not self.cacheable(future.result()):
+            return
+        data = pickle.dumps(future.result())
+        with self.lock:
+            self.store(key, data)
+        self.write(key, data)
+
+    def store(self, key, data):
+        # results are kept pickled, so every hit gets its own copy
+        if len(data) > self.max_bytes:
+            return
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        self.entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            self.size -= len(self.entries.popitem(last=False)[1])
+
+    def read(self, key):
+        if not self.disk_path:
+            return None
+        try:
+            with open(path.join(self.disk_path, key + '.pkl'), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def write(self, key, data):
+        if not self.disk_path:
+            return
+        try:
+            file = path.join(self.disk_path, key + '.pkl')
+            with open(file + '.tmp', 'wb') as f:
+                f.write(data)
+            replace(file + '.tmp', file)
+            self.evict_disk()
+        except OSError as e:
+            logger.warning('Error writing the result cache: %s', e)
+
+    def evict_disk(self):
+        # oldest files first, until the tier fits in disk_max_bytes
+        files = [path.join(self.disk_path, name) for name in listdir(self.disk_path) if name.endswith('.pkl')]
+        files = sorted((stat(file).st_mtime, stat(file).st_size, file) for file in files)
+        total = sum(size for _, size, _ in files)
+        for _, size, file in files:
+            if total <= self.disk_max_bytes:
+                break
+            remove(file)
+            total -= size
+
+
+cache = ResultCache(
+    int(settings.config.get('cache', "memory-max-bytes")),
+    settings.config.get('cache', "disk-path") or None,
+    int(settings.config.get('cache', "disk-max-bytes")),
+    # partial results of stopped runs are not the result of their inputs
+    lambda result: result.status_code != 2,
+)
@@ -0,0 +1,93 @@
+import asyncio
+from multiprocessing import Manager
+from threading import Lock
+from CSTR_service.core.settings import settings
+from CSTR_service.core.simulation.budget import CancelToken
+from CSTR_service.core.service.executor import executor
+
+
+class CancellationRegistry:
+    """
+    Cancel flags of the runs in flight, in a Manager dict the workers read
+    through their CancelToken between simulated days. A run shared by several
+    requests (single-flight) counts its waiters and is only cancelled when
+    the last one disconnects. Every consumer of a shared run joins it as a
+    waiter, including those that never cancel it (batches), so that no other
+    request takes itself for the last one.
+    """
+
+    def __init__(self, poll_interval):
+        self.poll_interval = poll_interval
+        self.manager = None
+        self.flags = None
+        self.waiters = {}
+        self.lock = Lock()
+
+    def start(self):
+        """Starts the Manager process of the flags, at startup rather than on the first run."""
+        with self.lock:
+            if self.manager is None:
+                self.manager = Manager()
+                self.flags = self.manager.dict()
+
+    def token(self, run_id):
+        """CancelToken of a new run, registered until release(run_id)."""
+        self.start()
+        with self.lock:
+            self.flags[run_id] = False
+            return CancelToken(self.flags, run_id)
+
+    def cancel(self, run_id):
+        """Cancels a run in flight, returns whether there was one."""
+        with self.lock:
+            if self.flags is None or run_id not in self.flags:
+                return False
+            self.flags[run_id] = True
+            return True
+
+    def release(self, run_id):
+        with self.lock:
+            if self.flags is not None:
+                self.flags.pop(run_id, None)
+
+    def join(self, run_id):
+        """Counts a waiter of run_id until its leave(run_id)."""
+        with self.lock:
+            self.waiters[run_id] = self.waiters.get(run_id, 0) + 1
+
+    def leave(self, run_id):
+        """Uncounts a waiter of run_id, returns whether it was the last one."""
+        # the last waiter removes the entry, waiters only holds runs someone waits for
+        with self.lock:
+            if run_id not in self.waiters:
+                return False
+            self.waiters[run_id] -= 1
+            if self.waiters[run_id] > 0:
+                return False
+            del self.waiters[run_id]
+            return True
+
+    async def wait(self, request, future, run_id):
+        """
+        executor.wait(future) for a request, polling for its client to
+        disconnect. Returns None when it does, after cancelling the run if no
+        other request waits for it.
+        """
+        self.join(run_id)
+        task = asyncio.ensure_future(executor.wait(future))
+        disconnected = False
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.poll_interval)
+                if done:
+                    return task.result()
+                if await request.is_disconnected():
+                    disconnected = True
+                    task.cancel()
+                    return None
+        finally:
+            if self.leave(run_id) and disconnected:
+                self.cancel(run_id)
+
+
+cancellation = CancellationRegistry(float(settings.config.get('execution', "disconnect-poll")))
@@ -1,10 +1,22 @@
 
+import numpy as np
 import pandas as pd
 from fastapi import Depends
 from CSTR_service.core.settings import settings
 from CSTR_service.core.simulation.ADM1 import ADM1
+from CSTR_service.core.simulation.parameters import parameter_store
+from CSTR_service.core.simulation.checkpoint import checkpoints
+from CSTR_service.core.simulation.budget import Budget
 from CSTR_service.core.schemas.uncertainty import UncertaintyResult
 from CSTR_service.core.schemas.cstr_result import CSTRResult, ResultDict
+from CSTR_service.core.schemas.batch import CSTRBatchResult, SubstrateResult
+from CSTR_service.core.schemas.monte_carlo import CSTRMonteCarloResult
+from CSTR_service.core.schemas.sweep import CSTRSweepResult
+from CSTR_service.core.service.executor import executor
+from CSTR_service.core.service.cache import cache, parameter_digest
+from CSTR_service.core.service.progress import reporter
+from CSTR_service.core.service.warm_start import warm_starts
+from CSTR_service.core.service.cancellation import cancellation
 from CSTR_service.core.exceptions.cstr_exception import CSTRException
 
 def full_stack():
@@ -20,25 +32,178 @@ def full_stack():
          stackstr += '  ' + traceback.format_exc().lstrip(trc)
     return stackstr
 
+# results added by CSTRService.run_adm1 to those of the simulation
+DERIVED_RESULTS = ('energy', 'uncertainty')
+
+# inputs of the uncertainty bands of a sensitivity run
+UNCERTAINTY_INPUTS = ('BoSE', 'KhSE', 'BoKhCovariance', 'NSamples')
+
+def result_value(run, name):
+    """value of the result called name of a CSTRResult."""
+    return next(result.value for result in run.results if result.name == name)
+
+_adm1 = None
+
+def shared_adm1():
+    """ADM1 of this process, built once per parameter set."""
+    global _adm1
+    parameters = parameter_store.get()
+    if _adm1 is None or _adm1.parameters is not parameters:
+        _adm1 = ADM1(parameters)
+    return _adm1
+
+def reload_parameters():
+    """
+    Reloads the ADM1 parameters if their files changed. The result cache is
+    rekeyed and the executor gets new workers, which load the new parameters.
+    """
+    reloaded = parameter_store.reload()
+    if reloaded:
+        cache.digest = parameter_digest()
+        executor.restart()
+    return reloaded
+
+def run_adm1_process(user_input, token=None):
+    """Process pool entry point: one CSTR simulation with the ADM1 of the worker process."""
+    return CSTRService(shared_adm1()).run_adm1(user_input, token=token)
+
+def run_job_process(job_id, user_input, progress, token=None):
+    """
+    Process pool entry point of a job: run_adm1_process publishing the days
+    simulated in progress[job_id]. Like any run, it is only checkpointed
+    under the checkpoint_id of its request: the job id does not survive a
+    restart, a checkpoint under it could never be resumed.
+    """
+    def report(days_simulated):
+        progress[job_id] = days_simulated
+
+    return CSTRService(shared_adm1()).run_adm1(user_input, progress=report, token=token)
+
+def run_samples_process(user_inputs):
+    """Process pool entry point of a chunk of Monte Carlo samples, with the ADM1 of the worker process."""
+    return CSTRService(shared_adm1()).run_samples(user_inputs)
+
+def run_sweep_process(lines, failure_pH):
+    """Process pool entry point of a group of sweep lines, with the ADM1 of the worker process."""
+    return CSTRService(shared_adm1()).run_sweep_lines(lines, failure_pH)
+
+def submit_adm1(user_input, reservation=None):
+    """
+    Future of run_adm1_process(user_input) on the executor. Results are served
+    from the result cache and identical runs in flight are shared, in both
+    cases user_input gets the final progress and result callbacks once the
+    result is there. Converged 'off' runs are stored in warm_starts, and an
+    'off' run with user_input['warm_start'] starts from the converged state
+    of the closest of them. The bo, kh and sensitivity runs are compared with
+    the off run from the same initial state, they never warm-start nor are
+    stored. The run can be cancelled with its adm1_key until it ends. A new
+    run takes a slot of reservation when given.
+    """
+    key = adm1_key(user_input)
+    off = user_input['uncertainty'] == 'off'
+    submitted = []
+
+    def submit():
+        submitted.append(True)
+        token = cancellation.token(key)
+        try:
+            if off and user_input.get('warm_start'):
+                future = executor.submit(run_adm1_process, dict(user_input, state_zero=warm_starts.nearest(apply_delta(dict(user_input)))), token, reservation=reservation)
+            else:
+                future = executor.submit(run_adm1_process, user_input, token, reservation=reservation)
+            if off:
+                future.add_done_callback(lambda future: store_warm_start(key, user_input, future))
+        except Exception:
+            cancellation.release(key)
+            raise
+        future.add_done_callback(lambda future: cancellation.release(key))
+        return future
+
+    future = cache.submit(key, submit)
+    if not submitted:
+        # a cached result or a run of another request: its callbacks went elsewhere
+        future.add_done_callback(lambda future: send_callbacks(user_input, future))
+    return future
+
+def send_callbacks(user_input, future):
+    """Final progress and result callbacks of user_input for a run it did not submit, as the simulation sends them."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    run = future.result()
+    reporter.progress({'days_simulated': run.execution_days, 'trh': run.trh}, user_input.get('progress_url'))
+    result = {
+        'days_simulated': run.execution_days,
+        'trh': run.trh,
+        'status_code': run.status_code,
+        'result': {item.name: item.value for item in run.results if item.name not in DERIVED_RESULTS}
+    }
+    if run.stopped_by:
+        result['stopped_by'] = run.stopped_by
+    reporter.result(result, user_input.get('result_url'))
+
+def adm1_key(user_input):
+    """Result cache key of a submit_adm1 run, which also identifies it while it runs."""
+    return cache.key(user_input)
+
+def store_warm_start(key, user_input, future):
+    # filed under the inputs simulated, after the delta of the uncertainty
+    if future.cancelled() or future.exception() is not None or future.result().status_code != 0:
+        return
+    warm_starts.store(key, apply_delta(dict(user_input)), [values[-1] for values in result_value(future.result(), 'simulate_results').values()])
+
+def apply_delta(user_input):
+    """user_input with Bo or Kh moved by the delta of its bo or kh uncertainty, as simulated."""
+    uncertainty = user_input['uncertainty']
+    if uncertainty == 'off':
+        pass
+    elif uncertainty == 'bo':
+        user_input['Bo'] += float(settings.config.get('uncertainty', "Bo"))
+    elif uncertainty == 'kh':
+        user_input['Kh'] += float(settings.config.get('uncertainty', "Kh"))
+    elif uncertainty == 'sensitivity':
+        pass
+    else:
+        raise CSTRException("Uncertainty values are off | bo | kh | sensitivity. Given value is: {}".format(uncertainty))
+
+    return user_input
+
 class CSTRService:
 
-    def  __init__(self, adm1: ADM1 = Depends(ADM1)):
+    def  __init__(self, adm1: ADM1 = Depends(shared_adm1)):
         self.adm1 = adm1
         self.pc_biogas_inf = float(settings.config.get('energy', 'pc-biogas-inf'))
         self.r_chp_caldera = float(settings.config.get('energy', 'r-chp-caldera'))
         self.r_chp_motor = float(settings.config.get('energy', 'r-chp-motor'))
+        self.mc_samples = int(settings.config.get('monte-carlo', 'samples'))
+        self.mc_chunk = int(settings.config.get('monte-carlo', 'chunk'))
+        self.mc_tol = float(settings.config.get('monte-carlo', 'tol'))
+        self.sweep_max_points = int(settings.config.get('sweep', 'max-points'))
+        self.sweep_failure_pH = float(settings.config.get('sweep', 'failure-pH'))
 
-    def run_adm1(self, user_input):
+    def run_adm1(self, user_input, progress=None, token=None):
         try:
+            # the warm start is part of the checkpoint, a resumed run may not find the same one,
+            # and a run stopped by its budgets goes on when resubmitted with larger ones
+            checkpoint = checkpoints.get(user_input.get('checkpoint_id'),
+                                         cache.key({name: value for name, value in user_input.items() if name not in ('state_zero', 'max_wall_seconds', 'max_rhs_evals')}))
+            budget = Budget(user_input.get('max_wall_seconds'), user_input.get('max_rhs_evals'), token)
             user_input = self.get_delta(user_input)
-            result = self.adm1.dynamic_simulation(user_input=user_input)
+            sensitivity = user_input['uncertainty'] == 'sensitivity'
+            if user_input['mode'] == 'steady_state':
+                if sensitivity:
+                    raise CSTRException("Sensitivity runs are only available in dynamic mode")
+                result = self.adm1.steady_state_simulation(user_input=user_input, state_zero=user_input.get('state_zero'), budget=budget, progress=progress)
+            else:
+                result = self.adm1.dynamic_simulation(user_input=user_input, progress=progress, sensitivity=sensitivity, state_zero=user_input.get('state_zero'), checkpoint=checkpoint, budget=budget)
             results_list = []
             for key, value in result['result'].items():
                 results_list.append(ResultDict(name=key, value=value))
                 if key == 'gasflow':
                     results_list.append(ResultDict(name='energy', value=self.get_energy(value)))
-            
-            return CSTRResult(status_code=result['status_code'], execution_days=result['days_simulated'], trh=result['trh'], results=results_list)
+            if sensitivity and all(user_input.get(name) is not None for name in UNCERTAINTY_INPUTS):
+                results_list.append(ResultDict(name='uncertainty', value=self.sensitivity_bands(user_input, result['result'])))
+
+            return CSTRResult(status_code=result['status_code'], execution_days=result['days_simulated'], trh=result['trh'], results=results_list, stopped_by=result.get('stopped_by'))
         except CSTRException as e:
             print(full_stack())
             raise CSTRException(e)
@@ -54,18 +219,267 @@ class CSTRService:
             print(full_stack())
             raise CSTRException("CSTR module failed propagating uncertainty for given data: {}".format(user_input))
 
-    def get_delta(self, user_input):
-        uncertainty = user_input['uncertainty']
-        if uncertainty == 'off':
-            pass
-        elif uncertainty == 'bo':
-            user_input['Bo'] += float(settings.config.get('uncertainty', "Bo"))
-        elif uncertainty == 'kh':
-            user_input['Kh'] += float(settings.config.get('uncertainty', "Kh"))
+    def run_batch(self, batch):
+        """
+        Runs the off, bo and kh simulations of every substrate on the process pool, then propagates their uncertainty.
+        With batch['sensitivity'], a single sensitivity run per substrate gives its uncertainty.
+        The batch waits for its runs as any /run request does, so a run it shares is not cancelled while it waits,
+        and a substrate with a run that did not converge (status_code != 0) gets an error instead of bands.
+        """
+        reactor = {key: value for key, value in batch.items() if key not in ('substrates', 'sensitivity')}
+        uncertainties = ('sensitivity',) if batch['sensitivity'] else ('off', 'bo', 'kh')
+        user_inputs = [dict(reactor, Bo=substrate['Bo'], Kh=substrate['Kh'], uncertainty=uncertainty, warm_start=False, progress_url=None, result_url=None)
+                       for substrate in batch['substrates'] for uncertainty in uncertainties]
+        # joined before the runs are submitted, a /run sharing one never takes itself for its last waiter
+        keys = [adm1_key(user_input) for user_input in user_inputs]
+        for key in keys:
+            cancellation.join(key)
+        try:
+            # the whole batch is admitted or rejected before any run is queued
+            reservation = executor.reserve(len(user_inputs))
+            try:
+                # the off, bo and kh runs of a substrate are only comparable from the same initial state
+                futures = [submit_adm1(user_input, reservation) for user_input in user_inputs]
+            finally:
+                reservation.close()
+
+            n = len(uncertainties)
+            substrates = []
+            for i, substrate in enumerate(batch['substrates']):
+                try:
+                    runs = [executor.result(future) for future in futures[n*i:n*i + n]]
+                    for name, run in zip(uncertainties, runs):
+                        self.check_converged(name, run)
+                    if batch['sensitivity']:
+                        uncertainty = self.sensitivity_uncertainty(substrate, runs[0])
+                    else:
+                        uncertainty = self.propagate_uncertainty(self.uncertainty_input(substrate, runs))
+                    substrates.append(SubstrateResult(runs=runs, uncertainty=uncertainty.__root__))
+                except CSTRException as e:
+                    substrates.append(SubstrateResult(runs=[], uncertainty=[], error=str(e)))
+
+            return CSTRBatchResult(substrates=substrates)
+        finally:
+            for key in keys:
+                cancellation.leave(key)
+
+    def check_converged(self, uncertainty, run):
+        """Raises a CSTRException when run did not converge: its bands would come from a partial trajectory."""
+        if run.status_code != 0:
+            raise CSTRException("The {} run ended with status_code {} after {} days{}".format(
+                uncertainty, run.status_code, run.execution_days, ", stopped by {}".format(run.stopped_by) if run.stopped_by else ""))
+
+    def sensitivity_uncertainty(self, substrate, run):
+        """q_gas and pH bands of a substrate from its sensitivity run, which must have converged."""
+        self.check_converged('sensitivity', run)
+        try:
+            result = self.adm1.uncertainty_bands(substrate, *self.band_inputs(result_value(run, 'gasflow'), result_value(run, 'simulate_results'), result_value(run, 'sensitivity')))
+            return UncertaintyResult.parse_obj(result)
+        except Exception as e:
+            print(full_stack())
+            raise CSTRException("CSTR module failed propagating uncertainty for given data: {}".format(substrate))
+
+    def sensitivity_bands(self, user_input, result):
+        """'uncertainty' result of a sensitivity run: the q_gas and pH bands of the BoSE, KhSE, BoKhCovariance and NSamples of user_input."""
+        gas, ph = self.adm1.uncertainty_bands(user_input, *self.band_inputs(result['gasflow'], result['simulate_results'], result['sensitivity']))
+        return {'q_gas_min': gas['min'], 'q_gas_max': gas['max'], 'pH_min': ph['min'], 'pH_max': ph['max']}
+
+    def band_inputs(self, gasflow, simulate_results, sensitivity):
+        """q_gas, pH and the absolute values of their daily derivatives, in the argument order of ADM1.uncertainty_bands."""
+        return (gasflow['q_gas'], simulate_results['pH'],
+                abs(np.array(sensitivity['dq_gas/dBo'])), abs(np.array(sensitivity['dq_gas/dKh'])),
+                abs(np.array(sensitivity['dpH/dBo'])), abs(np.array(sensitivity['dpH/dKh'])))
+
+    def uncertainty_input(self, substrate, runs):
+        """Input of propagate_uncertainty for a substrate, from its off, bo and kh runs."""
+        def value(run, name, key):
+            return result_value(run, name)[key]
+
+        original, bo_delta, kh_delta = runs
+        return {
+            'BoSE': substrate['BoSE'],
+            'KhSE': substrate['KhSE'],
+            'BoKhCovariance': substrate['BoKhCovariance'],
+            'NSamples': substrate['NSamples'],
+            'Original_qGas': value(original, 'gasflow', 'q_gas'),
+            'Original_pH': value(original, 'simulate_results', 'pH'),
+            'BoDelta_qGas': value(bo_delta, 'gasflow', 'q_gas'),
+            'BoDelta_pH': value(bo_delta, 'simulate_results', 'pH'),
+            'KhDelta_qGas': value(kh_delta, 'gasflow', 'q_gas'),
+            'KhDelta_pH': value(kh_delta, 'simulate_results', 'pH')
+        }
+
+    def run_monte_carlo(self, data):
+        """
+        q_gas and pH percentile bands of the reactor over (Bo, Kh) samples of
+        their multivariate normal. Samples run in rounds of mc_chunk samples per
+        worker, each chunk as one ensemble, and the bands of every round are
+        sent to progress_url. Stops after data['samples'] samples, or earlier
+        once a round changes no band by more than tol of its largest value.
+        """
+        max_samples = data['samples'] or self.mc_samples
+        tol = self.mc_tol if data['tol'] is None else data['tol']
+        reactor = {key: value for key, value in data.items() if key not in ('Bo', 'Kh', 'BoSE', 'KhSE', 'BoKhCovariance', 'samples', 'tol', 'percentiles', 'seed', 'progress_url')}
+        rng = np.random.default_rng(data['seed'])
+        mean = [data['Bo'], data['Kh']]
+        cov = [[data['BoSE']**2, data['BoKhCovariance']], [data['BoKhCovariance'], data['KhSE']**2]]
+
+        q_gas, pH = [], []
+        drawn = failed = 0
+        bands = None
+        converged = False
+        while drawn < max_samples and not converged:
+            draws = self.draw_samples(rng, mean, cov, min(self.mc_chunk*executor.workers, max_samples - drawn))
+            drawn += len(draws)
+            user_inputs = [dict(reactor, Bo=Bo, Kh=Kh, uncertainty='off', progress_url=None, result_url=None) for Bo, Kh in draws]
+            futures = executor.submit_all(run_samples_process, [(user_inputs[i:i + self.mc_chunk],) for i in range(0, len(user_inputs), self.mc_chunk)])
+            for future in futures:
+                for sample in executor.result(future):
+                    if sample is None:
+                        failed += 1
+                    else:
+                        q_gas.append(sample['q_gas'])
+                        pH.append(sample['pH'])
+            if not q_gas:
+                continue
+
+            previous, bands = bands, [self.percentile_band(q_gas, data['percentiles']), self.percentile_band(pH, data['percentiles'])]
+            converged = previous is not None and max(self.band_change(old, new) for old, new in zip(previous, bands)) < tol
+            result = self.monte_carlo_result(drawn, failed, converged, data['percentiles'], bands)
+            reporter.progress(result.dict(), data['progress_url'])
+
+        if not q_gas:
+            raise CSTRException("Every Monte Carlo sample failed for given data: {}".format(data))
+        return result
+
+    def run_samples(self, user_inputs):
+        """
+        q_gas and pH curves of the Monte Carlo samples of user_inputs, None
+        for a sample whose simulation failed or left the positive states. A
+        sample stopped at max-trh before converging is kept, dropping it would
+        bias the bands. Dynamic samples run as one ensemble and only a failed
+        ensemble is rerun sample by sample.
+        """
+        def sample(simulation, user_input):
+            try:
+                return simulation(user_input=user_input)
+            except CSTRException:
+                return None
+
+        if user_inputs[0]['mode'] == 'steady_state':
+            results = [sample(self.adm1.steady_state_simulation, user_input) for user_input in user_inputs]
         else:
-            raise CSTRException("Uncertainty values are off | bo | kh. Given value is: {}".format(uncertainty))
+            try:
+                results = self.adm1.ensemble_simulation(user_inputs)
+            except CSTRException:
+                results = [sample(self.adm1.dynamic_simulation, user_input) for user_input in user_inputs]
 
-        return user_input
+        return [{'q_gas': result['result']['gasflow']['q_gas'], 'pH': result['result']['simulate_results']['pH']}
+                if result is not None and min(value[-1] for value in result['result']['simulate_results'].values()) > 0 else None
+                for result in results]
+
+    def draw_samples(self, rng, mean, cov, size):
+        """size (Bo, Kh) draws of the normal, non-positive draws are drawn again."""
+        draws = np.empty((0, 2))
+        for attempt in range(100):
+            samples = rng.multivariate_normal(mean, cov, size - len(draws))
+            draws = np.concatenate((draws, samples[np.all(samples > 0, axis=1)]))
+            if len(draws) == size:
+                return draws.tolist()
+        raise CSTRException("Could not draw positive Bo and Kh samples of mean {} and covariance {}".format(mean, cov))
+
+    def percentile_band(self, curves, percentiles):
+        # samples converge on different days, shorter curves hold their last value
+        length = max(len(curve) for curve in curves)
+        curves = np.array([curve + curve[-1:]*(length - len(curve)) for curve in curves])
+        return np.percentile(curves, percentiles, axis=0)
+
+    def band_change(self, old, new):
+        if old.shape[1] < new.shape[1]:
+            old = np.pad(old, ((0, 0), (0, new.shape[1] - old.shape[1])), mode='edge')
+        elif new.shape[1] < old.shape[1]:
+            new = np.pad(new, ((0, 0), (0, old.shape[1] - new.shape[1])), mode='edge')
+        return np.max(np.abs(new - old)) / max(np.max(np.abs(new)), np.finfo(float).tiny)
+
+    def monte_carlo_result(self, samples, failed, converged, percentiles, bands):
+        return CSTRMonteCarloResult(samples=samples, failed=failed, converged=converged, bands=[
+            {'name': name, 'percentiles': percentiles, 'values': band.tolist()} for name, band in zip(('q_gas', 'pH'), bands)])
+
+    def run_sweep(self, data):
+        """
+        Steady-state gas, CH4 % and pH over the grid of data['ranges']. Every
+        (COD, Bo) pair is a line of ascending q_ad whose points start from the
+        converged state of the previous one, and a line stops at its first
+        failed point: a higher load is past the failure boundary. The lines
+        are split into one group per worker, where the first point of a line
+        starts from the first point of the previous line. CODs is scaled with
+        COD, which keeps the soluble fraction of the feed.
+        """
+        ranges = data['ranges']
+        axes = {name: np.linspace(ranges[name]['start'], ranges[name]['stop'], ranges[name]['points']) if ranges[name] else np.array([data[name]])
+                for name in ('q_ad', 'COD', 'Bo')}
+        size = len(axes['q_ad']) * len(axes['COD']) * len(axes['Bo'])
+        if size > self.sweep_max_points:
+            raise CSTRException("The sweep has {} points, at most {} are allowed".format(size, self.sweep_max_points))
+        failure_pH = self.sweep_failure_pH if data['failure_pH'] is None else data['failure_pH']
+
+        reactor = {key: value for key, value in data.items() if key not in ('ranges', 'failure_pH')}
+        lines = [[dict(reactor, q_ad=q_ad, COD=COD, CODs=data['CODs']*COD/data['COD'], Bo=Bo, uncertainty='off', progress_url=None, result_url=None)
+                  for q_ad in np.sort(axes['q_ad']).tolist()]
+                 for COD in axes['COD'].tolist() for Bo in axes['Bo'].tolist()]
+        groups = [group.tolist() for group in np.array_split(np.arange(len(lines)), min(executor.workers, len(lines)))]
+        futures = executor.submit_all(run_sweep_process, [([lines[i] for i in group], failure_pH) for group in groups])
+
+        table = {name: [] for name in CSTRSweepResult.__fields__}
+        for group, future in zip(groups, futures):
+            for i, points in zip(group, executor.result(future)):
+                for user_input, point in zip(lines[i], points):
+                    for name in ('q_ad', 'COD', 'Bo'):
+                        table[name].append(user_input[name])
+                    for name in ('status_code', 'days_simulated', 'q_gas', 'CH4', 'pH'):
+                        table[name].append(point.get(name))
+        return CSTRSweepResult(**table)
+
+    def run_sweep_lines(self, lines, failure_pH):
+        """Points of a group of sweep lines, see run_sweep."""
+        results = []
+        first = None
+        for line in lines:
+            state = first
+            points = []
+            for i, user_input in enumerate(line):
+                point, state = self.sweep_point(user_input, state, failure_pH)
+                points.append(point)
+                if point['status_code'] != 0:
+                    points.extend({'status_code': 2} for _ in line[i + 1:])
+                    break
+                if i == 0:
+                    first = state
+            results.append(points)
+        return results
+
+    def sweep_point(self, user_input, state_zero, failure_pH):
+        """Table row of a sweep point simulated from state_zero, and its converged state."""
+        try:
+            if user_input['mode'] == 'steady_state':
+                result = self.adm1.steady_state_simulation(user_input=user_input, state_zero=state_zero)
+            else:
+                result = self.adm1.dynamic_simulation(user_input=user_input, state_zero=state_zero)
+        except CSTRException:
+            return {'status_code': 1}, None
+
+        state = self.adm1.final_state(result)
+        gasflow = result['result']['gasflow']
+        return {
+            'status_code': 1 if min(state) <= 0 or state[-1] < failure_pH else 0,
+            'days_simulated': result['days_simulated'],
+            'q_gas': gasflow['q_gas'][-1],
+            'CH4': gasflow['q_ch4%'][-1],
+            'pH': state[-1]
+        }, state
+
+    def get_delta(self, user_input):
+        return apply_delta(user_input)
 
     def get_energy(self, gasflow):
         EBG = pd.Series(gasflow['q_gas'])*365*self.pc_biogas_inf
@@ -0,0 +1,45 @@
+import io
+import numpy as np
+from CSTR_service.core.schemas.cstr_result import CSTRResult
+from CSTR_service.core.exceptions.cstr_exception import CSTRException
+
+NPZ_MEDIA_TYPE = 'application/x-npz'
+
+def select_fields(result: CSTRResult, fields):
+    """
+    CSTRResult with only the columns named in fields, results left without
+    columns are dropped. Raises a CSTRException listing the valid columns
+    when a name is not a column of result.
+    """
+    fields = set(fields)
+    columns = [name for item in result.results for name in item.value]
+    unknown = fields - set(columns)
+    if unknown:
+        raise CSTRException("Unknown fields {}, valid columns are: {}".format(', '.join(sorted(unknown)), ', '.join(columns)))
+    results = []
+    for item in result.results:
+        value = {name: column for name, column in item.value.items() if name in fields}
+        if value:
+            results.append(item.copy(update={'value': value}))
+    return result.copy(update={'results': results})
+
+def to_npz(result: CSTRResult, dtype='float64'):
+    """
+    Columnar .npz of a CSTRResult: one array per column, named
+    '<result>/<column>' (gasflow/q_gas, simulate_results/pH...), with dtype,
+    and the scalars status_code, trh, execution_days and stopped_by.
+    """
+    arrays = {
+        'status_code': np.array(result.status_code),
+        'trh': np.array(result.trh),
+        'execution_days': np.array(result.execution_days),
+        'stopped_by': np.array(result.stopped_by or ''),
+    }
+    for item in result.results:
+        for name, column in item.value.items():
+            arrays['{}/{}'.format(item.name, name)] = np.asarray(column, dtype=dtype)
+
+    # uncompressed: compressing would cost more CPU than the encoding it replaces
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
@@ -0,0 +1,134 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from os import cpu_count, getpid, sched_getaffinity
+from threading import Lock
+from CSTR_service.core.settings import settings
+from CSTR_service.core.exceptions.executor_exception import ExecutorBusyException, ExecutorUnavailableException
+
+def available_cores():
+    """Cores this process may run on, which honours the cpuset of a container."""
+    try:
+        return len(sched_getaffinity(0))
+    except AttributeError:
+        return cpu_count() or 1
+
+
+class Executor:
+    """
+    Process pool for the simulations, kept off the event loop. At most
+    `workers` simulations run at once and at most `queue_depth` more wait for
+    a worker; beyond that submissions are rejected with ExecutorBusyException.
+    A pool broken by a dead worker is replaced on the next submission, the
+    simulations it was running fail with ExecutorUnavailableException.
+    start() forks the workers at startup, off the request path.
+    """
+
+    def __init__(self, workers, queue_depth):
+        self.workers = workers or available_cores()
+        self.capacity = self.workers + queue_depth
+        self.pending = 0
+        self.reserved = 0
+        self.lock = Lock()
+        self.pool = None
+
+    def start(self):
+        """Creates the pool and forks its workers now, instead of on the first submission."""
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+                # the pool forks all its workers on its first task
+                self.pool.submit(getpid)
+
+    def reserve(self, n):
+        """
+        Reservation of n slots of the queue, all of them or none, for a
+        request whose simulations are submitted one by one: its submissions
+        take the reserved slots and are never rejected halfway. Close it to
+        give back the slots not used (cache hits).
+        """
+        with self.lock:
+            if self.pending + self.reserved + n > self.capacity:
+                raise ExecutorBusyException("Simulation queue is full ({} pending), retry later".format(self.pending + self.reserved))
+            self.reserved += n
+        return Reservation(self, n)
+
+    def submit_all(self, fn, args_list, reservation=None):
+        """Submits fn(*args) for every args of args_list, all of them or none, in the slots of reservation when given."""
+        with self.lock:
+            if reservation is not None:
+                reservation.take(len(args_list))
+            elif self.pending + self.reserved + len(args_list) > self.capacity:
+                raise ExecutorBusyException("Simulation queue is full ({} pending), retry later".format(self.pending + self.reserved))
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            try:
+                futures = [self.pool.submit(fn, *args) for args in args_list]
+            except BrokenProcessPool:
+                # a worker died earlier, the pool cannot take new work
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+                futures = [self.pool.submit(fn, *args) for args in args_list]
+            self.pending += len(futures)
+
+        for future in futures:
+            future.add_done_callback(self.release)
+        return futures
+
+    def submit(self, fn, *args, reservation=None):
+        return self.submit_all(fn, [args], reservation)[0]
+
+    def restart(self):
+        """Replaces the pool: the next simulations start on new workers, the old ones finish what they were given."""
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=False)
+                self.pool = None
+        self.start()
+
+    def release(self, future):
+        with self.lock:
+            self.pending -= 1
+
+    def result(self, future):
+        """Blocking result of a submitted future, with a dead worker reported as ExecutorUnavailableException."""
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            raise ExecutorUnavailableException("A simulation worker died, retry later")
+
+    async def run(self, fn, *args):
+        """Runs fn(*args) in the pool and waits for it without blocking the event loop."""
+        return await self.wait(self.submit(fn, *args))
+
+    async def wait(self, future):
+        """
+        Waits for a submitted future without blocking the event loop. The
+        future is shielded, a cancelled waiter leaves it running for the
+        other callers sharing it.
+        """
+        try:
+            return await asyncio.shield(asyncio.wrap_future(future))
+        except BrokenProcessPool:
+            raise ExecutorUnavailableException("A simulation worker died, retry later")
+
+
+class Reservation:
+    """Slots of the queue reserved by Executor.reserve, taken under the executor lock."""
+
+    def __init__(self, executor, slots):
+        self.executor = executor
+        self.slots = slots
+
+    def take(self, n):
+        if n > self.slots:
+            raise ExecutorBusyException("More simulations submitted than reserved")
+        self.slots -= n
+        self.executor.reserved -= n
+
+    def close(self):
+        with self.executor.lock:
+            self.executor.reserved -= self.slots
+            self.slots = 0
+
+
+executor = Executor(int(settings.config.get('execution', "workers")), int(settings.config.get('execution', "queue-depth")))
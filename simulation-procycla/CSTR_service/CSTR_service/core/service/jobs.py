@@ -0,0 +1,111 @@
+from collections import OrderedDict
+from multiprocessing import Manager
+from threading import Lock
+from uuid import uuid4
+from CSTR_service.core.settings import settings
+from CSTR_service.core.schemas.job import CSTRJob, JobStatus
+from CSTR_service.core.service.cstr_service import run_job_process
+from CSTR_service.core.service.executor import executor
+from CSTR_service.core.service.cancellation import cancellation
+
+
+class JobStore:
+    """
+    In-process registry of the CSTR jobs submitted to the executor. The
+    workers publish the days simulated of each job in a shared dict, and the
+    last max_jobs jobs are kept for their result to be fetched. A job is
+    cancelled through the cancellation registry under its job id.
+    Steady-state jobs count their seed days and then their solver
+    iterations, up to seed_days + max_iter.
+    """
+
+    def __init__(self, max_jobs, max_trh, seed_days, max_iter):
+        self.max_jobs = max_jobs
+        self.max_trh = max_trh
+        self.seed_days = seed_days
+        self.max_iter = max_iter
+        self.jobs = OrderedDict()
+        self.lock = Lock()
+        self.manager = None
+        self.progress = None
+
+    def start(self):
+        """Starts the Manager process of the progress dict, at startup rather than on the first job."""
+        with self.lock:
+            if self.manager is None:
+                self.manager = Manager()
+                self.progress = self.manager.dict()
+
+    def submit(self, user_input):
+        """Queues a simulation and returns its job id, raises ExecutorBusyException when the queue is full."""
+        self.start()
+        with self.lock:
+            job_id = uuid4().hex
+            self.progress[job_id] = 0
+            token = cancellation.token(job_id)
+            try:
+                future = executor.submit(run_job_process, job_id, user_input, self.progress, token)
+            except Exception:
+                del self.progress[job_id]
+                cancellation.release(job_id)
+                raise
+            future.add_done_callback(lambda future: cancellation.release(job_id))
+
+            # the same bound as ADM1.dynamic_simulation, the simulation may converge earlier
+            expected_days = int(user_input['V_liq']/user_input['q_ad']*self.max_trh) + 1
+            if user_input['mode'] == 'steady_state':
+                expected_days = self.seed_days + self.max_iter
+            self.jobs[job_id] = {'future': future, 'expected_days': expected_days}
+            self.prune()
+        return job_id
+
+    def prune(self):
+        # finished jobs are dropped oldest first, running ones are always kept
+        excess = len(self.jobs) - self.max_jobs
+        for job_id in [job_id for job_id, job in self.jobs.items() if job['future'].done()][:max(excess, 0)]:
+            del self.jobs[job_id]
+            self.progress.pop(job_id, None)
+
+    def cancel(self, job_id):
+        """
+        Cancels a job: a queued one never starts, a running one stops before
+        its next simulated day with its partial result. Returns False for an unknown job.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            return False
+        if not job['future'].cancel():
+            cancellation.cancel(job_id)
+        return True
+
+    def get(self, job_id):
+        """CSTRJob of a job id, None when it is unknown or already pruned."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            days_simulated = self.progress.get(job_id, 0)
+
+        future = job['future']
+        result = error = None
+        if future.cancelled():
+            status = JobStatus.cancelled
+        elif future.done():
+            exception = future.exception()
+            if exception is None:
+                result = future.result()
+                status = JobStatus.cancelled if result.stopped_by == 'cancelled' else JobStatus.finished
+                days_simulated = result.execution_days
+            else:
+                status = JobStatus.failed
+                error = str(exception)
+        elif future.running():
+            status = JobStatus.running
+        else:
+            status = JobStatus.queued
+
+        return CSTRJob(id=job_id, status=status, days_simulated=days_simulated, expected_days=job['expected_days'], result=result, error=error)
+
+
+jobs = JobStore(int(settings.config.get('jobs', "max-jobs")), float(settings.config.get('checkpoint', "max-trh")), int(settings.config.get('steady-state', "seed-days")), int(settings.config.get('steady-state', "max-iter")))
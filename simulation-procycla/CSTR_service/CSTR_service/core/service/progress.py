@@ -0,0 +1,97 @@
+import logging
+from collections import deque, OrderedDict
+from json import dumps
+from os import getpid, register_at_fork
+from threading import Condition, Thread
+from time import monotonic
+import requests
+from CSTR_service.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressReporter:
+    """
+    Sends the progress and result callbacks of the simulations from a
+    background thread, so the integration loop only enqueues them.
+
+    Progress updates are coalesced per url: only the latest one is kept and
+    a url gets at most one every min_interval seconds. Results are never
+    coalesced but at most max_queue of them wait to be sent, the oldest is
+    dropped beyond that. Every POST goes through one pooled session with a timeout.
+
+    A forked process (a pool worker) starts with a reporter of its own: the
+    parent's lock may be held by its sender thread at the fork, and its
+    pending callbacks are the parent's to send.
+    """
+
+    def __init__(self, timeout, min_interval, max_queue):
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_queue = max_queue
+        self.reset()
+        register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        self.results = deque(maxlen=self.max_queue)
+        self.latest = OrderedDict()
+        self.last_sent = {}
+        self.condition = Condition()
+        self.session = None
+        self.pid = None
+
+    def progress(self, result, url):
+        if url:
+            with self.condition:
+                self.start()
+                self.latest[url] = result
+                self.condition.notify()
+
+    def result(self, result, url):
+        if url:
+            with self.condition:
+                self.start()
+                # a pending progress update of the same url is outdated by the result
+                self.latest.pop(url, None)
+                self.results.append((url, result))
+                self.condition.notify()
+
+    def start(self):
+        # one sender thread per process, started on first use
+        if self.pid != getpid():
+            self.pid = getpid()
+            self.session = requests.Session()
+            Thread(target=self.run, name='progress-reporter', daemon=True).start()
+
+    def next(self):
+        """Next (url, result) to send, waiting until one is due."""
+        with self.condition:
+            while True:
+                if self.results:
+                    return self.results.popleft()
+                now = monotonic()
+                wait = None
+                for url in self.latest:
+                    due = self.last_sent.get(url, -self.min_interval) + self.min_interval
+                    if due <= now:
+                        self.last_sent[url] = now
+                        return url, self.latest.pop(url)
+                    wait = due - now if wait is None else min(wait, due - now)
+                for url in [url for url, sent in self.last_sent.items() if sent + self.min_interval <= now and url not in self.latest]:
+                    del self.last_sent[url]
+                self.condition.wait(wait)
+
+    def run(self):
+        while True:
+            url, result = self.next()
+            try:
+                self.session.post(url, data=dumps(result), timeout=self.timeout)
+            except Exception as e:
+                logger.warning('Error sending progress: %s', e)
+
+
+reporter = ProgressReporter(
+    float(settings.config.get('progress', "timeout")),
+    float(settings.config.get('progress', "min-interval")),
+    int(settings.config.get('progress', "max-queue")),
+)
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+from scipy.spatial import cKDTree
+from CSTR_service.core.settings import settings
+
+# inputs that locate a reactor in the warm-start cache
+WARM_START_INPUTS = ('V_liq', 'q_ad', 'COD', 'CODs', 'SV', 'Ni', 'Nt', 'pH_in', 'At', 'Ap', 'Bo', 'Kh')
+
+
+class WarmStartCache:
+    """
+    Converged states of past runs, indexed in a KD-tree by the logarithm of
+    their inputs, so distances are relative changes and no input dominates by
+    its units. nearest() gives the state of the closest run within
+    max_distance, to start a new run from. At most max_states are kept, the
+    least recently stored or used is evicted first; the tree is rebuilt on
+    the first lookup after a change.
+    """
+
+    def __init__(self, max_states, max_distance):
+        self.max_states = max_states
+        self.max_distance = max_distance
+        self.entries = OrderedDict()
+        self.tree = None
+        self.keys = []
+        self.lock = Lock()
+
+    def point(self, user_input):
+        return np.log(np.abs([user_input[name] for name in WARM_START_INPUTS]))
+
+    def nearest(self, user_input):
+        """Converged state of the cached run closest to user_input, None beyond max_distance."""
+        with self.lock:
+            if not self.entries:
+                return None
+            if self.tree is None:
+                self.keys = list(self.entries)
+                self.tree = cKDTree([self.entries[key][0] for key in self.keys])
+            distance, i = self.tree.query(self.point(user_input))
+            if distance > self.max_distance:
+                return None
+            key = self.keys[i]
+            self.entries.move_to_end(key)
+            return self.entries[key][1]
+
+    def store(self, key, user_input, state):
+        if self.max_states <= 0:
+            return
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (self.point(user_input), state)
+            while len(self.entries) > self.max_states:
+                self.entries.popitem(last=False)
+            self.tree = None
+
+
+warm_starts = WarmStartCache(int(settings.config.get('warm-start', "max-states")), float(settings.config.get('warm-start', "max-distance")))
@@ -1,128 +1,430 @@
-import pandas as pd
 import numpy as np
 import scipy.integrate
-from decimal import Decimal
 from CSTR_service.core.settings import settings
-from os import path
-from json import loads, dumps
-from math import isnan
-from requests import post
+from CSTR_service.core.service.progress import reporter
+from CSTR_service.core.simulation.dae import AlgebraicSolver, DAESolution
+from CSTR_service.core.simulation.parameters import parameter_store
+from CSTR_service.core.simulation.steady_state import SteadyStateSolver
+from CSTR_service.core.simulation.trajectory import Trajectory, ConvergenceDetector
+from CSTR_service.core.simulation.rhs import PetersenRHS, EnsembleRHS, SensitivityRHS, N_STATES, S_H2, S_IN, S_IC, S_H_ION, S_NH4_ION, S_GAS_H2, S_GAS_CO2, PH
+from CSTR_service.core.exceptions.cstr_exception import CSTRException
+
+# daily derivatives returned by a sensitivity run
+SENSITIVITY_COLUMNS = ['dq_gas/dBo', 'dq_gas/dKh', 'dpH/dBo', 'dpH/dKh']
 
 class ADM1:
 
-    def __init__(self):
+    def __init__(self, parameters=None):
 
         self.deltaKh = float(settings.config['uncertainty']['Kh'])
         self.deltaBo = float(settings.config['uncertainty']['Bo'])
         self.max_trh = float(settings.config.get('checkpoint', "max-trh"))
         self.min_trh = float(settings.config.get('checkpoint', "min-trh"))
+        self.warm_min_trh = float(settings.config.get('warm-start', "min-trh"))
         self.converge_ratio = float(settings.config.get('checkpoint', "converge-ratio"))
-
-        for file in loads(settings.config.get('constant-files', "path-list")):
-            self.init_global_data(pd.read_csv(path.join(settings.CONFIG_DIR_PATH, 'param_files', file), dtype=str))
-
-        initial_params = pd.read_csv(path.join(settings.CONFIG_DIR_PATH, 'param_files', settings.config["constant-files"]["initial-values-path"]), dtype=str)
-
-        self.state_zero = [float(Decimal(x)) for x in initial_params.loc[[0]].values.flatten().tolist()]
-        self.init_columns = initial_params.columns[1:].tolist()
+        self.integration = settings.config.get('solver', "integration")
+        self.solver_method = settings.config.get('solver', "method")
+        self.jacobian = settings.config.get('solver', "jacobian")
+        self.rtol = float(settings.config.get('solver', "rtol"))
+        self.seed_days = int(settings.config.get('steady-state', "seed-days"))
+
+        self.parameters = parameters or parameter_store.get()
+        for name, value in zip(self.parameters.names, self.parameters.values.tolist()):
+            self.__setattr__(name, value)
+
+        self.state_zero = self.parameters.state_zero.tolist()
+        self.init_columns = list(self.parameters.state_columns)
         self.init_columns.append('pH')
 
         self.init_dependent_params()
-
-    def init_global_data(self, dataframe, idx = 0):
-        for name in dataframe:
-            self.__setattr__(name, float(Decimal(dataframe[name][idx])))
-
-    def dynamic_simulation(self, user_input):
-
-        state_zero = self.state_zero[1:].copy()
-        state_zero.append(user_input['pH_in'])
-        simulate_results = pd.DataFrame([state_zero], columns=self.init_columns)
-        gasflow = pd.DataFrame({'q_gas': [0], 'q_ch4%': [0]})
-
+        self.rhs = PetersenRHS(self)
+        self.dae = AlgebraicSolver(self)
+        self.steady_state = SteadyStateSolver(float(settings.config.get('steady-state', "tol")), int(settings.config.get('steady-state', "max-iter")))
+
+    def dynamic_simulation(self, user_input, progress=None, sensitivity=False, state_zero=None, checkpoint=None, budget=None):
+        """
+        Simulates the reactor day by day until it converges, progress(days_simulated) is called after every day when given.
+        With sensitivity, the daily derivatives of q_gas and pH with respect to Bo and Kh are added to the result.
+        The simulation starts from state_zero when given (a converged state of a similar reactor), else from the initial values.
+        With a Checkpoint, the run resumes from it if it exists and saves it every checkpoint.interval days,
+        except for sensitivity runs, whose sensitivities are not checkpointed.
+        A run whose Budget is exhausted stops before its next day, with status_code 2 and the days simulated so far.
+        """
+
+        # a warm start has no initial state to wash out, it only waits warm_min_trh for convergence
+        min_trh = self.min_trh
+        if state_zero is None:
+            state_zero = self.state_zero.copy()
+            state_zero.append(user_input['pH_in'])
+        else:
+            state_zero = list(state_zero)
+            min_trh = self.warm_min_trh
         state_input = self.get_state_input(user_input)
 
         trh = user_input['V_liq']/user_input['q_ad']
         current_day = 1
 
-        while self.running_condition(trh, current_day, simulate_results, 3):
-            tstep = [current_day-1,current_day]
-            S_su, S_aa, S_fa, S_va, S_bu, S_pro, S_ac, S_h2, S_ch4, S_IC, S_IN, S_I, X_xc, X_ch, X_pr, X_li, X_su, X_aa, X_fa, X_c4, X_pro, X_ac, X_h2, X_I, S_cation, S_anion, S_H_ion, S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion, S_co2, S_nh3, S_nh4_ion, S_gas_h2, S_gas_ch4, S_gas_co2, pH = self.simulate(t_step = tstep, state_zero=state_zero, state_input=state_input, user_input=user_input, solvermethod='DOP853')
-            S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion, S_nh3, S_H_ion, pH, p_gas_h2, S_h2, S_nh4_ion, S_co2 = self.DAESolve(S_su, S_aa, S_fa, S_va, S_bu, S_pro, S_ac, S_h2, S_ch4, S_IC, S_IN, S_I, X_xc, X_ch, X_pr, X_li, X_su, X_aa, X_fa, X_c4, X_pro, X_ac, X_h2, X_I, S_cation, S_anion, S_H_ion, S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion, S_co2, S_nh3, S_nh4_ion, S_gas_h2, S_gas_ch4, S_gas_co2, user_input['V_liq'], user_input['q_ad'], state_input[7])
-    
-            # gas data for plots
-            p_gas_h2 = (S_gas_h2 * self.R * self.T_op / 16)
-            p_gas_ch4 = (S_gas_ch4 * self.R * self.T_op / 64)
-            p_gas_co2 = (S_gas_co2 * self.R * self.T_op)
-            p_gas = (p_gas_h2 + p_gas_ch4 + p_gas_co2 + self.p_gas_h2o)
-            q_gas = (self.k_p * (p_gas- self.p_atm))
-            if q_gas < 0:    
-                q_gas = 0
-
-            q_ch4 = q_gas * (p_gas_ch4/p_gas) # methane flow
-            if q_ch4 < 0:
-                q_ch4 = 0
-            q_ch4_porc = q_ch4*100/q_gas
-            if isnan(q_ch4_porc):
-                q_ch4_porc = 0
-
-            flowtemp = {'q_gas' : q_gas, 'q_ch4%' : q_ch4_porc}
-            gasflow.loc[len(gasflow)] = flowtemp
-
-            # DOQ
-
-            S_nh4_ion = S_IN - S_nh3
-            S_co2 = S_IC - S_hco3_ion
-            state_zero = [S_su, S_aa, S_fa, S_va, S_bu, S_pro, S_ac, S_h2, S_ch4, S_IC, S_IN, S_I, X_xc, X_ch, X_pr, X_li, X_su, X_aa, X_fa, X_c4, X_pro, X_ac, X_h2, X_I, S_cation, S_anion, S_H_ion, S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion, S_co2, S_nh3, S_nh4_ion, S_gas_h2, S_gas_ch4, S_gas_co2, pH]
-      
-            simulate_results.loc[len(simulate_results)] = state_zero
-
-
-            if simulate_results.loc[len(simulate_results)-1].min() <= 0 or current_day > trh*self.max_trh:
+        trajectory = Trajectory(self.init_columns, capacity=int(trh*self.max_trh) + 2)
+        convergence = ConvergenceDetector(3, self.converge_ratio)
+        if sensitivity:
+            checkpoint = None
+        resumed = checkpoint.load() if checkpoint is not None else None
+        if resumed is None:
+            trajectory.append(state_zero, (0, 0))
+            convergence.push(state_zero)
+        else:
+            # the system is autonomous, the run goes on from the last state as from a new start
+            last_day, rows, min_trh = resumed
+            current_day = last_day + 1
+            for row in rows:
+                trajectory.append(row[:N_STATES], row[N_STATES:])
+            for row in rows[-len(convergence.buffer):]:
+                convergence.push(row[:N_STATES])
+            state_zero = rows[-1, :N_STATES].tolist()
+
+        sensitivities = [[0.0] * len(SENSITIVITY_COLUMNS)]
+        if sensitivity:
+            daily_states = self.sensitivity_states(state_zero, state_input, user_input, sensitivities, budget)
+        elif self.integration == 'continuous':
+            daily_states = self.continuous_states(state_zero, state_input, user_input, last_day=int(trh*self.max_trh) + 2 - current_day, budget=budget)
+        else:
+            daily_states = self.daily_states(state_zero, state_input, user_input, budget)
+
+        while self.running_condition(trh, current_day, convergence, min_trh):
+            stopped_by = budget.exhausted() if budget is not None else None
+            if stopped_by:
+                result = {
+                    'days_simulated': current_day - 1,
+                    'trh': trh,
+                    'status_code': 2,
+                    'stopped_by': stopped_by,
+                    'result': trajectory.to_dict()
+                }
+                if sensitivity:
+                    result['result']['sensitivity'] = dict(zip(SENSITIVITY_COLUMNS, np.array(sensitivities).T.tolist()))
+                # kept for a resubmission to go on from here
+                if checkpoint is not None:
+                    checkpoint.save(current_day - 1, trajectory, min_trh, force=True)
+                reporter.result(result, user_input['result_url'])
+                return result
+
+            state_zero = next(daily_states)
+
+            trajectory.append(state_zero, self.gas_flow(state_zero))
+            convergence.push(state_zero)
+
+            if min(state_zero) <= 0 or current_day > trh*self.max_trh:
                 result = {
                     'days_simulated': current_day,
                     'trh': trh,
                     'status_code': 1,
-                    'result': {
-                        'simulate_results': simulate_results.to_dict(orient="list"),
-                        'gasflow': gasflow.to_dict(orient="list")
-                    }
+                    'result': trajectory.to_dict()
                 }
-                self.update_progress(result, user_input['result_url'])
+                if sensitivity:
+                    result['result']['sensitivity'] = dict(zip(SENSITIVITY_COLUMNS, np.array(sensitivities).T.tolist()))
+                if checkpoint is not None:
+                    checkpoint.remove()
+                reporter.result(result, user_input['result_url'])
                 return result
             else:
                 result = {
                     'days_simulated': current_day,
                     'trh': trh,
                 }
-                self.update_progress(result, user_input['progress_url'])
+                reporter.progress(result, user_input['progress_url'])
+                if progress:
+                    progress(current_day)
+                if checkpoint is not None:
+                    checkpoint.save(current_day, trajectory, min_trh)
             
             current_day += 1
 
-        DQOcurve = pd.DataFrame(columns=['DQOt', 'DQOs'])
-        DQOcurve['DQOt'] = simulate_results.S_su +simulate_results.S_aa +simulate_results.S_fa +simulate_results.S_va +simulate_results.S_bu +simulate_results.S_pro +simulate_results.S_ac +simulate_results.S_h2 +simulate_results.S_ch4 +simulate_results.S_I +simulate_results.X_xc +simulate_results.X_ch +simulate_results.X_pr +simulate_results.X_li +simulate_results.X_su +simulate_results.X_aa +simulate_results.X_fa +simulate_results.X_c4 +simulate_results.X_pro +simulate_results.X_ac +simulate_results.X_h2 +simulate_results.X_I +simulate_results.S_va_ion +simulate_results.S_bu_ion +simulate_results.S_pro_ion +simulate_results.S_ac_ion
-        DQOcurve['DQOs'] = simulate_results.S_su +simulate_results.S_aa +simulate_results.S_fa +simulate_results.S_va +simulate_results.S_bu +simulate_results.S_pro +simulate_results.S_ac +simulate_results.S_h2 +simulate_results.S_ch4 +simulate_results.S_I +simulate_results.S_va_ion +simulate_results.S_bu_ion +simulate_results.S_pro_ion +simulate_results.S_ac_ion
-
-        # Nitrogen data for plots
-        Ncurve = pd.DataFrame(simulate_results.S_IN*14 ,columns=['Na'])
-
         final_result = {
             'days_simulated': current_day,
             'trh': trh,
             'status_code': 0,
-            'result': {
-                'simulate_results': simulate_results.to_dict(orient="list"),
-                'gasflow': gasflow.to_dict(orient="list"),
-                'dqo_curve': DQOcurve.to_dict(orient="list"),
-                'n_curve': Ncurve.to_dict(orient="list")
-            }
+            'result': trajectory.to_dict(curves=True)
         }
-        self.update_progress(final_result, user_input['result_url'])
+        if sensitivity:
+            final_result['result']['sensitivity'] = dict(zip(SENSITIVITY_COLUMNS, np.array(sensitivities).T.tolist()))
+        if checkpoint is not None:
+            checkpoint.remove()
+        reporter.result(final_result, user_input['result_url'])
         return final_result
 
-    def propagate_uncertainty(self, user_input):
+    def steady_state_simulation(self, user_input, state_zero=None, budget=None, progress=None):
+        """
+        Converged operating point of the reactor, solved directly by the
+        SteadyStateSolver from the initial state after seed_days simulated
+        days, or from state_zero without seed days when given. The result
+        holds that single state, with its gas flow and curves. When the
+        Budget is exhausted it holds the last state reached, with status_code 2.
+        progress is called with the seed days simulated, then with the seed
+        days plus the solver iterations done, up to seed_days + max_iter.
+        """
+        state_input = self.get_state_input(user_input)
+        trh = user_input['V_liq']/user_input['q_ad']
 
-        studentFactor95 = scipy.stats.t.ppf(q=0.95 + 0.05/2, df=user_input['NSamples']-2, loc=0, scale=1)
+        def algebraic(state):
+            return self.algebraic_state(state, user_input['V_liq'], user_input['q_ad'], state_input[S_H2])
+
+        seed_days = 0
+        if state_zero is None:
+            state_zero = self.state_zero.copy()
+            state_zero.append(user_input['pH_in'])
+            seed_days = self.seed_days
+        state_zero = algebraic(list(state_zero))
+        daily_states = self.daily_states(state_zero, state_input, user_input, budget)
+        stopped_by = None
+        for current_day in range(1, seed_days + 1):
+            stopped_by = budget.exhausted() if budget is not None else None
+            if stopped_by:
+                seed_days = current_day - 1
+                break
+            state_zero = next(daily_states)
+            reporter.progress({'days_simulated': current_day, 'trh': trh}, user_input['progress_url'])
+            if progress:
+                progress(current_day)
+
+        state = state_zero
+        if not stopped_by:
+            rhs = self.rhs.bind(state_input, user_input['q_ad'], user_input['V_liq'], user_input['V_gas'], user_input['Kh'])
+            solved = (lambda iterations: progress(seed_days + iterations)) if progress else None
+            state, iterations, stopped_by = self.steady_state.solve(rhs, algebraic, state_zero, budget, solved)
+
+        trajectory = Trajectory(self.init_columns, capacity=1)
+        trajectory.append(state, self.gas_flow(state))
+        result = {
+            'days_simulated': seed_days,
+            'trh': trh,
+            'status_code': 0,
+            'result': trajectory.to_dict(curves=True)
+        }
+        if stopped_by:
+            result['status_code'] = 2
+            result['stopped_by'] = stopped_by
+        reporter.result(result, user_input['result_url'])
+        return result
+
+    def final_state(self, result):
+        """Last state of a simulation result, in the order of the state vector."""
+        return [result['result']['simulate_results'][column][-1] for column in self.init_columns]
+
+    def gas_flow(self, state):
+        """q_gas and methane percentage of a state, for plots."""
+        S_gas_h2, S_gas_ch4, S_gas_co2 = state[S_GAS_H2:S_GAS_CO2+1]
+
+        p_gas_h2 = (S_gas_h2 * self.R * self.T_op / 16)
+        p_gas_ch4 = (S_gas_ch4 * self.R * self.T_op / 64)
+        p_gas_co2 = (S_gas_co2 * self.R * self.T_op)
+        p_gas = (p_gas_h2 + p_gas_ch4 + p_gas_co2 + self.p_gas_h2o)
+        q_gas = (self.k_p * (p_gas- self.p_atm))
+        if q_gas < 0:    
+            q_gas = 0
+
+        q_ch4 = q_gas * (p_gas_ch4/p_gas) # methane flow
+        if q_ch4 < 0:
+            q_ch4 = 0
+        q_ch4_porc = q_ch4*100/q_gas if q_gas > 0 else 0
+
+        return q_gas, q_ch4_porc
+
+    def ensemble_simulation(self, user_inputs):
+        """
+        dynamic_simulation of several user inputs at once. The members still
+        running are integrated day by day as one N x 39 system (EnsembleRHS)
+        and each member leaves the ensemble as soon as it converges or fails.
+        Returns the result of each user input, in order.
+        """
+        size = len(user_inputs)
+        state_inputs = [self.get_state_input(user_input) for user_input in user_inputs]
+        trh = [user_input['V_liq']/user_input['q_ad'] for user_input in user_inputs]
+        q_ad, V_liq, V_gas, k_hyd = (np.array([user_input[key] for user_input in user_inputs], dtype=float) for key in ('q_ad', 'V_liq', 'V_gas', 'Kh'))
+        S_h2_in = np.array([state_input[S_H2] for state_input in state_inputs], dtype=float)
+        # LSODA only takes dense Jacobians, which grow with the square of the ensemble
+        solvermethod = 'BDF' if self.solver_method == 'LSODA' else self.solver_method
+
+        states = np.empty((size, PH + 1))
+        states[:, :PH] = self.state_zero
+        states[:, PH] = [user_input['pH_in'] for user_input in user_inputs]
+        trajectories = [Trajectory(self.init_columns, capacity=int(trh[i]*self.max_trh) + 2) for i in range(size)]
+        detectors = [ConvergenceDetector(3, self.converge_ratio) for i in range(size)]
+        for i in range(size):
+            trajectories[i].append(states[i], (0, 0))
+            detectors[i].push(states[i])
+
+        results = [None] * size
+        active = list(range(size))
+        current_day = 1
+        while True:
+            for i in active:
+                if not self.running_condition(trh[i], current_day, detectors[i]):
+                    results[i] = {
+                        'days_simulated': current_day,
+                        'trh': trh[i],
+                        'status_code': 0,
+                        'result': trajectories[i].to_dict(curves=True)
+                    }
+                    reporter.result(results[i], user_inputs[i]['result_url'])
+            active = [i for i in active if results[i] is None]
+            if not active:
+                return results
+
+            rhs = EnsembleRHS(self.rhs, [state_inputs[i] for i in active], q_ad[active], V_liq[active], V_gas[active], k_hyd[active])
+            r = scipy.integrate.solve_ivp(rhs, [current_day-1, current_day], states[active].ravel(), method=solvermethod, rtol=self.rtol, **self.jacobian_options(rhs, solvermethod))
+            if not r.success:
+                raise CSTRException("ADM1 ensemble integration failed at day {}: {}".format(current_day, r.message))
+            day_states = r.y[:, -1].reshape(len(active), PH + 1)
+            states[active] = np.array(self.algebraic_state(day_states.T, V_liq[active], q_ad[active], S_h2_in[active])).T
+
+            for i in active:
+                state_zero = states[i].tolist()
+                trajectories[i].append(state_zero, self.gas_flow(state_zero))
+                detectors[i].push(state_zero)
+
+                if min(state_zero) <= 0 or current_day > trh[i]*self.max_trh:
+                    results[i] = {
+                        'days_simulated': current_day,
+                        'trh': trh[i],
+                        'status_code': 1,
+                        'result': trajectories[i].to_dict()
+                    }
+                    reporter.result(results[i], user_inputs[i]['result_url'])
+                else:
+                    reporter.progress({'days_simulated': current_day, 'trh': trh[i]}, user_inputs[i]['progress_url'])
+            active = [i for i in active if results[i] is None]
+            current_day += 1
+
+    def daily_states(self, state_zero, state_input, user_input, budget=None):
+        """Restarts the solver every simulated day and applies the DAE pH/S_h2 update at the end of each day."""
+        current_day = 1
+        while True:
+            state = self.simulate(t_step=[current_day-1, current_day], state_zero=state_zero, state_input=state_input, user_input=user_input, solvermethod=self.solver_method, budget=budget)
+            state_zero = self.algebraic_state(state, user_input['V_liq'], user_input['q_ad'], state_input[S_H2])
+            yield state_zero
+            current_day += 1
+
+    def sensitivity_states(self, state_zero, state_input, user_input, sensitivities, budget=None):
+        """
+        daily_states integrating the forward sensitivities to Bo and Kh with
+        the state (SensitivityRHS) and differentiating the daily DAE update
+        too. Appends the derivatives of q_gas and pH of every day to
+        sensitivities, in the order of SENSITIVITY_COLUMNS.
+        """
+        rhs = self.rhs.bind(state_input, user_input['q_ad'], user_input['V_liq'], user_input['V_gas'], user_input['Kh'])
+        # the feed is affine in Bo, so this difference is its exact derivative
+        step = 1e-6
+        state_input_bo = self.get_state_input(dict(user_input, Bo=user_input['Bo']*(1 + step)))
+        feed_bo = np.zeros(PH + 1)
+        feed_bo[:len(state_input)] = (np.array(state_input_bo) - np.array(state_input)) / step
+        system = SensitivityRHS(rhs, rhs.dilution * feed_bo)
+        scale = np.array([[user_input['Bo']], [user_input['Kh']]])
+
+        S = np.zeros((2, PH + 1))
+        current_day = 1
+        while True:
+            r = scipy.integrate.solve_ivp(system, [current_day-1, current_day], np.concatenate([state_zero, S.ravel()]), method=self.solver_method, rtol=self.rtol, **self.jacobian_options(system, self.solver_method))
+            if not r.success:
+                raise CSTRException("ADM1 sensitivity integration failed at day {}: {}".format(current_day, r.message))
+            if budget is not None:
+                budget.count(r.nfev)
+            state = r.y[:PH + 1, -1].tolist()
+            state_zero = self.algebraic_state(state, user_input['V_liq'], user_input['q_ad'], state_input[S_H2])
+            S = self.algebraic_sensitivity(state, state_zero, r.y[PH + 1:, -1].reshape(2, PH + 1), user_input['V_liq'], user_input['q_ad'], state_input[S_H2])
+
+            dq_gas = self.gas_flow_sensitivity(state_zero, S) / scale[:, 0]
+            dpH = S[:, PH] / scale[:, 0]
+            sensitivities.append(dq_gas.tolist() + dpH.tolist())
+            yield state_zero
+            current_day += 1
+
+    def continuous_states(self, state_zero, state_input, user_input, last_day, budget=None):
+        """
+        Integrates the whole horizon [0, last_day] in a single solver run and
+        samples it at every day from the dense output. The DAE pH/S_h2 update
+        is solved inside every RHS evaluation, so the algebraic states are
+        consistent along the trajectory instead of corrected once per day.
+        The RHS is a function of y only: its algebraic solve is warm-started
+        from the S_h2/ions carried in y, which keep their values of day 0.
+        """
+        rhs = self.rhs.bind(state_input, user_input['q_ad'], user_input['V_liq'], user_input['V_gas'], user_input['Kh'])
+
+        def algebraic(y):
+            return self.algebraic_state(y, user_input['V_liq'], user_input['q_ad'], state_input[S_H2])
+
+        def system(t, y):
+            return rhs(t, np.array(algebraic(y)))
+
+        def jacobian(t, y):
+            # with respect to the differential states, at the solved algebraic states
+            return rhs.jacobian(t, np.array(algebraic(y)))
+
+        solver = getattr(scipy.integrate, self.solver_method)(system, 0, np.array(algebraic(state_zero)), last_day, rtol=self.rtol, **self.jacobian_options(rhs, self.solver_method, jacobian))
+        dense = None
+        counted = 0
+        current_day = 1
+        while True:
+            while solver.t < current_day:
+                message = solver.step()
+                if solver.status == 'failed':
+                    raise CSTRException("ADM1 integration failed at day {}: {}".format(solver.t, message))
+                dense = None
+            if budget is not None:
+                budget.count(solver.nfev - counted)
+                counted = solver.nfev
+            if dense is None:
+                dense = solver.dense_output()
+
+            yield algebraic(dense(current_day))
+            current_day += 1
+
+    def algebraic_state(self, state, V_liq, q_ad, S_h2_in):
+        """
+        Returns a copy of state with S_h2, the ions and pH solved by the AlgebraicSolver, warm-started from state.
+        The rows of state may be floats (one reactor) or arrays (one column per reactor).
+        """
+        state = list(state)
+        solution = self.dae.solve(state, q_ad / V_liq, S_h2_in)
+        if not np.all(solution.converged):
+            raise CSTRException("pH/S_h2 solver did not converge after {} and {} iterations".format(solution.iterations_H_ion, solution.iterations_h2))
+        S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion, S_nh3 = self.dae.ions(state, solution.S_H_ion)
+        S_nh4_ion = state[S_IN] - S_nh3
+        S_co2 = state[S_IC] - S_hco3_ion
+
+        state[S_H2] = solution.S_h2
+        state[S_H_ION:S_NH4_ION+1] = [solution.S_H_ion, S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion, S_co2, S_nh3, S_nh4_ion]
+        state[PH] = - np.log10(solution.S_H_ion)
+        return state
+
+    def algebraic_sensitivity(self, state, solved, S, V_liq, q_ad, S_h2_in):
+        """
+        Sensitivities (rows of S) carried through algebraic_state(state) = solved:
+        the differential states keep theirs, S_h2, the ions and pH get the
+        derivatives of their DAE solution.
+        """
+        D = q_ad / V_liq
+        solution = DAESolution(solved[S_H_ION], solved[S_H2], 0, 0, True)
+        dS_H_ion, dS_h2 = self.dae.tangent(state, S, solution, D, S_h2_in)
+
+        # ions are differentiated by complex step like the balances
+        h = 1e-30
+        ions = self.dae.ions([x + 1j * h * dx for x, dx in zip(state, S.T)], solution.S_H_ion + 1j * h * dS_H_ion)
+        dS_va_ion, dS_bu_ion, dS_pro_ion, dS_ac_ion, dS_hco3_ion, dS_nh3 = (ion.imag / h for ion in ions)
+
+        S = S.copy()
+        S[:, S_H2] = dS_h2
+        S[:, S_H_ION:S_NH4_ION+1] = np.array([dS_H_ion, dS_va_ion, dS_bu_ion, dS_pro_ion, dS_ac_ion, dS_hco3_ion,
+                                              S[:, S_IC] - dS_hco3_ion, dS_nh3, S[:, S_IN] - dS_nh3]).T
+        S[:, PH] = -dS_H_ion / (solution.S_H_ion * np.log(10))
+        return S
+
+    def gas_flow_sensitivity(self, state, S):
+        """Derivatives of the q_gas of gas_flow(state) along the rows of S."""
+        if self.gas_flow(state)[0] <= 0:
+            return np.zeros(len(S))
+        return self.k_p * self.R * self.T_op * (S[:, S_GAS_H2] / 16 + S[:, S_GAS_H2 + 1] / 64 + S[:, S_GAS_CO2])
+
+    def propagate_uncertainty(self, user_input):
 
         qGas_max_len = min(len(user_input['KhDelta_qGas']), len(user_input['Original_qGas']), len(user_input['BoDelta_qGas']))
         pH_max_len = min(len(user_input['KhDelta_pH']), len(user_input['Original_pH']), len(user_input['BoDelta_pH']))
@@ -133,6 +435,13 @@ class ADM1:
         dBioGasdBo = abs((np.subtract(user_input['BoDelta_qGas'][0:qGas_max_len], user_input['Original_qGas'][0:qGas_max_len]))/self.deltaBo)
         dpHdBo = abs((np.subtract(user_input['BoDelta_pH'][0:pH_max_len], user_input['Original_pH'][0:pH_max_len]))/self.deltaBo)
 
+        return self.uncertainty_bands(user_input, user_input['Original_qGas'][0:qGas_max_len], user_input['Original_pH'][0:pH_max_len], dBioGasdBo, dBioGasdKh, dpHdBo, dpHdKh)
+
+    def uncertainty_bands(self, user_input, qGas, pH, dBioGasdBo, dBioGasdKh, dpHdBo, dpHdKh):
+        """95% bands of the q_gas and pH curves from their derivatives with respect to Bo and Kh and the BoSE, KhSE, BoKhCovariance and NSamples of user_input."""
+
+        studentFactor95 = scipy.stats.t.ppf(q=0.95 + 0.05/2, df=user_input['NSamples']-2, loc=0, scale=1)
+
         #Cálculo incertidumbre
         KhSE = user_input['KhSE']
         BoSE = user_input['BoSE']
@@ -143,233 +452,52 @@ class ADM1:
         pH_uncertainty = np.nan_to_num(pH_uncertainty, nan=0.0)
 
         #Valores máximos y mínimos dentro de los intervalos de confianza
-        qGas_Min = user_input['Original_qGas'][0:qGas_max_len] - qGas_uncertainty
-        qGas_Max = user_input['Original_qGas'][0:qGas_max_len] + qGas_uncertainty
+        qGas_Min = qGas - qGas_uncertainty
+        qGas_Max = qGas + qGas_uncertainty
 
-        pH_Min = user_input['Original_pH'][0:pH_max_len] - pH_uncertainty
-        pH_Max = user_input['Original_pH'][0:pH_max_len] + pH_uncertainty
+        pH_Min = pH - pH_uncertainty
+        pH_Max = pH + pH_uncertainty
 
         return [{
                 'name': 'gas',
-                'value': user_input['Original_qGas'][0:qGas_max_len],
+                'value': qGas,
                 'min': qGas_Min.tolist(),
                 'max': qGas_Max.tolist()
             },
             {
                 'name': 'ph',
-                'value': user_input['Original_pH'][0:pH_max_len],
+                'value': pH,
                 'min': pH_Min.tolist(),
                 'max': pH_Max.tolist()
             }]
 
-    def running_condition(self, trh, current_day, simulate_results, last_x):
+    def running_condition(self, trh, current_day, convergence, min_trh=None):
+        if min_trh is None:
+            min_trh = self.min_trh
         keep_going = True
-        if current_day > self.min_trh*trh:
-            last_x_rows = simulate_results.iloc[-(last_x+1):]
-            shifted_results = last_x_rows.shift(-1, axis=0, fill_value=0)
-            difference = (last_x_rows - shifted_results).abs().iloc[-(last_x+1):-1]             # |(Xi-1) - Xi|
-            threshold = (shifted_results*self.converge_ratio).iloc[-(last_x+1):-1]
-
-            diff = difference - threshold   # if a - b is negative then a < b
-            if diff._values.max() < 0:
-                keep_going = False
+        if current_day > min_trh*trh and convergence.converged():
+            keep_going = False
 
         return keep_going
 
-    def simulate(self, t_step, state_zero, state_input, user_input, solvermethod = 'DOP853'):
-        r = scipy.integrate.solve_ivp(self.ADM1_ODE, t_step, state_zero, method= solvermethod, rtol = 1e-7, args=(state_input, user_input['q_ad'], user_input['V_liq'], user_input['V_gas'], user_input['Kh']))
+    def simulate(self, t_step, state_zero, state_input, user_input, solvermethod = 'DOP853', budget=None):
+        rhs = self.rhs.bind(state_input, user_input['q_ad'], user_input['V_liq'], user_input['V_gas'], user_input['Kh'])
+        r = scipy.integrate.solve_ivp(rhs, t_step, state_zero, method= solvermethod, rtol = self.rtol, **self.jacobian_options(rhs, solvermethod))
+        if budget is not None:
+            budget.count(r.nfev)
         return r.y[:,-1].T
 
-    def ADM1_ODE(self, t, state_zero, state_input, q_ad, V_liq, V_gas, k_hyd):
+    def jacobian_options(self, rhs, solvermethod, jac=None):
+        """Jacobian arguments for the implicit solvers (BDF, Radau, LSODA), none for the explicit ones."""
+        if solvermethod not in ('BDF', 'Radau', 'LSODA'):
+            return {}
+        # LSODA has no support for a sparsity pattern
+        if self.jacobian == 'sparse' and solvermethod != 'LSODA':
+            return {'jac_sparsity': rhs.sparsity()}
+        return {'jac': jac or rhs.jacobian}
 
-        S_su, S_aa, S_fa, S_va, S_bu, S_pro, S_ac, S_h2, S_ch4, S_IC, S_IN, S_I, X_xc, X_ch, X_pr, X_li, X_su, X_aa, X_fa, X_c4, X_pro, X_ac, X_h2, X_I, S_cation, S_anion, S_H_ion, S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion, S_co2, S_nh3, S_nh4_ion, S_gas_h2, S_gas_ch4, S_gas_co2, pH = state_zero
-        S_su_in,S_aa_in,S_fa_in,S_va_in,S_bu_in,S_pro_in,S_ac_in,S_h2_in,S_ch4_in,S_IC_in,S_IN_in,S_I_in,X_xc_in,X_ch_in,X_pr_in,X_li_in,X_su_in,X_aa_in,X_fa_in,X_c4_in,X_pro_in,X_ac_in,X_h2_in,X_I_in,S_cation_in,S_anion_in = state_input
-
-        S_nh4_ion = S_IN - S_nh3
-        S_co2 = S_IC - S_hco3_ion
-
-        I_pH_aa = (self.K_pH_aa ** self.nn_aa) / (S_H_ion ** self.nn_aa + self.K_pH_aa ** self.nn_aa)
-        I_pH_ac = (self.K_pH_ac ** self.n_ac) / (S_H_ion ** self.n_ac + self.K_pH_ac ** self.n_ac)
-        I_pH_h2 = (self.K_pH_h2 ** self.n_h2) / (S_H_ion ** self.n_h2 + self.K_pH_h2 ** self.n_h2)
-        I_IN_lim = 1 / (1 + (self.K_S_IN / S_IN))
-        I_h2_fa = 1 / (1 + (S_h2 / self.K_I_h2_fa))
-        I_h2_c4 = 1 / (1 + (S_h2 / self.K_I_h2_c4))
-        I_h2_pro = 1 / (1 + (S_h2 / self.K_I_h2_pro))
-        I_nh3 = 1 / (1 + (S_nh3 / self.K_I_nh3))
-
-        # biochemical process rates from Rosen et al (2006) BSM2 report
-        Rho_1 = self.k_dis * X_xc  # Disintegration
-        Rho_2 = k_hyd * X_ch # Hydrolysis of carbohydrates
-        Rho_3 = k_hyd * X_pr # Hydrolysis of proteins
-        Rho_4 = k_hyd * X_li  # Hydrolysis of lipids
-        Rho_5 = self.k_m_su * S_su / (self.K_S_su + S_su) * X_su * (I_pH_aa * I_IN_lim) # Uptake of sugars
-        Rho_6 = self.k_m_aa * (S_aa / (self.K_S_aa + S_aa)) * X_aa * (I_pH_aa * I_IN_lim)  # Uptake of amino-acids
-        Rho_7 = self.k_m_fa * (S_fa / (self.K_S_fa + S_fa)) * X_fa * (I_pH_aa * I_IN_lim * I_h2_fa)  # Uptake of LCFA (long-chain fatty acids)
-        Rho_8 = self.k_m_c4 * (S_va / (self.K_S_c4 + S_va)) * X_c4 * (S_va / (S_bu + S_va + 1e-6)) * (I_pH_aa * I_IN_lim * I_h2_c4)  # Uptake of valerate
-        Rho_9 = self.k_m_c4 * (S_bu / (self.K_S_c4 + S_bu)) * X_c4 * (S_bu / (S_bu + S_va + 1e-6)) * (I_pH_aa * I_IN_lim * I_h2_c4)  # Uptake of butyrate
-        Rho_10 = self.k_m_pro * (S_pro / (self.K_S_pro + S_pro)) * X_pro * (I_pH_aa * I_IN_lim * I_h2_pro)  # Uptake of propionate
-        Rho_11 = self.k_m_ac * (S_ac / (self.K_S_ac + S_ac)) * X_ac * (I_pH_ac * I_IN_lim * I_nh3)  # Uptake of acetate
-        Rho_12 = self.k_m_h2 * (S_h2 / (self.K_S_h2 + S_h2)) * X_h2 * (I_pH_h2 * I_IN_lim)  # Uptake of hydrogen
-        Rho_13 = self.k_dec_X_su * X_su  # Decay of X_su
-        Rho_14 = self.k_dec_X_aa * X_aa  # Decay of X_aa
-        Rho_15 = self.k_dec_X_fa * X_fa  # Decay of X_fa
-        Rho_16 = self.k_dec_X_c4 * X_c4  # Decay of X_c4
-        Rho_17 = self.k_dec_X_pro * X_pro  # Decay of X_pro
-        Rho_18 = self.k_dec_X_ac * X_ac  # Decay of X_ac
-        Rho_19 = self.k_dec_X_h2 * X_h2  # Decay of X_h2
-
-        # acid-base rates for the BSM2 ODE implementation from Rosen et al (2006) BSM2 report TODO: not used?
-        # Rho_A_4 = self.k_A_B_va * (S_va_ion * (self.K_a_va + S_H_ion) - self.K_a_va * S_va)
-        # Rho_A_5 = self.k_A_B_bu * (S_bu_ion * (self.K_a_bu + S_H_ion) - self.K_a_bu * S_bu)
-        # Rho_A_6 = self.k_A_B_pro * (S_pro_ion * (self.K_a_pro + S_H_ion) - self.K_a_pro * S_pro)
-        # Rho_A_7 = self.k_A_B_ac * (S_ac_ion * (self.K_a_ac + S_H_ion) - self.K_a_ac * S_ac)
-        # Rho_A_10 = self.k_A_B_co2 * (S_hco3_ion * (self.K_a_co2 + S_H_ion) - self.K_a_co2 * S_IC)
-        # Rho_A_11 = self.k_A_B_IN * (S_nh3 * (self.K_a_IN + S_H_ion) - self.K_a_IN * S_IN)
-
-        # gas phase algebraic equations from Rosen et al (2006) BSM2 report
-        p_gas_h2 = S_gas_h2 * self.R * self.T_op / 16.0
-        p_gas_ch4 = S_gas_ch4 * self.R * self.T_op / 64.0
-        p_gas_co2 = S_gas_co2 * self.R * self.T_op
-
-
-        p_gas = p_gas_h2 + p_gas_ch4 + p_gas_co2 + self.p_gas_h2o
-        q_gas = self.k_p * (p_gas- self.p_atm)
-        if q_gas < 0:    q_gas = 0
-
-        # gas transfer rates from Rosen et al (2006) BSM2 report
-        Rho_T_8 = self.k_L_a * (S_h2 - 16 * self.K_H_h2 * p_gas_h2)
-        Rho_T_9 = self.k_L_a * (S_ch4 - 64 * self.K_H_ch4 * p_gas_ch4)
-        Rho_T_10 = self.k_L_a * (S_co2 - self.K_H_co2 * p_gas_co2)
-
-        diff_S_su = q_ad / V_liq * (S_su_in - S_su) + Rho_2 + (1 - self.f_fa_li) * Rho_4 - Rho_5  # eq1
-        diff_S_aa = q_ad / V_liq * (S_aa_in - S_aa) + Rho_3 - Rho_6  # eq2
-        diff_S_fa = q_ad / V_liq * (S_fa_in - S_fa) + (self.f_fa_li * Rho_4) - Rho_7  # eq3
-        diff_S_va = q_ad / V_liq * (S_va_in - S_va) + (1 - self.Y_aa) * self.f_va_aa * Rho_6 - Rho_8  # eq4
-        diff_S_bu = q_ad / V_liq * (S_bu_in - S_bu) + (1 - self.Y_su) * self.f_bu_su * Rho_5 + (1 - self.Y_aa) * self.f_bu_aa * Rho_6 - Rho_9  # eq5
-        diff_S_pro = q_ad / V_liq * (S_pro_in - S_pro) + (1 - self.Y_su) * self.f_pro_su * Rho_5 + (1 - self.Y_aa) * self.f_pro_aa * Rho_6 + (1 - self.Y_c4) * 0.54 * Rho_8 - Rho_10  # eq6
-        diff_S_ac = q_ad / V_liq * (S_ac_in - S_ac) + (1 - self.Y_su) * self.f_ac_su * Rho_5 + (1 - self.Y_aa) * self.f_ac_aa * Rho_6 + (1 - self.Y_fa) * 0.7 * Rho_7 + (1 - self.Y_c4) * 0.31 * Rho_8 + (1 - self.Y_c4) * 0.8 * Rho_9 + (1 - self.Y_pro) * 0.57 * Rho_10 - Rho_11  # eq7
-        #diff_S_h2 is defined with DAE paralel equaitons
-        diff_S_ch4 = q_ad / V_liq * (S_ch4_in - S_ch4) + (1 - self.Y_ac) * Rho_11 + (1 - self.Y_h2) * Rho_12 - Rho_T_9  # eq9
-
-        ## eq10 start##
-        s_1 = -1 * self.C_xc + self.f_sI_xc * self.C_sI + self.f_ch_xc * self.C_ch + self.f_pr_xc * self.C_pr + self.f_li_xc * self.C_li + self.f_xI_xc * self.C_xI
-        s_2 = -1 * self.C_ch + self.C_su
-        s_3 = -1 * self.C_pr + self.C_aa
-        s_4 = -1 * self.C_li + (1 - self.f_fa_li) * self.C_su + self.f_fa_li * self.C_fa
-        s_5 = -1 * self.C_su + (1 - self.Y_su) * (self.f_bu_su * self.C_bu + self.f_pro_su * self.C_pro + self.f_ac_su * self.C_ac) + self.Y_su * self.C_bac
-        s_6 = -1 * self.C_aa + (1 - self.Y_aa) * (self.f_va_aa * self.C_va + self.f_bu_aa * self.C_bu + self.f_pro_aa * self.C_pro + self.f_ac_aa * self.C_ac) + self.Y_aa * self.C_bac
-        s_7 = -1 * self.C_fa + (1 - self.Y_fa) * 0.7 * self.C_ac + self.Y_fa * self.C_bac
-        s_8 = -1 * self.C_va + (1 - self.Y_c4) * 0.54 * self.C_pro + (1 - self.Y_c4) * 0.31 * self.C_ac + self.Y_c4 * self.C_bac
-        s_9 = -1 * self.C_bu + (1 - self.Y_c4) * 0.8 * self.C_ac + self.Y_c4 * self.C_bac
-        s_10 = -1 * self.C_pro + (1 - self.Y_pro) * 0.57 * self.C_ac + self.Y_pro * self.C_bac
-        s_11 = -1 * self.C_ac + (1 - self.Y_ac) * self.C_ch4 + self.Y_ac * self.C_bac
-        s_12 = (1 - self.Y_h2) * self.C_ch4 + self.Y_h2 * self.C_bac
-        s_13 = -1 * self.C_bac + self.C_xc
-
-        sigma = s_1 * Rho_1 + s_2 * Rho_2 + s_3 * Rho_3 + s_4 * Rho_4 + s_5 * Rho_5 + s_6 * Rho_6 + s_7 * Rho_7 + s_8 * Rho_8 + s_9 * Rho_9 + s_10 * Rho_10 + s_11 * Rho_11 + s_12 * Rho_12 + s_13 * (Rho_13 + Rho_14 + Rho_15 + Rho_16 + Rho_17 + Rho_18 + Rho_19)
-
-        diff_S_IC = q_ad / V_liq * (S_IC_in - S_IC) - sigma - Rho_T_10
-        ## eq10 end##
-        
-        diff_S_IN = q_ad / V_liq * (S_IN_in - S_IN) + (self.N_xc - self.f_xI_xc * self.N_I - self.f_sI_xc * self.N_I-self.f_pr_xc * self.N_aa) * Rho_1 - self.Y_su * self.N_bac * Rho_5 + (self.N_aa - self.Y_aa * self.N_bac) * Rho_6 - self.Y_fa * self.N_bac * Rho_7 - self.Y_c4 * self.N_bac * Rho_8 - self.Y_c4 * self.N_bac * Rho_9 - self.Y_pro * self.N_bac * Rho_10 - self.Y_ac * self.N_bac * Rho_11 - self.Y_h2 * self.N_bac * Rho_12 + (self.N_bac - self.N_xc) * (Rho_13 + Rho_14 + Rho_15 + Rho_16 + Rho_17 + Rho_18 + Rho_19) # eq11 
-        diff_S_I = q_ad / V_liq * (S_I_in - S_I) + self.f_sI_xc * Rho_1  # eq12
-        # Differential equations 13 to 24 (particulate matter)
-        diff_X_xc = q_ad / V_liq * (X_xc_in - X_xc) - Rho_1 + Rho_13 + Rho_14 + Rho_15 + Rho_16 + Rho_17 + Rho_18 + Rho_19  # eq13 
-        diff_X_ch = q_ad / V_liq * (X_ch_in - X_ch) + self.f_ch_xc * Rho_1 - Rho_2  # eq14 
-        diff_X_pr = q_ad / V_liq * (X_pr_in - X_pr) + self.f_pr_xc * Rho_1 - Rho_3  # eq15 
-        diff_X_li = q_ad / V_liq * (X_li_in - X_li) + self.f_li_xc * Rho_1 - Rho_4  # eq16 
-        diff_X_su = q_ad / V_liq * (X_su_in - X_su) + self.Y_su * Rho_5 - Rho_13  # eq17
-        diff_X_aa = q_ad / V_liq * (X_aa_in - X_aa) + self.Y_aa * Rho_6 - Rho_14  # eq18
-        diff_X_fa = q_ad / V_liq * (X_fa_in - X_fa) + self.Y_fa * Rho_7 - Rho_15  # eq19
-        diff_X_c4 = q_ad / V_liq * (X_c4_in - X_c4) + self.Y_c4 * Rho_8 + self.Y_c4 * Rho_9 - Rho_16  # eq20
-        diff_X_pro = q_ad / V_liq * (X_pro_in - X_pro) + self.Y_pro * Rho_10 - Rho_17  # eq21
-        diff_X_ac = q_ad / V_liq * (X_ac_in - X_ac) + self.Y_ac * Rho_11 - Rho_18  # eq22
-        diff_X_h2 = q_ad / V_liq * (X_h2_in - X_h2) + self.Y_h2 * Rho_12 - Rho_19  # eq23
-        diff_X_I = q_ad / V_liq * (X_I_in - X_I) + self.f_xI_xc * Rho_1  # eq24 
-        # Differential equations 25 and 26 (cations and anions)
-        diff_S_cation = q_ad / V_liq * (S_cation_in - S_cation)  # eq25
-        diff_S_anion = q_ad / V_liq * (S_anion_in - S_anion)  # eq26
-        diff_S_h2 = 0
-        # Differential equations 27 to 32 (ion states, only for ODE implementation)
-        diff_S_va_ion = 0   # eq27
-        diff_S_bu_ion = 0   # eq28
-        diff_S_pro_ion = 0  # eq29
-        diff_S_ac_ion = 0   # eq30
-        diff_S_hco3_ion = 0 # eq31
-        diff_S_nh3 = 0      # eq32
-        # Gas phase equations: Differential equations 33 to 35
-        diff_S_gas_h2 = (q_gas / V_gas * -1 * S_gas_h2) + (Rho_T_8 * V_liq / V_gas)  # eq33
-        diff_S_gas_ch4 = (q_gas / V_gas * -1 * S_gas_ch4) + (Rho_T_9 * V_liq / V_gas)  # eq34
-        diff_S_gas_co2 = (q_gas / V_gas * -1 * S_gas_co2) + (Rho_T_10 * V_liq / V_gas)  # eq35
-
-        diff_S_H_ion = 0
-        diff_S_co2 = 0
-        diff_S_nh4_ion = 0 #to keep the output same length as input for ADM1_ODE funcion
-
-        return diff_S_su, diff_S_aa, diff_S_fa, diff_S_va, diff_S_bu, diff_S_pro, diff_S_ac, diff_S_h2, diff_S_ch4, diff_S_IC, diff_S_IN, diff_S_I, diff_X_xc, diff_X_ch, diff_X_pr, diff_X_li, diff_X_su, diff_X_aa, diff_X_fa, diff_X_c4, diff_X_pro, diff_X_ac, diff_X_h2, diff_X_I, diff_S_cation, diff_S_anion, diff_S_H_ion, diff_S_va_ion,  diff_S_bu_ion, diff_S_pro_ion, diff_S_ac_ion, diff_S_hco3_ion, diff_S_co2,  diff_S_nh3, diff_S_nh4_ion, diff_S_gas_h2, diff_S_gas_ch4, diff_S_gas_co2, diff_S_H_ion
-
-    def DAESolve(self, S_su, S_aa, S_fa, S_va, S_bu, S_pro, S_ac, S_h2, S_ch4, S_IC, S_IN, S_I, X_xc, X_ch, X_pr, X_li, X_su, X_aa, X_fa, X_c4, X_pro, X_ac, X_h2, X_I, S_cation, S_anion, S_H_ion, S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion, S_co2, S_nh3, S_nh4_ion, S_gas_h2, S_gas_ch4, S_gas_co2, V_liq, q_ad, S_h2_in):
-        eps = 0.0000001
-        prevS_H_ion = S_H_ion
-
-        shdelta = S_h2delta = shgradeq = S_h2gradeq = 1.0
-        tol = 10 ** (-12) #solver accuracy tolerance
-        maxIter = 1000 #maximum number of iterations for solver
-        i = 1
-        j = 1
-
-        while ((shdelta > tol or shdelta < -tol) and (i <= maxIter)):
-            S_va_ion = self.K_a_va * S_va / (self.K_a_va + S_H_ion)
-            S_bu_ion = self.K_a_bu * S_bu / (self.K_a_bu + S_H_ion)
-            S_pro_ion = self.K_a_pro * S_pro / (self.K_a_pro + S_H_ion)
-            S_ac_ion = self.K_a_ac * S_ac / (self.K_a_ac + S_H_ion)
-            S_hco3_ion = self.K_a_co2 * S_IC / (self.K_a_co2 + S_H_ion)
-            S_nh3 = self.K_a_IN * S_IN / (self.K_a_IN + S_H_ion)
-            shdelta = S_cation + (S_IN - S_nh3) + S_H_ion - S_hco3_ion - S_ac_ion / 64.0 - S_pro_ion / 112.0 - S_bu_ion / 160.0 - S_va_ion / 208.0 - self.K_w / S_H_ion - S_anion
-            shgradeq = 1 + self.K_a_IN * S_IN / ((self.K_a_IN + S_H_ion) * (self.K_a_IN + S_H_ion)) + self.K_a_co2 * S_IC / ((self.K_a_co2 + S_H_ion) * (self.K_a_co2 + S_H_ion)) + 1 / 64.0 * self.K_a_ac * S_ac / ((self.K_a_ac + S_H_ion) * (self.K_a_ac + S_H_ion)) + 1 / 112.0 * self.K_a_pro * S_pro / ((self.K_a_pro + S_H_ion) * (self.K_a_pro + S_H_ion)) + 1 / 160.0 * self.K_a_bu * S_bu / ((self.K_a_bu + S_H_ion) * (self.K_a_bu + S_H_ion)) + 1 / 208.0 * self.K_a_va * S_va / ((self.K_a_va + S_H_ion) * (self.K_a_va + S_H_ion)) + self.K_w / (S_H_ion * S_H_ion)
-            S_H_ion = S_H_ion - shdelta / shgradeq
-            if S_H_ion <= 0:
-                S_H_ion = tol
-            i+=1
-
-        # pH calculation
-        pH = - np.log10(S_H_ion)
-        
-        #DAE solver for S_h2 from Rosen et al. (2006) 
-        while ((S_h2delta > tol or S_h2delta < -tol) and (j <= maxIter)):
-            I_pH_aa = (self.K_pH_aa ** self.nn_aa) / (prevS_H_ion ** self.nn_aa + self.K_pH_aa ** self.nn_aa)
-        
-            I_pH_h2 = (self.K_pH_h2 ** self.n_h2) / (prevS_H_ion ** self.n_h2 + self.K_pH_h2 ** self.n_h2)
-            I_IN_lim = 1 / (1 + (self.K_S_IN / S_IN))
-            I_h2_fa = 1 / (1 + (S_h2 / self.K_I_h2_fa))
-            I_h2_c4 = 1 / (1 + (S_h2 / self.K_I_h2_c4))
-            I_h2_pro = 1 / (1 + (S_h2 / self.K_I_h2_pro))
-        
-            I_5 = I_pH_aa * I_IN_lim
-            I_6 = I_5
-            I_7 = I_pH_aa * I_IN_lim * I_h2_fa
-            I_8 = I_pH_aa * I_IN_lim * I_h2_c4
-            I_9 = I_8
-            I_10 = I_pH_aa * I_IN_lim * I_h2_pro
-        
-            I_12 = I_pH_h2 * I_IN_lim
-            Rho_5 = self.k_m_su * (S_su / (self.K_S_su + S_su)) * X_su * I_5  # Uptake of sugars
-            Rho_6 = self.k_m_aa * (S_aa / (self.K_S_aa + S_aa)) * X_aa * I_6  # Uptake of amino-acids
-            Rho_7 = self.k_m_fa * (S_fa / (self.K_S_fa + S_fa)) * X_fa * I_7  # Uptake of LCFA (long-chain fatty acids)
-            Rho_8 = self.k_m_c4 * (S_va / (self.K_S_c4 + S_va)) * X_c4 * (S_va / (S_bu + S_va+ 1e-6)) * I_8  # Uptake of valerate
-            Rho_9 = self.k_m_c4 * (S_bu / (self.K_S_c4 + S_bu)) * X_c4 * (S_bu / (S_bu + S_va+ 1e-6)) * I_9  # Uptake of butyrate
-            Rho_10 = self.k_m_pro * (S_pro / (self.K_S_pro + S_pro)) * X_pro * I_10  # Uptake of propionate
-            Rho_12 = self.k_m_h2 * (S_h2 / (self.K_S_h2 + S_h2)) * X_h2 * I_12  # Uptake of hydrogen
-            p_gas_h2 = S_gas_h2 * self.R * self.T_op / 16
-            Rho_T_8 = self.k_L_a * (S_h2 - 16 * self.K_H_h2 * p_gas_h2)
-            S_h2delta = q_ad / V_liq * (S_h2_in - S_h2) + (1 - self.Y_su) * self.f_h2_su * Rho_5 + (1 - self.Y_aa) * self.f_h2_aa * Rho_6 + (1 - self.Y_fa) * 0.3 * Rho_7 + (1 - self.Y_c4) * 0.15 * Rho_8 + (1 - self.Y_c4) * 0.2 * Rho_9 + (1 - self.Y_pro) * 0.43 * Rho_10 - Rho_12 - Rho_T_8
-            S_h2gradeq = - 1.0 / V_liq * q_ad - 3.0 / 10.0 * (1 - self.Y_fa) * self.k_m_fa * S_fa / (self.K_S_fa + S_fa) * X_fa * I_pH_aa / (1 + self.K_S_IN / S_IN) / ((1 + S_h2 / self.K_I_h2_fa) * (1 + S_h2 / self.K_I_h2_fa)) / self.K_I_h2_fa - 3.0 / 20.0 * (1 - self.Y_c4) * self.k_m_c4 * S_va * S_va / (self.K_S_c4 + S_va) * X_c4 / (S_bu + S_va + eps) * I_pH_aa / (1 + self.K_S_IN / S_IN) / ((1 + S_h2 / self.K_I_h2_c4 ) * (1 + S_h2 / self.K_I_h2_c4 )) / self.K_I_h2_c4 - 1.0 / 5.0 * (1 - self.Y_c4) * self.k_m_c4 * S_bu * S_bu / (self.K_S_c4 + S_bu) * X_c4 / (S_bu + S_va + eps) * I_pH_aa / (1 + self.K_S_IN / S_IN) / ((1 + S_h2 / self.K_I_h2_c4 ) * (1 + S_h2 / self.K_I_h2_c4 )) / self.K_I_h2_c4 - 43.0 / 100.0 * (1 - self.Y_pro) * self.k_m_pro * S_pro / (self.K_S_pro + S_pro) * X_pro * I_pH_aa / (1 + self.K_S_IN / S_IN) / ((1 + S_h2 / self.K_I_h2_pro ) * (1 + S_h2 / self.K_I_h2_pro )) / self.K_I_h2_pro - self.k_m_h2 / (self.K_S_h2 + S_h2) * X_h2 * I_pH_h2 / (1 + self.K_S_IN / S_IN) + self.k_m_h2 * S_h2 / ((self.K_S_h2 + S_h2) * (self.K_S_h2 + S_h2)) * X_h2 * I_pH_h2 / (1 + self.K_S_IN / S_IN) - self.k_L_a
-            S_h2 = S_h2 - S_h2delta / S_h2gradeq
-            if S_h2 <= 0:
-                S_h2 = tol
-            j+=1
-
-        return S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion, S_nh3, S_H_ion, pH, p_gas_h2, S_h2, S_nh4_ion, S_co2#, P_gas, q_gas
+    def ADM1_ODE(self, t, state_zero, state_input, q_ad, V_liq, V_gas, k_hyd):
+        return self.rhs.bind(state_input, q_ad, V_liq, V_gas, k_hyd)(t, np.asarray(state_zero, dtype=float))
 
     def init_dependent_params(self):
         self.K_w =  10 ** -14.0 * np.exp((55900 / (100 * self.R)) * (1 / self.T_base - 1 / self.T_op))
@@ -493,12 +621,3 @@ class ADM1:
             S_cation_in = te_ref-((S_IN_in - Snh3_in) - Shco3_in - Saac_in/64 - Sapro_in/112 - Sabu_in/160 - Sava_in/208 - S_anion_in)  #kmole.m^-3
 
         return S_su_in,S_aa_in,S_fa_in,S_va_in,S_bu_in,S_pro_in,S_ac_in,S_h2_in,S_ch4_in,S_IC_in,S_IN_in,S_I_in,X_xc_in,X_ch_in,X_pr_in,X_li_in,X_su_in,X_aa_in,X_fa_in,X_c4_in,X_pro_in,X_ac_in,X_h2_in,X_I_in,S_cation_in,S_anion_in
-    
-    def update_progress(self, result, url):
-        if url:
-            try:
-                response = post(url, data=dumps(result))
-            except Exception as e:
-                # TODO: Should be handled by logging
-                print(e)
-                print('Error sending progress.')
\ No newline at end of file
@@ -0,0 +1,40 @@
+from time import monotonic
+
+
+class CancelToken:
+    """Cancel flag of a run in a dict shared with the process that submitted it (a Manager dict)."""
+
+    def __init__(self, flags, run_id):
+        self.flags = flags
+        self.run_id = run_id
+
+    def cancelled(self):
+        return self.flags.get(self.run_id, False)
+
+
+class Budget:
+    """
+    Limits of one simulation, checked by the simulation between days (and
+    Newton iterations): an optional CancelToken, a wall-clock budget from
+    the start of the run and a budget of RHS evaluations, which the
+    integrators add with count(). exhausted() gives the first limit reached.
+    """
+
+    def __init__(self, max_wall_seconds=None, max_rhs_evals=None, token=None):
+        self.deadline = monotonic() + max_wall_seconds if max_wall_seconds is not None else None
+        self.max_rhs_evals = max_rhs_evals
+        self.token = token
+        self.rhs_evals = 0
+
+    def count(self, evaluations):
+        self.rhs_evals += evaluations
+
+    def exhausted(self):
+        """'cancelled', 'max_wall_seconds' or 'max_rhs_evals' once that limit is reached, else None."""
+        if self.token is not None and self.token.cancelled():
+            return 'cancelled'
+        if self.deadline is not None and monotonic() >= self.deadline:
+            return 'max_wall_seconds'
+        if self.max_rhs_evals is not None and self.rhs_evals >= self.max_rhs_evals:
+            return 'max_rhs_evals'
+        return None
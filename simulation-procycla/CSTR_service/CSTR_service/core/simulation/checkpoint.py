@@ -0,0 +1,84 @@
+import logging
+import numpy as np
+from os import path, makedirs, listdir, remove, replace, stat
+from time import time
+from CSTR_service.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint:
+    """
+    Checkpoint file of one dynamic simulation: the last day simulated, the
+    trajectory so far (whose last row is the state to resume from) and the
+    min_trh of the run. digest identifies the inputs it was written for, a
+    checkpoint of other inputs is never resumed.
+    """
+
+    def __init__(self, file, digest, interval):
+        self.file = file
+        self.digest = digest
+        self.interval = interval
+
+    def load(self):
+        """(day, trajectory rows, min_trh) of the checkpoint, None when there is none for this digest."""
+        try:
+            with np.load(self.file) as checkpoint:
+                if str(checkpoint['digest']) != self.digest:
+                    return None
+                return int(checkpoint['day']), checkpoint['trajectory'], float(checkpoint['min_trh'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, day, trajectory, min_trh, force=False):
+        """Writes the checkpoint every interval days or when forced, aside and moved so a restart never reads a partial file."""
+        if day % self.interval and not force:
+            return
+        try:
+            with open(self.file + '.tmp', 'wb') as f:
+                np.savez(f, digest=np.array(self.digest), day=np.array(day), trajectory=trajectory.data[:trajectory.size], min_trh=np.array(min_trh))
+            replace(self.file + '.tmp', self.file)
+        except OSError as e:
+            logger.warning('Error writing the checkpoint: %s', e)
+
+    def remove(self):
+        try:
+            remove(self.file)
+        except OSError:
+            pass
+
+
+class CheckpointStore:
+    """
+    Checkpoints of the simulations by checkpoint id, in one directory. Disabled
+    without a path. The checkpoints of runs that were never resubmitted are
+    removed once they are max_age seconds old, checked on every get().
+    """
+
+    def __init__(self, checkpoint_path, interval, max_age):
+        self.checkpoint_path = checkpoint_path
+        self.interval = interval
+        self.max_age = max_age
+        if checkpoint_path:
+            makedirs(checkpoint_path, exist_ok=True)
+
+    def get(self, checkpoint_id, digest):
+        if not self.checkpoint_path or not checkpoint_id:
+            return None
+        self.remove_expired()
+        return Checkpoint(path.join(self.checkpoint_path, checkpoint_id + '.npz'), digest, self.interval)
+
+    def remove_expired(self):
+        oldest = time() - self.max_age
+        for name in listdir(self.checkpoint_path):
+            file = path.join(self.checkpoint_path, name)
+            try:
+                if name.endswith(('.npz', '.tmp')) and stat(file).st_mtime < oldest:
+                    remove(file)
+            except OSError:
+                # removed by another worker
+                pass
+
+
+checkpoints = CheckpointStore(settings.config.get('resume', "path") or None, int(settings.config.get('resume', "interval-days")),
+                              float(settings.config.get('resume', "max-age-days"))*86400)
@@ -0,0 +1,193 @@
+import numpy as np
+from collections import namedtuple
+from math import sqrt
+from CSTR_service.core.simulation.rhs import (
+    S_SU, S_AA, S_FA, S_VA, S_BU, S_PRO, S_AC, S_H2, S_IC, S_IN, X_SU, X_AA, X_FA, X_C4, X_PRO, X_H2,
+    S_CATION, S_ANION, S_H_ION, S_GAS_H2)
+
+# S_H_ion and S_h2 of one or many reactors, with the Newton iterations each one needed
+DAESolution = namedtuple('DAESolution', ['S_H_ion', 'S_h2', 'iterations_H_ion', 'iterations_h2', 'converged'])
+
+# charge balance bracket, pH 15 to pH -1
+S_H_ION_MIN = 1e-15
+S_H_ION_MAX = 10.0
+
+
+class AlgebraicSolver:
+    """
+    Algebraic part of the ADM1 DAE (Rosen et al (2006) BSM2 report): the
+    charge balance for S_H_ion and the hydrogen balance for S_h2.
+
+    Both residuals are monotone in their unknown, so each is solved by
+    Newton's method warm-started from the S_H_ion/S_h2 already in the state,
+    falling back to bisection whenever a Newton step leaves the current
+    bracket of the root. States can be given as a sequence of 39 floats (one
+    reactor) or of 39 arrays (one column per reactor).
+    """
+
+    def __init__(self, adm1, tol=1e-12, max_iter=100):
+        p = adm1
+        self.tol = tol
+        self.max_iter = max_iter
+
+        self.acid = (p.K_a_va, p.K_a_bu, p.K_a_pro, p.K_a_ac, p.K_a_co2, p.K_a_IN, p.K_w)
+        self.hydrogen = (
+            p.K_pH_aa ** p.nn_aa, p.nn_aa, p.K_pH_h2 ** p.n_h2, p.n_h2, p.K_S_IN,
+            p.k_m_su, p.K_S_su, p.k_m_aa, p.K_S_aa, p.k_m_fa, p.K_S_fa, p.k_m_c4, p.K_S_c4,
+            p.k_m_pro, p.K_S_pro, p.k_m_h2, p.K_S_h2,
+            p.K_I_h2_fa, p.K_I_h2_c4, p.K_I_h2_pro,
+            (1 - p.Y_su) * p.f_h2_su, (1 - p.Y_aa) * p.f_h2_aa, (1 - p.Y_fa) * 0.3,
+            (1 - p.Y_c4) * 0.15, (1 - p.Y_c4) * 0.2, (1 - p.Y_pro) * 0.43,
+            p.k_L_a, p.K_H_h2 * p.R * p.T_op,
+        )
+
+    def ions(self, state, S_H_ion):
+        """S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion and S_nh3 at the given S_H_ion."""
+        K_a_va, K_a_bu, K_a_pro, K_a_ac, K_a_co2, K_a_IN, K_w = self.acid
+        return (
+            K_a_va * state[S_VA] / (K_a_va + S_H_ion),
+            K_a_bu * state[S_BU] / (K_a_bu + S_H_ion),
+            K_a_pro * state[S_PRO] / (K_a_pro + S_H_ion),
+            K_a_ac * state[S_AC] / (K_a_ac + S_H_ion),
+            K_a_co2 * state[S_IC] / (K_a_co2 + S_H_ion),
+            K_a_IN * state[S_IN] / (K_a_IN + S_H_ion),
+        )
+
+    def charge_balance(self, state):
+        """Residual and derivative of the charge balance as a function of S_H_ion (increasing)."""
+        K_a_va, K_a_bu, K_a_pro, K_a_ac, K_a_co2, K_a_IN, K_w = self.acid
+        S_va, S_bu, S_pro, S_ac = state[S_VA], state[S_BU], state[S_PRO], state[S_AC]
+        S_carbon, S_nitrogen = state[S_IC], state[S_IN]
+        charge = state[S_CATION] + S_nitrogen - state[S_ANION]
+
+        def residual(h):
+            d_va, d_bu, d_pro, d_ac, d_co2, d_IN = K_a_va + h, K_a_bu + h, K_a_pro + h, K_a_ac + h, K_a_co2 + h, K_a_IN + h
+            f = (charge - K_a_IN * S_nitrogen / d_IN + h - K_a_co2 * S_carbon / d_co2 - K_a_ac * S_ac / d_ac / 64.0
+                 - K_a_pro * S_pro / d_pro / 112.0 - K_a_bu * S_bu / d_bu / 160.0 - K_a_va * S_va / d_va / 208.0 - K_w / h)
+            df = (1 + K_a_IN * S_nitrogen / (d_IN * d_IN) + K_a_co2 * S_carbon / (d_co2 * d_co2) + K_a_ac * S_ac / (d_ac * d_ac) / 64.0
+                  + K_a_pro * S_pro / (d_pro * d_pro) / 112.0 + K_a_bu * S_bu / (d_bu * d_bu) / 160.0
+                  + K_a_va * S_va / (d_va * d_va) / 208.0 + K_w / (h * h))
+            return f, df
+
+        return residual
+
+    def hydrogen_balance(self, state, S_H_ion, D, S_h2_in):
+        """
+        Residual and derivative of the S_h2 balance as a function of S_h2,
+        with the sign flipped so that it is increasing, plus an upper bound of its root.
+        """
+        (K_pH_aa_n, nn_aa, K_pH_h2_n, n_h2, K_S_IN,
+         k_m_su, K_S_su, k_m_aa, K_S_aa, k_m_fa, K_S_fa, k_m_c4, K_S_c4,
+         k_m_pro, K_S_pro, k_m_h2, K_S_h2,
+         K_I_h2_fa, K_I_h2_c4, K_I_h2_pro,
+         f_su, f_aa, f_fa, f_va, f_bu, f_pro,
+         k_L_a, K_H_h2_RT) = self.hydrogen
+
+        S_su, S_aa, S_fa, S_va, S_bu, S_pro = state[S_SU], state[S_AA], state[S_FA], state[S_VA], state[S_BU], state[S_PRO]
+        I_pH_aa = K_pH_aa_n / (S_H_ion ** nn_aa + K_pH_aa_n)
+        I_pH_h2 = K_pH_h2_n / (S_H_ion ** n_h2 + K_pH_h2_n)
+        I_5 = I_pH_aa / (1 + K_S_IN / state[S_IN])
+        S_c4 = S_bu + S_va + 1e-6
+
+        # S_h2 independent sources, and the h2-inhibited ones without their inhibition term
+        source = (D * S_h2_in
+                  + f_su * k_m_su * S_su / (K_S_su + S_su) * state[X_SU] * I_5
+                  + f_aa * k_m_aa * S_aa / (K_S_aa + S_aa) * state[X_AA] * I_5
+                  + k_L_a * K_H_h2_RT * state[S_GAS_H2])
+        a_fa = f_fa * k_m_fa * S_fa / (K_S_fa + S_fa) * state[X_FA] * I_5
+        a_c4 = (f_va * k_m_c4 * S_va / (K_S_c4 + S_va) * S_va / S_c4 + f_bu * k_m_c4 * S_bu / (K_S_c4 + S_bu) * S_bu / S_c4) * state[X_C4] * I_5
+        a_pro = f_pro * k_m_pro * S_pro / (K_S_pro + S_pro) * state[X_PRO] * I_5
+        b_h2 = k_m_h2 * state[X_H2] * I_pH_h2 / (1 + K_S_IN / state[S_IN])
+        sink = D + k_L_a
+
+        def residual(s):
+            i_fa, i_c4, i_pro = 1 + s / K_I_h2_fa, 1 + s / K_I_h2_c4, 1 + s / K_I_h2_pro
+            g = source - sink * s + a_fa / i_fa + a_c4 / i_c4 + a_pro / i_pro - b_h2 * s / (K_S_h2 + s)
+            dg = (-sink - a_fa / (K_I_h2_fa * i_fa * i_fa) - a_c4 / (K_I_h2_c4 * i_c4 * i_c4)
+                  - a_pro / (K_I_h2_pro * i_pro * i_pro) - b_h2 * K_S_h2 / ((K_S_h2 + s) * (K_S_h2 + s)))
+            return -g, -dg
+
+        return residual, (source + a_fa + a_c4 + a_pro) / sink
+
+    def solve(self, state, D, S_h2_in):
+        """
+        Solves S_H_ion and S_h2 for the state(s), warm-started from the state.
+        As in the original DAESolve, the pH inhibitions of the S_h2 balance use the S_H_ion of the state.
+        """
+        if isinstance(state[S_H_ION], float):
+            S_H_ion, it_H, ok_H = self.newton(self.charge_balance(state), state[S_H_ION], S_H_ION_MIN, S_H_ION_MAX, geometric=True)
+            residual, upper = self.hydrogen_balance(state, state[S_H_ION], D, S_h2_in)
+            S_h2, it_h2, ok_h2 = self.newton(residual, min(state[S_H2], upper), 0.0, upper, geometric=False)
+        else:
+            S_H_ion, it_H, ok_H = self.newton_many(self.charge_balance(state), state[S_H_ION], S_H_ION_MIN, S_H_ION_MAX, geometric=True)
+            residual, upper = self.hydrogen_balance(state, state[S_H_ION], D, S_h2_in)
+            S_h2, it_h2, ok_h2 = self.newton_many(residual, np.minimum(state[S_H2], upper), 0.0, upper, geometric=False)
+        return DAESolution(S_H_ion, S_h2, it_H, it_h2, ok_H & ok_h2)
+
+    def tangent(self, state, ds, solution, D, S_h2_in):
+        """
+        Derivatives of the S_H_ion and S_h2 of solve(state) along ds, one
+        direction per row of ds, by the implicit function theorem. The
+        residuals are differentiated along ds by complex step, which is exact
+        to rounding.
+        """
+        h = 1e-30
+        state_ds = [x + 1j * h * dx for x, dx in zip(state, ds.T)]
+
+        f, df = self.charge_balance(state)(solution.S_H_ion)
+        dS_H_ion = -self.charge_balance(state_ds)(solution.S_H_ion)[0].imag / h / df
+
+        # the S_h2 balance takes S_H_ion from the state, see solve()
+        residual, upper = self.hydrogen_balance(state, state[S_H_ION], D, S_h2_in)
+        g, dg = residual(solution.S_h2)
+        residual_ds, upper = self.hydrogen_balance(state_ds, state_ds[S_H_ION], D, S_h2_in)
+        dS_h2 = -residual_ds(solution.S_h2)[0].imag / h / dg
+        return dS_H_ion, dS_h2
+
+    def newton(self, residual, x, lo, hi, geometric):
+        """Safeguarded Newton iteration on an increasing residual, for one reactor."""
+        if not lo < x < hi:
+            x = sqrt(lo * hi) if geometric else 0.5 * (lo + hi)
+        for iteration in range(1, self.max_iter + 1):
+            f, df = residual(x)
+            if -self.tol <= f <= self.tol:
+                return x - f / df, iteration, True
+            if f < 0:
+                lo = x
+            else:
+                hi = x
+            x_new = x - f / df
+            if not lo < x_new < hi:
+                x_new = sqrt(lo * hi) if geometric and lo > 0 else 0.5 * (lo + hi)
+            if abs(x_new - x) <= 1e-15 * abs(x):
+                return x_new, iteration, True
+            x = x_new
+        return x, self.max_iter, False
+
+    def newton_many(self, residual, x, lo, hi, geometric):
+        """Safeguarded Newton iteration on an increasing residual, for many reactors at once."""
+        x = np.array(x, dtype=float)
+        lo = np.broadcast_to(np.asarray(lo, dtype=float), x.shape).copy()
+        hi = np.broadcast_to(np.asarray(hi, dtype=float), x.shape).copy()
+        outside = ~((lo < x) & (x < hi))
+        x[outside] = (np.sqrt(lo * hi) if geometric else 0.5 * (lo + hi))[outside]
+
+        iterations = np.zeros(x.shape, dtype=int)
+        active = np.ones(x.shape, dtype=bool)
+        for _ in range(self.max_iter):
+            f, df = residual(x)
+            iterations += active
+            step = x - f / df
+            done = active & (np.abs(f) <= self.tol)
+            x = np.where(done, step, x)
+            active &= ~done
+            if not active.any():
+                break
+            lo = np.where(active & (f < 0), x, lo)
+            hi = np.where(active & (f > 0), x, hi)
+            fallback = np.where(geometric & (lo > 0), np.sqrt(lo * hi), 0.5 * (lo + hi))
+            x_new = np.where((lo < step) & (step < hi), step, fallback)
+            x_new = np.where(active, x_new, x)
+            active &= np.abs(x_new - x) > 1e-15 * np.abs(x)
+            x = x_new
+        return x, iterations, ~active
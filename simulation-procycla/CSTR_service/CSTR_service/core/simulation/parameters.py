@@ -0,0 +1,137 @@
+import logging
+import hashlib
+import sys
+import numpy as np
+import pandas as pd
+from decimal import Decimal
+from json import loads
+from os import path, replace
+from threading import Lock
+from CSTR_service.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+PARAM_FILES_PATH = path.join(settings.CONFIG_DIR_PATH, 'param_files')
+
+def parameter_files():
+    """Constant files of [constant-files] path-list, then the initial values file."""
+    files = loads(settings.config.get('constant-files', "path-list")) + [settings.config.get('constant-files', "initial-values-path")]
+    return [path.join(PARAM_FILES_PATH, file) for file in files]
+
+def file_digest(files):
+    digest = hashlib.sha256()
+    for file in files:
+        with open(file, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ParameterSet:
+    """
+    Immutable ADM1 parameters: the constants as one contiguous, read-only
+    vector with their names, the initial state and the sha256 digest of the
+    files they were compiled from. A constant is read as an attribute,
+    parameters.k_dis.
+    """
+
+    __slots__ = ('names', 'values', 'index', 'state_zero', 'state_columns', 'digest')
+
+    def __init__(self, names, values, state_zero, state_columns, digest):
+        values = np.array(values, dtype=float)
+        values.flags.writeable = False
+        state_zero = np.array(state_zero, dtype=float)
+        state_zero.flags.writeable = False
+        for name, value in (('names', tuple(names)), ('values', values), ('index', {name: i for i, name in enumerate(names)}),
+                            ('state_zero', state_zero), ('state_columns', tuple(state_columns)), ('digest', digest)):
+            object.__setattr__(self, name, value)
+
+    def __getattr__(self, name):
+        try:
+            return float(self.values[self.index[name]])
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ParameterSet is immutable")
+
+    def __reduce__(self):
+        return ParameterSet, (self.names, self.values, self.state_zero, self.state_columns, self.digest)
+
+    @classmethod
+    def compile(cls, files, digest):
+        """Parses the constant files and the initial values file (the last one) of files."""
+        names, values = [], []
+        for file in files[:-1]:
+            dataframe = pd.read_csv(file, dtype=str)
+            # the first column is the row index of the files
+            for name in dataframe.columns[1:]:
+                names.append(name)
+                values.append(float(Decimal(dataframe[name][0])))
+
+        initial_params = pd.read_csv(files[-1], dtype=str)
+        state_zero = [float(Decimal(x)) for x in initial_params.loc[0].values[1:]]
+        return cls(names, values, state_zero, initial_params.columns[1:], digest)
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file) as artifact:
+            return cls(artifact['names'].tolist(), artifact['values'], artifact['state_zero'], artifact['state_columns'].tolist(), str(artifact['digest']))
+
+    def save(self, file):
+        # written aside and moved, a worker never loads a partial artifact
+        with open(file + '.tmp', 'wb') as f:
+            np.savez(f, names=np.array(self.names), values=self.values, state_zero=self.state_zero,
+                     state_columns=np.array(self.state_columns), digest=np.array(self.digest))
+        replace(file + '.tmp', file)
+
+
+class ParameterStore:
+    """
+    ParameterSet shared by every simulation of the process, compiled on first
+    use. With an artifact path, the set is loaded from that .npz while its
+    digest matches the parameter files and written there otherwise. reload()
+    is the only way the set changes, and only when the files did.
+    """
+
+    def __init__(self, artifact_path=None):
+        self.artifact_path = artifact_path
+        self.parameters = None
+        self.lock = Lock()
+
+    def get(self):
+        if self.parameters is None:
+            self.reload()
+        return self.parameters
+
+    def reload(self):
+        """Recompiles the parameter set if the digest of the files changed, returns whether it did."""
+        with self.lock:
+            files = parameter_files()
+            digest = file_digest(files)
+            if self.parameters is not None and self.parameters.digest == digest:
+                return False
+
+            parameters = None
+            if self.artifact_path and path.exists(self.artifact_path):
+                parameters = ParameterSet.load(self.artifact_path)
+                if parameters.digest != digest:
+                    parameters = None
+            if parameters is None:
+                parameters = ParameterSet.compile(files, digest)
+                if self.artifact_path:
+                    try:
+                        parameters.save(self.artifact_path)
+                    except OSError as e:
+                        logger.warning('Error writing the parameter artifact: %s', e)
+            self.parameters = parameters
+            return True
+
+
+artifact = settings.config.get('constant-files', "compiled-path")
+parameter_store = ParameterStore(path.join(PARAM_FILES_PATH, artifact) if artifact else None)
+
+if __name__ == '__main__':
+    # python -m CSTR_service.core.simulation.parameters [file.npz] precompiles the artifact
+    file = sys.argv[1] if len(sys.argv) > 1 else parameter_store.artifact_path
+    files = parameter_files()
+    ParameterSet.compile(files, file_digest(files)).save(file)
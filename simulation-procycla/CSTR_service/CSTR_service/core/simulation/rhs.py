@@ -0,0 +1,466 @@
+import numpy as np
+import scipy.sparse
+from copy import copy
+
+# state vector layout, same order as ADM1.init_columns
+(S_SU, S_AA, S_FA, S_VA, S_BU, S_PRO, S_AC, S_H2, S_CH4, S_IC, S_IN, S_I,
+ X_XC, X_CH, X_PR, X_LI, X_SU, X_AA, X_FA, X_C4, X_PRO, X_AC, X_H2, X_I,
+ S_CATION, S_ANION, S_H_ION, S_VA_ION, S_BU_ION, S_PRO_ION, S_AC_ION, S_HCO3_ION,
+ S_CO2, S_NH3, S_NH4_ION, S_GAS_H2, S_GAS_CH4, S_GAS_CO2, PH) = range(39)
+
+N_STATES = 39
+# Rho_1..Rho_19 (biochemical), Rho_T_8..Rho_T_10 (gas transfer) and the
+# gas outflow q_gas * S_gas of the three gas states
+N_PROCESSES = 25
+
+# states washed out by the feed: S_su..S_anion except S_h2, which is solved by the DAE
+DILUTED = np.array([i for i in range(S_ANION + 1) if i != S_H2])
+GAS = slice(S_GAS_H2, S_GAS_CO2 + 1)
+
+# compiled parameter vector, in the order unpacked by PetersenRHS.rates
+PARAMETERS = (
+    'k_dis', 'k_m_su', 'k_m_aa', 'k_m_fa', 'k_m_c4', 'k_m_pro', 'k_m_ac', 'k_m_h2',
+    'K_S_su', 'K_S_aa', 'K_S_fa', 'K_S_c4', 'K_S_pro', 'K_S_ac', 'K_S_h2',
+    'k_dec_X_su', 'k_dec_X_aa', 'k_dec_X_fa', 'k_dec_X_c4', 'k_dec_X_pro', 'k_dec_X_ac', 'k_dec_X_h2',
+    'K_S_IN', 'K_I_h2_fa', 'K_I_h2_c4', 'K_I_h2_pro', 'K_I_nh3',
+    'K_pH_aa', 'nn_aa', 'K_pH_ac', 'n_ac', 'K_pH_h2', 'n_h2',
+    'k_L_a', 'K_H_h2', 'K_H_ch4', 'K_H_co2', 'k_p', 'p_gas_h2o', 'p_atm', 'R', 'T_op',
+)
+
+
+class PetersenRHS:
+    """
+    Array form of the ADM1 ODE (Rosen et al (2006) BSM2 report).
+
+    The kinetic constants are compiled once into a contiguous parameter
+    vector and the derivatives are computed as
+    feed - dilution * state + stoichiometry @ rates, the Petersen matrix
+    formulation of ADM1. An instance is bound to one reactor with bind()
+    before being handed to the solver.
+    """
+
+    def __init__(self, adm1):
+        self.parameters = np.array([getattr(adm1, name) for name in PARAMETERS], dtype=float)
+        self.stoichiometry = self.build_stoichiometry(adm1)
+
+        self.constants = None
+        self.feed = None
+        self.dilution = None
+        self.rho = None
+
+    @staticmethod
+    def build_stoichiometry(p):
+        """Petersen matrix (states x processes) of ADM1, gas transfer rows per unit of liquid volume."""
+        M = np.zeros((N_STATES, N_PROCESSES))
+
+        # Rho_1 disintegration
+        M[S_IN, 0] = p.N_xc - p.f_xI_xc * p.N_I - p.f_sI_xc * p.N_I - p.f_pr_xc * p.N_aa
+        M[S_I, 0] = p.f_sI_xc
+        M[X_XC, 0] = -1
+        M[X_CH, 0] = p.f_ch_xc
+        M[X_PR, 0] = p.f_pr_xc
+        M[X_LI, 0] = p.f_li_xc
+        M[X_I, 0] = p.f_xI_xc
+        # Rho_2..Rho_4 hydrolysis
+        M[S_SU, 1] = 1
+        M[X_CH, 1] = -1
+        M[S_AA, 2] = 1
+        M[X_PR, 2] = -1
+        M[S_SU, 3] = 1 - p.f_fa_li
+        M[S_FA, 3] = p.f_fa_li
+        M[X_LI, 3] = -1
+        # Rho_5 uptake of sugars
+        M[S_SU, 4] = -1
+        M[S_BU, 4] = (1 - p.Y_su) * p.f_bu_su
+        M[S_PRO, 4] = (1 - p.Y_su) * p.f_pro_su
+        M[S_AC, 4] = (1 - p.Y_su) * p.f_ac_su
+        M[S_IN, 4] = -p.Y_su * p.N_bac
+        M[X_SU, 4] = p.Y_su
+        # Rho_6 uptake of amino-acids
+        M[S_AA, 5] = -1
+        M[S_VA, 5] = (1 - p.Y_aa) * p.f_va_aa
+        M[S_BU, 5] = (1 - p.Y_aa) * p.f_bu_aa
+        M[S_PRO, 5] = (1 - p.Y_aa) * p.f_pro_aa
+        M[S_AC, 5] = (1 - p.Y_aa) * p.f_ac_aa
+        M[S_IN, 5] = p.N_aa - p.Y_aa * p.N_bac
+        M[X_AA, 5] = p.Y_aa
+        # Rho_7 uptake of LCFA
+        M[S_FA, 6] = -1
+        M[S_AC, 6] = (1 - p.Y_fa) * 0.7
+        M[S_IN, 6] = -p.Y_fa * p.N_bac
+        M[X_FA, 6] = p.Y_fa
+        # Rho_8 uptake of valerate
+        M[S_VA, 7] = -1
+        M[S_PRO, 7] = (1 - p.Y_c4) * 0.54
+        M[S_AC, 7] = (1 - p.Y_c4) * 0.31
+        M[S_IN, 7] = -p.Y_c4 * p.N_bac
+        M[X_C4, 7] = p.Y_c4
+        # Rho_9 uptake of butyrate
+        M[S_BU, 8] = -1
+        M[S_AC, 8] = (1 - p.Y_c4) * 0.8
+        M[S_IN, 8] = -p.Y_c4 * p.N_bac
+        M[X_C4, 8] = p.Y_c4
+        # Rho_10 uptake of propionate
+        M[S_PRO, 9] = -1
+        M[S_AC, 9] = (1 - p.Y_pro) * 0.57
+        M[S_IN, 9] = -p.Y_pro * p.N_bac
+        M[X_PRO, 9] = p.Y_pro
+        # Rho_11 uptake of acetate
+        M[S_AC, 10] = -1
+        M[S_CH4, 10] = 1 - p.Y_ac
+        M[S_IN, 10] = -p.Y_ac * p.N_bac
+        M[X_AC, 10] = p.Y_ac
+        # Rho_12 uptake of hydrogen, S_h2 itself is left to the DAE solver
+        M[S_CH4, 11] = 1 - p.Y_h2
+        M[S_IN, 11] = -p.Y_h2 * p.N_bac
+        M[X_H2, 11] = p.Y_h2
+        # Rho_13..Rho_19 decay
+        for j, X in enumerate((X_SU, X_AA, X_FA, X_C4, X_PRO, X_AC, X_H2)):
+            M[X, 12 + j] = -1
+            M[X_XC, 12 + j] = 1
+            M[S_IN, 12 + j] = p.N_bac - p.N_xc
+
+        # eq10, inorganic carbon from the carbon balance s_1..s_13 of each process
+        s = np.array([
+            -1 * p.C_xc + p.f_sI_xc * p.C_sI + p.f_ch_xc * p.C_ch + p.f_pr_xc * p.C_pr + p.f_li_xc * p.C_li + p.f_xI_xc * p.C_xI,
+            -1 * p.C_ch + p.C_su,
+            -1 * p.C_pr + p.C_aa,
+            -1 * p.C_li + (1 - p.f_fa_li) * p.C_su + p.f_fa_li * p.C_fa,
+            -1 * p.C_su + (1 - p.Y_su) * (p.f_bu_su * p.C_bu + p.f_pro_su * p.C_pro + p.f_ac_su * p.C_ac) + p.Y_su * p.C_bac,
+            -1 * p.C_aa + (1 - p.Y_aa) * (p.f_va_aa * p.C_va + p.f_bu_aa * p.C_bu + p.f_pro_aa * p.C_pro + p.f_ac_aa * p.C_ac) + p.Y_aa * p.C_bac,
+            -1 * p.C_fa + (1 - p.Y_fa) * 0.7 * p.C_ac + p.Y_fa * p.C_bac,
+            -1 * p.C_va + (1 - p.Y_c4) * 0.54 * p.C_pro + (1 - p.Y_c4) * 0.31 * p.C_ac + p.Y_c4 * p.C_bac,
+            -1 * p.C_bu + (1 - p.Y_c4) * 0.8 * p.C_ac + p.Y_c4 * p.C_bac,
+            -1 * p.C_pro + (1 - p.Y_pro) * 0.57 * p.C_ac + p.Y_pro * p.C_bac,
+            -1 * p.C_ac + (1 - p.Y_ac) * p.C_ch4 + p.Y_ac * p.C_bac,
+            (1 - p.Y_h2) * p.C_ch4 + p.Y_h2 * p.C_bac,
+        ])
+        M[S_IC, 0:12] = -s
+        M[S_IC, 12:19] = -(-1 * p.C_bac + p.C_xc)
+
+        # Rho_T_8..Rho_T_10 gas transfer, the S_h2 sink is part of the DAE
+        M[S_CH4, 20] = -1
+        M[S_IC, 21] = -1
+        M[S_GAS_H2, 19] = 1
+        M[S_GAS_CH4, 20] = 1
+        M[S_GAS_CO2, 21] = 1
+
+        # gas outflow
+        M[S_GAS_H2, 22] = -1
+        M[S_GAS_CH4, 23] = -1
+        M[S_GAS_CO2, 24] = -1
+
+        return M
+
+    def bind(self, state_input, q_ad, V_liq, V_gas, k_hyd):
+        """Returns a copy of this RHS for one reactor, with its own work buffers."""
+        bound = copy(self)
+        D = q_ad / V_liq
+
+        bound.constants = tuple(self.parameters.tolist()) + (k_hyd, V_gas)
+
+        bound.dilution = np.zeros(N_STATES)
+        bound.dilution[DILUTED] = D
+        bound.feed = np.zeros(N_STATES)
+        bound.feed[DILUTED] = D * np.asarray(state_input, dtype=float)[DILUTED]
+
+        bound.stoichiometry = self.stoichiometry.copy()
+        bound.stoichiometry[GAS, 19:22] *= V_liq / V_gas
+
+        bound.rho = np.empty(N_PROCESSES)
+        return bound
+
+    def rates(self, state):
+        """
+        Process rates of a state, given as a sequence of 39 rows. Rows may be
+        floats (one reactor) or arrays (one column per reactor).
+        """
+        (k_dis, k_m_su, k_m_aa, k_m_fa, k_m_c4, k_m_pro, k_m_ac, k_m_h2,
+         K_S_su, K_S_aa, K_S_fa, K_S_c4, K_S_pro, K_S_ac, K_S_h2,
+         k_dec_X_su, k_dec_X_aa, k_dec_X_fa, k_dec_X_c4, k_dec_X_pro, k_dec_X_ac, k_dec_X_h2,
+         K_S_IN, K_I_h2_fa, K_I_h2_c4, K_I_h2_pro, K_I_nh3,
+         K_pH_aa, nn_aa, K_pH_ac, n_ac, K_pH_h2, n_h2,
+         k_L_a, K_H_h2, K_H_ch4, K_H_co2, k_p, p_gas_h2o, p_atm, R, T_op,
+         k_hyd, V_gas) = self.constants
+
+        (S_su, S_aa, S_fa, S_va, S_bu, S_pro, S_ac, S_h2, S_ch4, S_IC, S_IN, S_I,
+         X_xc, X_ch, X_pr, X_li, X_su, X_aa, X_fa, X_c4, X_pro, X_ac, X_h2, X_I,
+         S_cation, S_anion, S_H_ion, S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion,
+         S_co2, S_nh3, S_nh4_ion, S_gas_h2, S_gas_ch4, S_gas_co2, pH) = state
+
+        I_pH_aa = (K_pH_aa ** nn_aa) / (S_H_ion ** nn_aa + K_pH_aa ** nn_aa)
+        I_pH_ac = (K_pH_ac ** n_ac) / (S_H_ion ** n_ac + K_pH_ac ** n_ac)
+        I_pH_h2 = (K_pH_h2 ** n_h2) / (S_H_ion ** n_h2 + K_pH_h2 ** n_h2)
+        I_IN_lim = 1 / (1 + (K_S_IN / S_IN))
+        I_h2_fa = 1 / (1 + (S_h2 / K_I_h2_fa))
+        I_h2_c4 = 1 / (1 + (S_h2 / K_I_h2_c4))
+        I_h2_pro = 1 / (1 + (S_h2 / K_I_h2_pro))
+        I_nh3 = 1 / (1 + (S_nh3 / K_I_nh3))
+        I_5 = I_pH_aa * I_IN_lim
+
+        p_gas_h2 = S_gas_h2 * R * T_op / 16.0
+        p_gas_ch4 = S_gas_ch4 * R * T_op / 64.0
+        p_gas_co2 = S_gas_co2 * R * T_op
+        q_gas = k_p * (p_gas_h2 + p_gas_ch4 + p_gas_co2 + p_gas_h2o - p_atm)
+        # the real part keeps complex-step differentiation through rates() possible
+        q_gas = q_gas * (np.real(q_gas) > 0)
+        outflow = q_gas / V_gas
+
+        return (
+            k_dis * X_xc,
+            k_hyd * X_ch,
+            k_hyd * X_pr,
+            k_hyd * X_li,
+            k_m_su * S_su / (K_S_su + S_su) * X_su * I_5,
+            k_m_aa * (S_aa / (K_S_aa + S_aa)) * X_aa * I_5,
+            k_m_fa * (S_fa / (K_S_fa + S_fa)) * X_fa * (I_5 * I_h2_fa),
+            k_m_c4 * (S_va / (K_S_c4 + S_va)) * X_c4 * (S_va / (S_bu + S_va + 1e-6)) * (I_5 * I_h2_c4),
+            k_m_c4 * (S_bu / (K_S_c4 + S_bu)) * X_c4 * (S_bu / (S_bu + S_va + 1e-6)) * (I_5 * I_h2_c4),
+            k_m_pro * (S_pro / (K_S_pro + S_pro)) * X_pro * (I_5 * I_h2_pro),
+            k_m_ac * (S_ac / (K_S_ac + S_ac)) * X_ac * (I_pH_ac * I_IN_lim * I_nh3),
+            k_m_h2 * (S_h2 / (K_S_h2 + S_h2)) * X_h2 * (I_pH_h2 * I_IN_lim),
+            k_dec_X_su * X_su,
+            k_dec_X_aa * X_aa,
+            k_dec_X_fa * X_fa,
+            k_dec_X_c4 * X_c4,
+            k_dec_X_pro * X_pro,
+            k_dec_X_ac * X_ac,
+            k_dec_X_h2 * X_h2,
+            k_L_a * (S_h2 - 16 * K_H_h2 * p_gas_h2),
+            k_L_a * (S_ch4 - 64 * K_H_ch4 * p_gas_ch4),
+            k_L_a * (S_IC - S_hco3_ion - K_H_co2 * p_gas_co2),
+            outflow * S_gas_h2,
+            outflow * S_gas_ch4,
+            outflow * S_gas_co2,
+        )
+
+    def rate_jacobian(self, state):
+        """Analytic d(rates)/d(state) of one reactor, as a (processes x states) array."""
+        (k_dis, k_m_su, k_m_aa, k_m_fa, k_m_c4, k_m_pro, k_m_ac, k_m_h2,
+         K_S_su, K_S_aa, K_S_fa, K_S_c4, K_S_pro, K_S_ac, K_S_h2,
+         k_dec_X_su, k_dec_X_aa, k_dec_X_fa, k_dec_X_c4, k_dec_X_pro, k_dec_X_ac, k_dec_X_h2,
+         K_S_IN, K_I_h2_fa, K_I_h2_c4, K_I_h2_pro, K_I_nh3,
+         K_pH_aa, nn_aa, K_pH_ac, n_ac, K_pH_h2, n_h2,
+         k_L_a, K_H_h2, K_H_ch4, K_H_co2, k_p, p_gas_h2o, p_atm, R, T_op,
+         k_hyd, V_gas) = self.constants
+
+        # the upper-case state indices are used below, so only the needed values are unpacked
+        S_su, S_aa, S_fa, S_va, S_bu, S_pro, S_ac, S_h2 = state[S_SU:S_H2 + 1]
+        X_su, X_aa, X_fa, X_c4, X_pro, X_ac, X_h2 = state[X_SU:X_H2 + 1]
+        S_nitrogen = state[S_IN]
+        S_H_ion = state[S_H_ION]
+        S_nh3 = state[S_NH3]
+        S_gas_h2, S_gas_ch4, S_gas_co2 = state[GAS]
+
+        J = np.zeros((N_PROCESSES, N_STATES))
+
+        # inhibition terms and their derivatives
+        def hill(K, n):
+            K_n = K ** n
+            d = S_H_ion ** n + K_n
+            return K_n / d, -K_n * n * S_H_ion ** (n - 1) / (d * d)
+
+        def non_competitive(S, K_I):
+            d = 1 + S / K_I
+            return 1 / d, -1 / (K_I * d * d)
+
+        I_pH_aa, dI_pH_aa = hill(K_pH_aa, nn_aa)
+        I_pH_ac, dI_pH_ac = hill(K_pH_ac, n_ac)
+        I_pH_h2, dI_pH_h2 = hill(K_pH_h2, n_h2)
+        I_IN_lim = S_nitrogen / (S_nitrogen + K_S_IN)
+        dI_IN_lim = K_S_IN / ((S_nitrogen + K_S_IN) * (S_nitrogen + K_S_IN))
+        I_h2_fa, dI_h2_fa = non_competitive(S_h2, K_I_h2_fa)
+        I_h2_c4, dI_h2_c4 = non_competitive(S_h2, K_I_h2_c4)
+        I_h2_pro, dI_h2_pro = non_competitive(S_h2, K_I_h2_pro)
+        I_nh3, dI_nh3 = non_competitive(S_nh3, K_I_nh3)
+
+        # Rho_1..Rho_4
+        J[0, X_XC] = k_dis
+        J[1, X_CH] = k_hyd
+        J[2, X_PR] = k_hyd
+        J[3, X_LI] = k_hyd
+
+        # Rho_5..Rho_12: k_m * S / (K_S + S) * X * (pH inhibition) * I_IN_lim * (other inhibitions)
+        uptake = (
+            (4, S_SU, X_SU, k_m_su, K_S_su, S_su, X_su, I_pH_aa, dI_pH_aa, ()),
+            (5, S_AA, X_AA, k_m_aa, K_S_aa, S_aa, X_aa, I_pH_aa, dI_pH_aa, ()),
+            (6, S_FA, X_FA, k_m_fa, K_S_fa, S_fa, X_fa, I_pH_aa, dI_pH_aa, ((S_H2, I_h2_fa, dI_h2_fa),)),
+            (7, S_VA, X_C4, k_m_c4, K_S_c4, S_va, X_c4, I_pH_aa, dI_pH_aa, ((S_H2, I_h2_c4, dI_h2_c4),)),
+            (8, S_BU, X_C4, k_m_c4, K_S_c4, S_bu, X_c4, I_pH_aa, dI_pH_aa, ((S_H2, I_h2_c4, dI_h2_c4),)),
+            (9, S_PRO, X_PRO, k_m_pro, K_S_pro, S_pro, X_pro, I_pH_aa, dI_pH_aa, ((S_H2, I_h2_pro, dI_h2_pro),)),
+            (10, S_AC, X_AC, k_m_ac, K_S_ac, S_ac, X_ac, I_pH_ac, dI_pH_ac, ((S_NH3, I_nh3, dI_nh3),)),
+            (11, S_H2, X_H2, k_m_h2, K_S_h2, S_h2, X_h2, I_pH_h2, dI_pH_h2, ()),
+        )
+        S_c4 = S_bu + S_va + 1e-6
+        for j, S_idx, X_idx, k_m, K_S, S, X, I_pH, dI_pH, others in uptake:
+            I_other = 1.0
+            for _, I, _ in others:
+                I_other *= I
+            # valerate and butyrate compete for X_c4
+            if j == 7:
+                c4, dc4 = S_va / S_c4, ((S_bu + 1e-6) / (S_c4 * S_c4), -S_va / (S_c4 * S_c4))
+            elif j == 8:
+                c4, dc4 = S_bu / S_c4, (-S_bu / (S_c4 * S_c4), (S_va + 1e-6) / (S_c4 * S_c4))
+            else:
+                c4, dc4 = 1.0, None
+
+            monod = S / (K_S + S)
+            I = I_pH * I_IN_lim * I_other
+            kinetic = k_m * monod * X * c4
+            rho = kinetic * I
+
+            J[j, S_idx] += k_m * K_S / ((K_S + S) * (K_S + S)) * X * c4 * I
+            J[j, X_idx] += k_m * monod * c4 * I
+            J[j, S_H_ION] += kinetic * dI_pH * I_IN_lim * I_other
+            J[j, S_IN] += kinetic * I_pH * dI_IN_lim * I_other
+            for idx, I_k, dI_k in others:
+                J[j, idx] += rho / I_k * dI_k
+            if dc4 is not None:
+                base = k_m * monod * X * I
+                J[j, S_VA] += base * dc4[0]
+                J[j, S_BU] += base * dc4[1]
+
+        # Rho_13..Rho_19
+        for j, (X_idx, k_dec) in enumerate(zip((X_SU, X_AA, X_FA, X_C4, X_PRO, X_AC, X_H2), (k_dec_X_su, k_dec_X_aa, k_dec_X_fa, k_dec_X_c4, k_dec_X_pro, k_dec_X_ac, k_dec_X_h2))):
+            J[12 + j, X_idx] = k_dec
+
+        # Rho_T_8..Rho_T_10
+        J[19, S_H2] = k_L_a
+        J[19, S_GAS_H2] = -k_L_a * K_H_h2 * R * T_op
+        J[20, S_CH4] = k_L_a
+        J[20, S_GAS_CH4] = -k_L_a * K_H_ch4 * R * T_op
+        J[21, S_IC] = k_L_a
+        J[21, S_HCO3_ION] = -k_L_a
+        J[21, S_GAS_CO2] = -k_L_a * K_H_co2 * R * T_op
+
+        # gas outflow q_gas / V_gas * S_gas
+        p_coef = (R * T_op / 16.0, R * T_op / 64.0, R * T_op)
+        S_gas = (S_gas_h2, S_gas_ch4, S_gas_co2)
+        q_gas = k_p * (S_gas_h2 * p_coef[0] + S_gas_ch4 * p_coef[1] + S_gas_co2 * p_coef[2] + p_gas_h2o - p_atm)
+        if q_gas > 0:
+            for i in range(3):
+                J[22 + i, S_GAS_H2 + i] += q_gas / V_gas
+                for k in range(3):
+                    J[22 + i, S_GAS_H2 + k] += S_gas[i] / V_gas * k_p * p_coef[k]
+
+        return J
+
+    def jacobian(self, t, y):
+        """Analytic Jacobian d(dy/dt)/dy of the bound reactor."""
+        J = self.stoichiometry @ self.rate_jacobian(y.tolist())
+        J[np.diag_indices(N_STATES)] -= self.dilution
+        return J
+
+    def sparsity(self):
+        """Structural nonzero pattern of jacobian(), for finite-difference column grouping."""
+        pattern = (self.stoichiometry != 0).astype(float) @ (self.rate_jacobian(np.ones(N_STATES).tolist()) != 0).astype(float)
+        pattern[np.diag_indices(N_STATES)] += self.dilution
+        return pattern != 0
+
+    def evaluate(self, y, out):
+        """Writes dy/dt of the state vector y into out."""
+        rho = self.rho
+        rho[:] = self.rates(y.tolist())
+        np.dot(self.stoichiometry, rho, out=out)
+        out += self.feed
+        out -= self.dilution * y
+        return out
+
+    def __call__(self, t, y):
+        # solve_ivp keeps a reference to the returned derivative between
+        # stages, so every call needs its own output array
+        return self.evaluate(y, np.empty(N_STATES))
+
+
+class EnsembleRHS(PetersenRHS):
+    """
+    PetersenRHS of N reactors integrated as a single system. The solver state
+    is the N x 39 matrix of the members flattened row by row: the rates of all
+    members are evaluated in one vectorized call and the Jacobian is block diagonal.
+    """
+
+    def __init__(self, rhs, state_inputs, q_ad, V_liq, V_gas, k_hyd):
+        q_ad, V_liq, V_gas, k_hyd = (np.asarray(value, dtype=float) for value in (q_ad, V_liq, V_gas, k_hyd))
+        self.size = len(q_ad)
+        self.parameters = rhs.parameters
+        self.constants = tuple(rhs.parameters.tolist()) + (k_hyd, V_gas)
+
+        # members with their own gas volume, used for the Jacobian blocks
+        self.members = [rhs.bind(*member) for member in zip(state_inputs, q_ad, V_liq, V_gas, k_hyd)]
+
+        D = (q_ad / V_liq)[:, None]
+        self.dilution = np.zeros((self.size, N_STATES))
+        self.dilution[:, DILUTED] = D
+        self.feed = np.zeros((self.size, N_STATES))
+        self.feed[:, DILUTED] = D * np.asarray(state_inputs, dtype=float)[:, DILUTED]
+
+        # gas transfer into the gas phase is scaled per member by V_liq / V_gas
+        self.stoichiometry = rhs.stoichiometry.copy()
+        self.stoichiometry[GAS, 19:22] = 0
+        self.transfer = (V_liq / V_gas)[:, None]
+        self.rho = None
+
+    def evaluate(self, y, out):
+        Y = y.reshape(self.size, N_STATES)
+        rho = np.array(self.rates(Y.T))
+        out = out.reshape(self.size, N_STATES)
+        np.dot(rho.T, self.stoichiometry.T, out=out)
+        out[:, GAS] += self.transfer * rho[19:22].T
+        out += self.feed
+        out -= self.dilution * Y
+        return out.reshape(-1)
+
+    def __call__(self, t, y):
+        return self.evaluate(y, np.empty(self.size * N_STATES))
+
+    def jacobian(self, t, y):
+        """Block diagonal Jacobian, one analytic block per member."""
+        Y = y.reshape(self.size, N_STATES)
+        return scipy.sparse.block_diag([scipy.sparse.csr_matrix(member.jacobian(t, row)) for member, row in zip(self.members, Y)], format='csc')
+
+    def sparsity(self):
+        return scipy.sparse.block_diag([scipy.sparse.csr_matrix(member.sparsity()) for member in self.members], format='csc')
+
+
+class SensitivityRHS:
+    """
+    A bound PetersenRHS augmented with the forward sensitivities of the state
+    to Bo and Kh, scaled by the parameter (Bo * dy/dBo, Kh * dy/dKh) so that
+    they have the magnitude of the states. The solver state is y followed by
+    both sensitivities, integrated as
+        s_k' = J(y) s_k + p_k * df/dp_k
+    where Bo only enters through the feed (feed_bo = Bo * d(feed)/dBo) and
+    Kh * df/dKh is the hydrolysis part of the RHS itself. J(y) s_k is taken
+    by complex step through rates(), exact to rounding. The Jacobian given
+    to the solver is block diagonal in J(y), without the second derivative
+    terms of the sensitivity rows.
+    """
+
+    def __init__(self, rhs, feed_bo):
+        self.rhs = rhs
+        self.feed_bo = feed_bo
+        # hydrolysis columns (Rho_2..Rho_4) of the Petersen matrix
+        self.hydrolysis = rhs.stoichiometry[:, 1:4]
+
+    def evaluate(self, z, out):
+        y = z[:N_STATES]
+        S = z[N_STATES:].reshape(2, N_STATES)
+        rhs = self.rhs
+        rhs.evaluate(y, out[:N_STATES])
+
+        # J(y) s_k by complex step through the rates, cheaper than building J
+        h = 1e-30
+        drho = np.array([rates.imag for rates in (np.array(rhs.rates((y + 1j * h * s).tolist())) for s in S)]) / h
+        dS = drho @ rhs.stoichiometry.T - rhs.dilution * S
+        out[N_STATES:2 * N_STATES] = dS[0] + self.feed_bo
+        out[2 * N_STATES:] = dS[1] + self.hydrolysis @ rhs.rho[1:4]
+        return out
+
+    def __call__(self, t, z):
+        return self.evaluate(z, np.empty(3 * N_STATES))
+
+    def jacobian(self, t, z):
+        return np.kron(np.eye(3), self.rhs.jacobian(t, z[:N_STATES]))
+
+    def sparsity(self):
+        return np.kron(np.eye(3), self.rhs.sparsity()) != 0
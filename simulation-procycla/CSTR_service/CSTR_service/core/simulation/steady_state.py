@@ -0,0 +1,101 @@
+import numpy as np
+from CSTR_service.core.simulation.rhs import S_H2, S_H_ION, S_NH4_ION, S_GAS_CO2
+from CSTR_service.core.exceptions.cstr_exception import CSTRException
+
+# states of the reduced steady-state system, S_h2, the ions and pH follow from the DAE
+DIFFERENTIAL = np.array([i for i in range(S_GAS_CO2 + 1) if i != S_H2 and not S_H_ION <= i <= S_NH4_ION])
+
+
+class SteadyStateSolver:
+    """
+    Steady state of a bound PetersenRHS: dy/dt = 0 for the differential
+    states, with the algebraic ones given by the DAE at every evaluation.
+
+    Newton's method with pseudo-transient continuation: every iteration is a
+    linearized backward Euler step (I/dt - J) dx = F, whose dt grows by
+    switched evolution relaxation on the size of the Newton step (and at
+    least by `growth` while it shrinks), so the first iterations follow the
+    transient of the reactor and the last ones are plain Newton steps. A step leaving the positive states or the DAE is
+    retried with a smaller dt. J is a forward-difference Jacobian of the
+    reduced system, which includes the pH and S_h2 response.
+    """
+
+    def __init__(self, tol, max_iter, dt=0.1, dt_min=1e-8, dt_max=1e12, atol=1e-10, growth=2.0):
+        self.tol = tol
+        self.max_iter = max_iter
+        self.dt = dt
+        self.dt_min = dt_min
+        self.dt_max = dt_max
+        self.atol = atol
+        self.growth = growth
+
+    def residual(self, rhs, algebraic, x, state):
+        """dy/dt of the differential states x, and the consistent full state, warm-started from state."""
+        state = np.array(state)
+        state[DIFFERENTIAL] = x
+        # the hydrogen balance takes S_H_ion from the state it is given, the
+        # second solve makes S_h2 consistent with the S_H_ion of the first
+        state = np.array(algebraic(algebraic(state.tolist())))
+        return rhs(0, state)[DIFFERENTIAL], state
+
+    def jacobian(self, rhs, algebraic, x, state, F):
+        J = np.empty((len(x), len(x)))
+        for j in range(len(x)):
+            h = 1.5e-8 * max(abs(x[j]), self.atol)
+            x_h = x.copy()
+            x_h[j] += h
+            J[:, j] = (self.residual(rhs, algebraic, x_h, state)[0] - F) / h
+        return J
+
+    def norm(self, J, F, x):
+        # relative size of the full Newton step, the fast gas states dominate any norm of F itself
+        try:
+            return np.max(np.abs(np.linalg.solve(J, F)) / np.maximum(np.abs(x), self.atol))
+        except np.linalg.LinAlgError:
+            return np.inf
+
+    def solve(self, rhs, algebraic, state, budget=None, progress=None):
+        """
+        Steady state of rhs seeded from state, where algebraic(state) returns
+        state with the DAE solved. Returns the state, the iterations needed
+        and None, or the last iterate, its iteration and the limit reached
+        when the Budget is exhausted first. progress(iterations) is called
+        after every iteration when given.
+        """
+        x = np.array(state)[DIFFERENTIAL]
+        F, state = self.residual(rhs, algebraic, x, state)
+        dt = self.dt
+        previous = None
+
+        for iteration in range(self.max_iter):
+            J = self.jacobian(rhs, algebraic, x, state, F)
+            if budget is not None:
+                budget.count(len(x) + 1)
+            norm = self.norm(J, F, x)
+            if norm < self.tol:
+                return state.tolist(), iteration, None
+            stopped_by = budget.exhausted() if budget is not None else None
+            if stopped_by:
+                return state.tolist(), iteration, stopped_by
+            if previous is not None and np.isfinite(norm):
+                dt = min(dt * max(previous / norm, self.growth if norm < previous else 0), self.dt_max)
+            previous = norm
+
+            while True:
+                x_new = x + np.linalg.solve(np.diag(np.full(len(x), 1 / dt)) - J, F)
+                if np.all(x_new > 0):
+                    try:
+                        if budget is not None:
+                            budget.count(1)
+                        F, state = self.residual(rhs, algebraic, x_new, state)
+                        break
+                    except CSTRException:
+                        pass
+                dt /= 4
+                if dt < self.dt_min:
+                    raise CSTRException("Steady state solver stalled after {} iterations".format(iteration))
+            x = x_new
+            if progress:
+                progress(iteration + 1)
+
+        raise CSTRException("Steady state solver did not converge after {} iterations".format(self.max_iter))
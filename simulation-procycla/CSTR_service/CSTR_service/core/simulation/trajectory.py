@@ -0,0 +1,87 @@
+import numpy as np
+from CSTR_service.core.simulation.rhs import N_STATES, S_SU, S_CH4, S_I, X_XC, X_I, S_VA_ION, S_AC_ION, S_IN
+
+GAS_COLUMNS = ['q_gas', 'q_ch4%']
+
+# COD-bearing states of the total and soluble DQO curves
+DQO_SOLUBLE = np.zeros(N_STATES)
+DQO_SOLUBLE[S_SU:S_CH4 + 1] = 1
+DQO_SOLUBLE[S_I] = 1
+DQO_SOLUBLE[S_VA_ION:S_AC_ION + 1] = 1
+DQO_TOTAL = DQO_SOLUBLE.copy()
+DQO_TOTAL[X_XC:X_I + 1] = 1
+
+
+class Trajectory:
+    """
+    Daily reactor states and gas flows of a simulation, stored as rows of a
+    preallocated float64 array that doubles its capacity when full.
+    Conversion to lists only happens in to_dict(), at serialization time.
+    """
+
+    def __init__(self, state_columns, capacity=128):
+        self.state_columns = list(state_columns)
+        self.data = np.empty((capacity, N_STATES + len(GAS_COLUMNS)))
+        self.size = 0
+
+    def append(self, state, gas):
+        if self.size == len(self.data):
+            grown = np.empty((2 * len(self.data), self.data.shape[1]))
+            grown[:self.size] = self.data
+            self.data = grown
+        row = self.data[self.size]
+        row[:N_STATES] = state
+        row[N_STATES:] = gas
+        self.size += 1
+
+    @property
+    def states(self):
+        return self.data[:self.size, :N_STATES]
+
+    @property
+    def gas(self):
+        return self.data[:self.size, N_STATES:]
+
+    def dqo_curve(self):
+        return {'DQOt': self.states @ DQO_TOTAL, 'DQOs': self.states @ DQO_SOLUBLE}
+
+    def n_curve(self):
+        return {'Na': self.states[:, S_IN] * 14}
+
+    def to_dict(self, curves=False):
+        """Result dict of the simulation, with the DQO and nitrogen curves when curves is set."""
+        result = {
+            'simulate_results': dict(zip(self.state_columns, self.states.T.tolist())),
+            'gasflow': dict(zip(GAS_COLUMNS, self.gas.T.tolist()))
+        }
+        if curves:
+            result['dqo_curve'] = {name: value.tolist() for name, value in self.dqo_curve().items()}
+            result['n_curve'] = {name: value.tolist() for name, value in self.n_curve().items()}
+        return result
+
+
+class ConvergenceDetector:
+    """
+    Ring buffer of the last last_x + 1 daily states. converged() is true when
+    every state changed by less than ratio times its new value on each of
+    the last last_x days (or on every day so far, while fewer are stored).
+    """
+
+    def __init__(self, last_x, ratio):
+        self.ratio = ratio
+        self.buffer = np.empty((last_x + 1, N_STATES))
+        self.count = 0
+
+    def push(self, state):
+        self.buffer[self.count % len(self.buffer)] = state
+        self.count += 1
+
+    def converged(self):
+        n = len(self.buffer)
+        if self.count < 2:
+            return False
+        # oldest to newest, fewer rows while the buffer is filling up
+        rows = np.roll(self.buffer, -(self.count % n), axis=0) if self.count >= n else self.buffer[:self.count]
+        difference = np.abs(rows[:-1] - rows[1:])         # |(Xi-1) - Xi|
+        threshold = rows[1:] * self.ratio
+        return (difference - threshold).max() < 0
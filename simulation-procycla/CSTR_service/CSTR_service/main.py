@@ -2,10 +2,20 @@ from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 from CSTR_service.api.api_v1.api import api_router
 from CSTR_service.core.settings import settings
+from CSTR_service.core.service.executor import executor
+from CSTR_service.core.service.cancellation import cancellation
+from CSTR_service.core.service.jobs import jobs
 
 app = FastAPI(title="CSTR API", openapi_url="/openapi.json")
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.on_event("startup")
+def start_workers():
+    # the Manager processes and the pool workers are started here, not by the first request on the event loop
+    cancellation.start()
+    jobs.start()
+    executor.start()
+
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
         CORSMiddleware,
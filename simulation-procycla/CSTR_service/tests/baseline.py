@@ -0,0 +1,198 @@
+"""
+ADM1_ODE and DAESolve as the service shipped them before the Petersen
+matrix RHS and the AlgebraicSolver, kept verbatim (methods of ADM1 turned
+into functions of the model p) as the reference of the regression tests.
+"""
+import numpy as np
+
+
+def adm1_ode(p, t, state_zero, state_input, q_ad, V_liq, V_gas, k_hyd):
+
+    S_su, S_aa, S_fa, S_va, S_bu, S_pro, S_ac, S_h2, S_ch4, S_IC, S_IN, S_I, X_xc, X_ch, X_pr, X_li, X_su, X_aa, X_fa, X_c4, X_pro, X_ac, X_h2, X_I, S_cation, S_anion, S_H_ion, S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion, S_co2, S_nh3, S_nh4_ion, S_gas_h2, S_gas_ch4, S_gas_co2, pH = state_zero
+    S_su_in,S_aa_in,S_fa_in,S_va_in,S_bu_in,S_pro_in,S_ac_in,S_h2_in,S_ch4_in,S_IC_in,S_IN_in,S_I_in,X_xc_in,X_ch_in,X_pr_in,X_li_in,X_su_in,X_aa_in,X_fa_in,X_c4_in,X_pro_in,X_ac_in,X_h2_in,X_I_in,S_cation_in,S_anion_in = state_input
+
+    S_nh4_ion = S_IN - S_nh3
+    S_co2 = S_IC - S_hco3_ion
+
+    I_pH_aa = (p.K_pH_aa ** p.nn_aa) / (S_H_ion ** p.nn_aa + p.K_pH_aa ** p.nn_aa)
+    I_pH_ac = (p.K_pH_ac ** p.n_ac) / (S_H_ion ** p.n_ac + p.K_pH_ac ** p.n_ac)
+    I_pH_h2 = (p.K_pH_h2 ** p.n_h2) / (S_H_ion ** p.n_h2 + p.K_pH_h2 ** p.n_h2)
+    I_IN_lim = 1 / (1 + (p.K_S_IN / S_IN))
+    I_h2_fa = 1 / (1 + (S_h2 / p.K_I_h2_fa))
+    I_h2_c4 = 1 / (1 + (S_h2 / p.K_I_h2_c4))
+    I_h2_pro = 1 / (1 + (S_h2 / p.K_I_h2_pro))
+    I_nh3 = 1 / (1 + (S_nh3 / p.K_I_nh3))
+
+    # biochemical process rates from Rosen et al (2006) BSM2 report
+    Rho_1 = p.k_dis * X_xc  # Disintegration
+    Rho_2 = k_hyd * X_ch # Hydrolysis of carbohydrates
+    Rho_3 = k_hyd * X_pr # Hydrolysis of proteins
+    Rho_4 = k_hyd * X_li  # Hydrolysis of lipids
+    Rho_5 = p.k_m_su * S_su / (p.K_S_su + S_su) * X_su * (I_pH_aa * I_IN_lim) # Uptake of sugars
+    Rho_6 = p.k_m_aa * (S_aa / (p.K_S_aa + S_aa)) * X_aa * (I_pH_aa * I_IN_lim)  # Uptake of amino-acids
+    Rho_7 = p.k_m_fa * (S_fa / (p.K_S_fa + S_fa)) * X_fa * (I_pH_aa * I_IN_lim * I_h2_fa)  # Uptake of LCFA (long-chain fatty acids)
+    Rho_8 = p.k_m_c4 * (S_va / (p.K_S_c4 + S_va)) * X_c4 * (S_va / (S_bu + S_va + 1e-6)) * (I_pH_aa * I_IN_lim * I_h2_c4)  # Uptake of valerate
+    Rho_9 = p.k_m_c4 * (S_bu / (p.K_S_c4 + S_bu)) * X_c4 * (S_bu / (S_bu + S_va + 1e-6)) * (I_pH_aa * I_IN_lim * I_h2_c4)  # Uptake of butyrate
+    Rho_10 = p.k_m_pro * (S_pro / (p.K_S_pro + S_pro)) * X_pro * (I_pH_aa * I_IN_lim * I_h2_pro)  # Uptake of propionate
+    Rho_11 = p.k_m_ac * (S_ac / (p.K_S_ac + S_ac)) * X_ac * (I_pH_ac * I_IN_lim * I_nh3)  # Uptake of acetate
+    Rho_12 = p.k_m_h2 * (S_h2 / (p.K_S_h2 + S_h2)) * X_h2 * (I_pH_h2 * I_IN_lim)  # Uptake of hydrogen
+    Rho_13 = p.k_dec_X_su * X_su  # Decay of X_su
+    Rho_14 = p.k_dec_X_aa * X_aa  # Decay of X_aa
+    Rho_15 = p.k_dec_X_fa * X_fa  # Decay of X_fa
+    Rho_16 = p.k_dec_X_c4 * X_c4  # Decay of X_c4
+    Rho_17 = p.k_dec_X_pro * X_pro  # Decay of X_pro
+    Rho_18 = p.k_dec_X_ac * X_ac  # Decay of X_ac
+    Rho_19 = p.k_dec_X_h2 * X_h2  # Decay of X_h2
+
+    # acid-base rates for the BSM2 ODE implementation from Rosen et al (2006) BSM2 report TODO: not used?
+    # Rho_A_4 = p.k_A_B_va * (S_va_ion * (p.K_a_va + S_H_ion) - p.K_a_va * S_va)
+    # Rho_A_5 = p.k_A_B_bu * (S_bu_ion * (p.K_a_bu + S_H_ion) - p.K_a_bu * S_bu)
+    # Rho_A_6 = p.k_A_B_pro * (S_pro_ion * (p.K_a_pro + S_H_ion) - p.K_a_pro * S_pro)
+    # Rho_A_7 = p.k_A_B_ac * (S_ac_ion * (p.K_a_ac + S_H_ion) - p.K_a_ac * S_ac)
+    # Rho_A_10 = p.k_A_B_co2 * (S_hco3_ion * (p.K_a_co2 + S_H_ion) - p.K_a_co2 * S_IC)
+    # Rho_A_11 = p.k_A_B_IN * (S_nh3 * (p.K_a_IN + S_H_ion) - p.K_a_IN * S_IN)
+
+    # gas phase algebraic equations from Rosen et al (2006) BSM2 report
+    p_gas_h2 = S_gas_h2 * p.R * p.T_op / 16.0
+    p_gas_ch4 = S_gas_ch4 * p.R * p.T_op / 64.0
+    p_gas_co2 = S_gas_co2 * p.R * p.T_op
+
+
+    p_gas = p_gas_h2 + p_gas_ch4 + p_gas_co2 + p.p_gas_h2o
+    q_gas = p.k_p * (p_gas- p.p_atm)
+    if q_gas < 0:    q_gas = 0
+
+    # gas transfer rates from Rosen et al (2006) BSM2 report
+    Rho_T_8 = p.k_L_a * (S_h2 - 16 * p.K_H_h2 * p_gas_h2)
+    Rho_T_9 = p.k_L_a * (S_ch4 - 64 * p.K_H_ch4 * p_gas_ch4)
+    Rho_T_10 = p.k_L_a * (S_co2 - p.K_H_co2 * p_gas_co2)
+
+    diff_S_su = q_ad / V_liq * (S_su_in - S_su) + Rho_2 + (1 - p.f_fa_li) * Rho_4 - Rho_5  # eq1
+    diff_S_aa = q_ad / V_liq * (S_aa_in - S_aa) + Rho_3 - Rho_6  # eq2
+    diff_S_fa = q_ad / V_liq * (S_fa_in - S_fa) + (p.f_fa_li * Rho_4) - Rho_7  # eq3
+    diff_S_va = q_ad / V_liq * (S_va_in - S_va) + (1 - p.Y_aa) * p.f_va_aa * Rho_6 - Rho_8  # eq4
+    diff_S_bu = q_ad / V_liq * (S_bu_in - S_bu) + (1 - p.Y_su) * p.f_bu_su * Rho_5 + (1 - p.Y_aa) * p.f_bu_aa * Rho_6 - Rho_9  # eq5
+    diff_S_pro = q_ad / V_liq * (S_pro_in - S_pro) + (1 - p.Y_su) * p.f_pro_su * Rho_5 + (1 - p.Y_aa) * p.f_pro_aa * Rho_6 + (1 - p.Y_c4) * 0.54 * Rho_8 - Rho_10  # eq6
+    diff_S_ac = q_ad / V_liq * (S_ac_in - S_ac) + (1 - p.Y_su) * p.f_ac_su * Rho_5 + (1 - p.Y_aa) * p.f_ac_aa * Rho_6 + (1 - p.Y_fa) * 0.7 * Rho_7 + (1 - p.Y_c4) * 0.31 * Rho_8 + (1 - p.Y_c4) * 0.8 * Rho_9 + (1 - p.Y_pro) * 0.57 * Rho_10 - Rho_11  # eq7
+    #diff_S_h2 is defined with DAE paralel equaitons
+    diff_S_ch4 = q_ad / V_liq * (S_ch4_in - S_ch4) + (1 - p.Y_ac) * Rho_11 + (1 - p.Y_h2) * Rho_12 - Rho_T_9  # eq9
+
+    ## eq10 start##
+    s_1 = -1 * p.C_xc + p.f_sI_xc * p.C_sI + p.f_ch_xc * p.C_ch + p.f_pr_xc * p.C_pr + p.f_li_xc * p.C_li + p.f_xI_xc * p.C_xI
+    s_2 = -1 * p.C_ch + p.C_su
+    s_3 = -1 * p.C_pr + p.C_aa
+    s_4 = -1 * p.C_li + (1 - p.f_fa_li) * p.C_su + p.f_fa_li * p.C_fa
+    s_5 = -1 * p.C_su + (1 - p.Y_su) * (p.f_bu_su * p.C_bu + p.f_pro_su * p.C_pro + p.f_ac_su * p.C_ac) + p.Y_su * p.C_bac
+    s_6 = -1 * p.C_aa + (1 - p.Y_aa) * (p.f_va_aa * p.C_va + p.f_bu_aa * p.C_bu + p.f_pro_aa * p.C_pro + p.f_ac_aa * p.C_ac) + p.Y_aa * p.C_bac
+    s_7 = -1 * p.C_fa + (1 - p.Y_fa) * 0.7 * p.C_ac + p.Y_fa * p.C_bac
+    s_8 = -1 * p.C_va + (1 - p.Y_c4) * 0.54 * p.C_pro + (1 - p.Y_c4) * 0.31 * p.C_ac + p.Y_c4 * p.C_bac
+    s_9 = -1 * p.C_bu + (1 - p.Y_c4) * 0.8 * p.C_ac + p.Y_c4 * p.C_bac
+    s_10 = -1 * p.C_pro + (1 - p.Y_pro) * 0.57 * p.C_ac + p.Y_pro * p.C_bac
+    s_11 = -1 * p.C_ac + (1 - p.Y_ac) * p.C_ch4 + p.Y_ac * p.C_bac
+    s_12 = (1 - p.Y_h2) * p.C_ch4 + p.Y_h2 * p.C_bac
+    s_13 = -1 * p.C_bac + p.C_xc
+
+    sigma = s_1 * Rho_1 + s_2 * Rho_2 + s_3 * Rho_3 + s_4 * Rho_4 + s_5 * Rho_5 + s_6 * Rho_6 + s_7 * Rho_7 + s_8 * Rho_8 + s_9 * Rho_9 + s_10 * Rho_10 + s_11 * Rho_11 + s_12 * Rho_12 + s_13 * (Rho_13 + Rho_14 + Rho_15 + Rho_16 + Rho_17 + Rho_18 + Rho_19)
+
+    diff_S_IC = q_ad / V_liq * (S_IC_in - S_IC) - sigma - Rho_T_10
+    ## eq10 end##
+
+    diff_S_IN = q_ad / V_liq * (S_IN_in - S_IN) + (p.N_xc - p.f_xI_xc * p.N_I - p.f_sI_xc * p.N_I-p.f_pr_xc * p.N_aa) * Rho_1 - p.Y_su * p.N_bac * Rho_5 + (p.N_aa - p.Y_aa * p.N_bac) * Rho_6 - p.Y_fa * p.N_bac * Rho_7 - p.Y_c4 * p.N_bac * Rho_8 - p.Y_c4 * p.N_bac * Rho_9 - p.Y_pro * p.N_bac * Rho_10 - p.Y_ac * p.N_bac * Rho_11 - p.Y_h2 * p.N_bac * Rho_12 + (p.N_bac - p.N_xc) * (Rho_13 + Rho_14 + Rho_15 + Rho_16 + Rho_17 + Rho_18 + Rho_19) # eq11 
+    diff_S_I = q_ad / V_liq * (S_I_in - S_I) + p.f_sI_xc * Rho_1  # eq12
+    # Differential equations 13 to 24 (particulate matter)
+    diff_X_xc = q_ad / V_liq * (X_xc_in - X_xc) - Rho_1 + Rho_13 + Rho_14 + Rho_15 + Rho_16 + Rho_17 + Rho_18 + Rho_19  # eq13 
+    diff_X_ch = q_ad / V_liq * (X_ch_in - X_ch) + p.f_ch_xc * Rho_1 - Rho_2  # eq14 
+    diff_X_pr = q_ad / V_liq * (X_pr_in - X_pr) + p.f_pr_xc * Rho_1 - Rho_3  # eq15 
+    diff_X_li = q_ad / V_liq * (X_li_in - X_li) + p.f_li_xc * Rho_1 - Rho_4  # eq16 
+    diff_X_su = q_ad / V_liq * (X_su_in - X_su) + p.Y_su * Rho_5 - Rho_13  # eq17
+    diff_X_aa = q_ad / V_liq * (X_aa_in - X_aa) + p.Y_aa * Rho_6 - Rho_14  # eq18
+    diff_X_fa = q_ad / V_liq * (X_fa_in - X_fa) + p.Y_fa * Rho_7 - Rho_15  # eq19
+    diff_X_c4 = q_ad / V_liq * (X_c4_in - X_c4) + p.Y_c4 * Rho_8 + p.Y_c4 * Rho_9 - Rho_16  # eq20
+    diff_X_pro = q_ad / V_liq * (X_pro_in - X_pro) + p.Y_pro * Rho_10 - Rho_17  # eq21
+    diff_X_ac = q_ad / V_liq * (X_ac_in - X_ac) + p.Y_ac * Rho_11 - Rho_18  # eq22
+    diff_X_h2 = q_ad / V_liq * (X_h2_in - X_h2) + p.Y_h2 * Rho_12 - Rho_19  # eq23
+    diff_X_I = q_ad / V_liq * (X_I_in - X_I) + p.f_xI_xc * Rho_1  # eq24 
+    # Differential equations 25 and 26 (cations and anions)
+    diff_S_cation = q_ad / V_liq * (S_cation_in - S_cation)  # eq25
+    diff_S_anion = q_ad / V_liq * (S_anion_in - S_anion)  # eq26
+    diff_S_h2 = 0
+    # Differential equations 27 to 32 (ion states, only for ODE implementation)
+    diff_S_va_ion = 0   # eq27
+    diff_S_bu_ion = 0   # eq28
+    diff_S_pro_ion = 0  # eq29
+    diff_S_ac_ion = 0   # eq30
+    diff_S_hco3_ion = 0 # eq31
+    diff_S_nh3 = 0      # eq32
+    # Gas phase equations: Differential equations 33 to 35
+    diff_S_gas_h2 = (q_gas / V_gas * -1 * S_gas_h2) + (Rho_T_8 * V_liq / V_gas)  # eq33
+    diff_S_gas_ch4 = (q_gas / V_gas * -1 * S_gas_ch4) + (Rho_T_9 * V_liq / V_gas)  # eq34
+    diff_S_gas_co2 = (q_gas / V_gas * -1 * S_gas_co2) + (Rho_T_10 * V_liq / V_gas)  # eq35
+
+    diff_S_H_ion = 0
+    diff_S_co2 = 0
+    diff_S_nh4_ion = 0 #to keep the output same length as input for ADM1_ODE funcion
+
+    return diff_S_su, diff_S_aa, diff_S_fa, diff_S_va, diff_S_bu, diff_S_pro, diff_S_ac, diff_S_h2, diff_S_ch4, diff_S_IC, diff_S_IN, diff_S_I, diff_X_xc, diff_X_ch, diff_X_pr, diff_X_li, diff_X_su, diff_X_aa, diff_X_fa, diff_X_c4, diff_X_pro, diff_X_ac, diff_X_h2, diff_X_I, diff_S_cation, diff_S_anion, diff_S_H_ion, diff_S_va_ion,  diff_S_bu_ion, diff_S_pro_ion, diff_S_ac_ion, diff_S_hco3_ion, diff_S_co2,  diff_S_nh3, diff_S_nh4_ion, diff_S_gas_h2, diff_S_gas_ch4, diff_S_gas_co2, diff_S_H_ion
+
+def dae_solve(p, S_su, S_aa, S_fa, S_va, S_bu, S_pro, S_ac, S_h2, S_ch4, S_IC, S_IN, S_I, X_xc, X_ch, X_pr, X_li, X_su, X_aa, X_fa, X_c4, X_pro, X_ac, X_h2, X_I, S_cation, S_anion, S_H_ion, S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion, S_co2, S_nh3, S_nh4_ion, S_gas_h2, S_gas_ch4, S_gas_co2, V_liq, q_ad, S_h2_in):
+    eps = 0.0000001
+    prevS_H_ion = S_H_ion
+
+    shdelta = S_h2delta = shgradeq = S_h2gradeq = 1.0
+    tol = 10 ** (-12) #solver accuracy tolerance
+    maxIter = 1000 #maximum number of iterations for solver
+    i = 1
+    j = 1
+
+    while ((shdelta > tol or shdelta < -tol) and (i <= maxIter)):
+        S_va_ion = p.K_a_va * S_va / (p.K_a_va + S_H_ion)
+        S_bu_ion = p.K_a_bu * S_bu / (p.K_a_bu + S_H_ion)
+        S_pro_ion = p.K_a_pro * S_pro / (p.K_a_pro + S_H_ion)
+        S_ac_ion = p.K_a_ac * S_ac / (p.K_a_ac + S_H_ion)
+        S_hco3_ion = p.K_a_co2 * S_IC / (p.K_a_co2 + S_H_ion)
+        S_nh3 = p.K_a_IN * S_IN / (p.K_a_IN + S_H_ion)
+        shdelta = S_cation + (S_IN - S_nh3) + S_H_ion - S_hco3_ion - S_ac_ion / 64.0 - S_pro_ion / 112.0 - S_bu_ion / 160.0 - S_va_ion / 208.0 - p.K_w / S_H_ion - S_anion
+        shgradeq = 1 + p.K_a_IN * S_IN / ((p.K_a_IN + S_H_ion) * (p.K_a_IN + S_H_ion)) + p.K_a_co2 * S_IC / ((p.K_a_co2 + S_H_ion) * (p.K_a_co2 + S_H_ion)) + 1 / 64.0 * p.K_a_ac * S_ac / ((p.K_a_ac + S_H_ion) * (p.K_a_ac + S_H_ion)) + 1 / 112.0 * p.K_a_pro * S_pro / ((p.K_a_pro + S_H_ion) * (p.K_a_pro + S_H_ion)) + 1 / 160.0 * p.K_a_bu * S_bu / ((p.K_a_bu + S_H_ion) * (p.K_a_bu + S_H_ion)) + 1 / 208.0 * p.K_a_va * S_va / ((p.K_a_va + S_H_ion) * (p.K_a_va + S_H_ion)) + p.K_w / (S_H_ion * S_H_ion)
+        S_H_ion = S_H_ion - shdelta / shgradeq
+        if S_H_ion <= 0:
+            S_H_ion = tol
+        i+=1
+
+    # pH calculation
+    pH = - np.log10(S_H_ion)
+
+    #DAE solver for S_h2 from Rosen et al. (2006) 
+    while ((S_h2delta > tol or S_h2delta < -tol) and (j <= maxIter)):
+        I_pH_aa = (p.K_pH_aa ** p.nn_aa) / (prevS_H_ion ** p.nn_aa + p.K_pH_aa ** p.nn_aa)
+
+        I_pH_h2 = (p.K_pH_h2 ** p.n_h2) / (prevS_H_ion ** p.n_h2 + p.K_pH_h2 ** p.n_h2)
+        I_IN_lim = 1 / (1 + (p.K_S_IN / S_IN))
+        I_h2_fa = 1 / (1 + (S_h2 / p.K_I_h2_fa))
+        I_h2_c4 = 1 / (1 + (S_h2 / p.K_I_h2_c4))
+        I_h2_pro = 1 / (1 + (S_h2 / p.K_I_h2_pro))
+
+        I_5 = I_pH_aa * I_IN_lim
+        I_6 = I_5
+        I_7 = I_pH_aa * I_IN_lim * I_h2_fa
+        I_8 = I_pH_aa * I_IN_lim * I_h2_c4
+        I_9 = I_8
+        I_10 = I_pH_aa * I_IN_lim * I_h2_pro
+
+        I_12 = I_pH_h2 * I_IN_lim
+        Rho_5 = p.k_m_su * (S_su / (p.K_S_su + S_su)) * X_su * I_5  # Uptake of sugars
+        Rho_6 = p.k_m_aa * (S_aa / (p.K_S_aa + S_aa)) * X_aa * I_6  # Uptake of amino-acids
+        Rho_7 = p.k_m_fa * (S_fa / (p.K_S_fa + S_fa)) * X_fa * I_7  # Uptake of LCFA (long-chain fatty acids)
+        Rho_8 = p.k_m_c4 * (S_va / (p.K_S_c4 + S_va)) * X_c4 * (S_va / (S_bu + S_va+ 1e-6)) * I_8  # Uptake of valerate
+        Rho_9 = p.k_m_c4 * (S_bu / (p.K_S_c4 + S_bu)) * X_c4 * (S_bu / (S_bu + S_va+ 1e-6)) * I_9  # Uptake of butyrate
+        Rho_10 = p.k_m_pro * (S_pro / (p.K_S_pro + S_pro)) * X_pro * I_10  # Uptake of propionate
+        Rho_12 = p.k_m_h2 * (S_h2 / (p.K_S_h2 + S_h2)) * X_h2 * I_12  # Uptake of hydrogen
+        p_gas_h2 = S_gas_h2 * p.R * p.T_op / 16
+        Rho_T_8 = p.k_L_a * (S_h2 - 16 * p.K_H_h2 * p_gas_h2)
+        S_h2delta = q_ad / V_liq * (S_h2_in - S_h2) + (1 - p.Y_su) * p.f_h2_su * Rho_5 + (1 - p.Y_aa) * p.f_h2_aa * Rho_6 + (1 - p.Y_fa) * 0.3 * Rho_7 + (1 - p.Y_c4) * 0.15 * Rho_8 + (1 - p.Y_c4) * 0.2 * Rho_9 + (1 - p.Y_pro) * 0.43 * Rho_10 - Rho_12 - Rho_T_8
+        S_h2gradeq = - 1.0 / V_liq * q_ad - 3.0 / 10.0 * (1 - p.Y_fa) * p.k_m_fa * S_fa / (p.K_S_fa + S_fa) * X_fa * I_pH_aa / (1 + p.K_S_IN / S_IN) / ((1 + S_h2 / p.K_I_h2_fa) * (1 + S_h2 / p.K_I_h2_fa)) / p.K_I_h2_fa - 3.0 / 20.0 * (1 - p.Y_c4) * p.k_m_c4 * S_va * S_va / (p.K_S_c4 + S_va) * X_c4 / (S_bu + S_va + eps) * I_pH_aa / (1 + p.K_S_IN / S_IN) / ((1 + S_h2 / p.K_I_h2_c4 ) * (1 + S_h2 / p.K_I_h2_c4 )) / p.K_I_h2_c4 - 1.0 / 5.0 * (1 - p.Y_c4) * p.k_m_c4 * S_bu * S_bu / (p.K_S_c4 + S_bu) * X_c4 / (S_bu + S_va + eps) * I_pH_aa / (1 + p.K_S_IN / S_IN) / ((1 + S_h2 / p.K_I_h2_c4 ) * (1 + S_h2 / p.K_I_h2_c4 )) / p.K_I_h2_c4 - 43.0 / 100.0 * (1 - p.Y_pro) * p.k_m_pro * S_pro / (p.K_S_pro + S_pro) * X_pro * I_pH_aa / (1 + p.K_S_IN / S_IN) / ((1 + S_h2 / p.K_I_h2_pro ) * (1 + S_h2 / p.K_I_h2_pro )) / p.K_I_h2_pro - p.k_m_h2 / (p.K_S_h2 + S_h2) * X_h2 * I_pH_h2 / (1 + p.K_S_IN / S_IN) + p.k_m_h2 * S_h2 / ((p.K_S_h2 + S_h2) * (p.K_S_h2 + S_h2)) * X_h2 * I_pH_h2 / (1 + p.K_S_IN / S_IN) - p.k_L_a
+        S_h2 = S_h2 - S_h2delta / S_h2gradeq
+        if S_h2 <= 0:
+            S_h2 = tol
+        j+=1
+
+    return S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion, S_nh3, S_H_ion, pH, p_gas_h2, S_h2, S_nh4_ion, S_co2#, P_gas, q_gas
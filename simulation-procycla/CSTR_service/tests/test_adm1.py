@@ -0,0 +1,153 @@
+"""
+Regression tests of the ADM1 solvers on CSTR_body.json: the Petersen matrix
+RHS and the AlgebraicSolver against the original ADM1_ODE and DAESolve
+(baseline.py), the steady-state solver against a long daily transient, the
+forward sensitivities against central differences, the continuous
+integration against the daily one and the ensemble against single runs.
+Run with `python -m pytest tests` from CSTR_service.
+"""
+import json
+from os import path
+import numpy as np
+import pytest
+import baseline
+from CSTR_service.core.simulation.ADM1 import ADM1
+from CSTR_service.core.simulation.rhs import EnsembleRHS, N_STATES, S_H2, S_H_ION, S_HCO3_ION, S_NH3, PH
+
+BODY_PATH = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'CSTR_body.json')
+
+
+@pytest.fixture(scope='module')
+def adm1():
+    return ADM1()
+
+
+@pytest.fixture(scope='module')
+def user_input():
+    with open(BODY_PATH) as f:
+        return dict(json.load(f), progress_url=None, result_url=None)
+
+
+def initial_state(adm1, user_input):
+    state_zero = adm1.state_zero.copy()
+    state_zero.append(user_input['pH_in'])
+    return adm1.algebraic_state(state_zero, user_input['V_liq'], user_input['q_ad'], adm1.get_state_input(user_input)[S_H2])
+
+
+def daily_trajectory(adm1, user_input, days):
+    """States of days 1 to days in daily mode, from the initial state."""
+    state_input = adm1.get_state_input(user_input)
+    daily_states = adm1.daily_states(initial_state(adm1, user_input), state_input, user_input)
+    return [next(daily_states) for _ in range(days)]
+
+
+@pytest.fixture(scope='module')
+def states(adm1, user_input):
+    """The initial state and the states of days 1, 5 and 40, far from and close to the steady state."""
+    trajectory = daily_trajectory(adm1, user_input, 40)
+    return [initial_state(adm1, user_input), trajectory[0], trajectory[4], trajectory[39]]
+
+
+def test_rhs_matches_baseline(adm1, user_input, states):
+    state_input = adm1.get_state_input(user_input)
+    args = (state_input, user_input['q_ad'], user_input['V_liq'], user_input['V_gas'], user_input['Kh'])
+    for state in states:
+        expected = np.array(baseline.adm1_ode(adm1, 0, state, *args), dtype=float)
+        np.testing.assert_allclose(adm1.ADM1_ODE(0, state, *args), expected, rtol=1e-8, atol=1e-14)
+
+
+def test_rhs_jacobian_matches_finite_differences(adm1, user_input, states):
+    rhs = adm1.rhs.bind(adm1.get_state_input(user_input), user_input['q_ad'], user_input['V_liq'], user_input['V_gas'], user_input['Kh'])
+    for state in states:
+        y = np.array(state)
+        J = rhs.jacobian(0, y)
+        J = J.toarray() if hasattr(J, 'toarray') else np.asarray(J)
+        for j in range(N_STATES):
+            h = 1e-6 * max(abs(y[j]), 1e-8)
+            dy = np.zeros(N_STATES)
+            dy[j] = h
+            column = (rhs(0, y + dy) - rhs(0, y - dy)) / (2 * h)
+            np.testing.assert_allclose(J[:, j], column, rtol=1e-4, atol=1e-6 * np.max(np.abs(column)) + 1e-12)
+
+
+def test_algebraic_solver_matches_baseline(adm1, user_input, states):
+    S_h2_in = adm1.get_state_input(user_input)[S_H2]
+    for state in states:
+        # the state as the integrator returns it, off the algebraic solution
+        raw = list(np.array(state) * (1 + 1e-3 * np.sin(np.arange(N_STATES))))
+        solved = adm1.algebraic_state(raw, user_input['V_liq'], user_input['q_ad'], S_h2_in)
+        S_va_ion, S_bu_ion, S_pro_ion, S_ac_ion, S_hco3_ion, S_nh3, S_H_ion, pH, p_gas_h2, S_h2, S_nh4_ion, S_co2 = \
+            baseline.dae_solve(adm1, *raw[:PH], user_input['V_liq'], user_input['q_ad'], S_h2_in)
+        # DAESolve computes the ions one Newton step behind S_H_ion
+        np.testing.assert_allclose([solved[S_H_ION], solved[PH], solved[S_H2]], [S_H_ion, pH, S_h2], rtol=1e-12)
+        np.testing.assert_allclose([solved[S_HCO3_ION], solved[S_NH3]], [S_hco3_ion, S_nh3], rtol=1e-9)
+
+
+def test_steady_state_matches_long_transient(adm1, user_input):
+    # 600 days are about 26 hydraulic retention times, the transient is then settled to 1e-9
+    result = adm1.steady_state_simulation(user_input)
+    assert result['status_code'] == 0
+    transient = daily_trajectory(adm1, user_input, 600)[-1]
+    np.testing.assert_allclose(adm1.final_state(result), transient, rtol=1e-6)
+
+
+@pytest.mark.parametrize('name, column', [('Bo', 0), ('Kh', 1)])
+def test_sensitivity_matches_central_differences(adm1, user_input, name, column):
+    days = 20
+    sensitivities = [[0.0] * 4]
+    state_input = adm1.get_state_input(user_input)
+    sensitivity_states = adm1.sensitivity_states(initial_state(adm1, user_input), state_input, user_input, sensitivities)
+    for _ in range(days):
+        next(sensitivity_states)
+    sensitivities = np.array(sensitivities[1:])
+
+    def outputs(value):
+        trajectory = daily_trajectory(adm1, dict(user_input, **{name: value}), days)
+        return np.array([[adm1.gas_flow(state)[0], state[PH]] for state in trajectory])
+
+    step = 1e-2 * user_input[name]
+    central = (outputs(user_input[name] + step) - outputs(user_input[name] - step)) / (2 * step)
+    for j, derivative in enumerate((sensitivities[:, column], sensitivities[:, 2 + column])):
+        np.testing.assert_allclose(derivative, central[:, j], rtol=0, atol=5e-3 * np.max(np.abs(central[:, j])))
+
+
+def test_continuous_mode_converges_to_the_daily_operating_point(user_input):
+    # the modes differ along the transient (see the README) but not at convergence
+    results = {}
+    for integration in ('daily', 'continuous'):
+        adm1 = ADM1()
+        adm1.integration = integration
+        results[integration] = adm1.dynamic_simulation(user_input)
+        assert results[integration]['status_code'] == 0
+    daily, continuous = (results[integration]['result'] for integration in ('daily', 'continuous'))
+    assert continuous['gasflow']['q_gas'][-1] == pytest.approx(daily['gasflow']['q_gas'][-1], rel=2e-3)
+    assert continuous['simulate_results']['pH'][-1] == pytest.approx(daily['simulate_results']['pH'][-1], abs=5e-3)
+    final_daily = [values[-1] for values in daily['simulate_results'].values()]
+    final_continuous = [values[-1] for values in continuous['simulate_results'].values()]
+    np.testing.assert_allclose(final_continuous, final_daily, rtol=5e-3)
+
+
+@pytest.fixture(scope='module')
+def members(user_input):
+    """Three reactors of CSTR_body.json with other loads and substrates."""
+    return [dict(user_input, q_ad=user_input['q_ad']*load, Bo=user_input['Bo']*bo) for load, bo in ((1.0, 1.0), (0.8, 1.1), (0.9, 0.9))]
+
+
+def test_ensemble_rhs_stacks_its_members(adm1, members, states):
+    rhs = EnsembleRHS(adm1.rhs, [adm1.get_state_input(member) for member in members],
+                      *(np.array([member[key] for member in members], dtype=float) for key in ('q_ad', 'V_liq', 'V_gas', 'Kh')))
+    y = np.array(states[1:])
+    expected = [adm1.ADM1_ODE(0, state, adm1.get_state_input(member), member['q_ad'], member['V_liq'], member['V_gas'], member['Kh'])
+                for member, state in zip(members, y)]
+    np.testing.assert_allclose(rhs(0, y.ravel()), np.ravel(expected), rtol=1e-12, atol=1e-15)
+
+
+def test_ensemble_matches_single_runs(adm1, members):
+    ensemble = adm1.ensemble_simulation(members)
+    for member, result in zip(members, ensemble):
+        single = adm1.dynamic_simulation(member)
+        assert result['status_code'] == single['status_code']
+        # BDF in the ensemble against LSODA alone, each within its rtol
+        assert abs(result['days_simulated'] - single['days_simulated']) <= 1
+        assert result['result']['gasflow']['q_gas'][-1] == pytest.approx(single['result']['gasflow']['q_gas'][-1], rel=1e-3)
+        assert result['result']['simulate_results']['pH'][-1] == pytest.approx(single['result']['simulate_results']['pH'][-1], abs=1e-4)
@@ -0,0 +1,52 @@
+"""
+Tests of /cstr/batch on CSTR_body.json: the runs and the bands of every
+substrate against its off, bo and kh runs and propagate_uncertainty, as the
+Node side computed them one request at a time.
+"""
+import json
+from os import path
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from CSTR_service.main import app
+from CSTR_service.core.schemas.cstr_data import CSTRData
+from CSTR_service.core.simulation.ADM1 import ADM1
+from CSTR_service.core.service.cstr_service import CSTRService
+
+BODY_PATH = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'CSTR_body.json')
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope='module')
+def reactor():
+    with open(BODY_PATH) as f:
+        return {name: value for name, value in json.load(f).items() if name not in ('Bo', 'Kh', 'uncertainty')}
+
+
+@pytest.fixture(scope='module')
+def substrates():
+    return [dict(Bo=278.4, Kh=0.5, BoSE=2.0, KhSE=0.05, BoKhCovariance=0.01, NSamples=5),
+            dict(Bo=300.0, Kh=0.4, BoSE=3.0, KhSE=0.04, BoKhCovariance=0.0, NSamples=4)]
+
+
+def test_batch_matches_the_runs_of_every_substrate(client, reactor, substrates):
+    response = client.post('/api/v1/cstr/batch', json=dict(reactor, substrates=substrates))
+    assert response.status_code == 200
+    results = response.json()['substrates']
+    assert len(results) == len(substrates)
+
+    service = CSTRService(ADM1())
+    for substrate, result in zip(substrates, results):
+        assert result['error'] is None
+        runs = [service.run_adm1(CSTRData(**reactor, Bo=substrate['Bo'], Kh=substrate['Kh'], uncertainty=uncertainty).dict())
+                for uncertainty in ('off', 'bo', 'kh')]
+        assert [run['status_code'] for run in result['runs']] == [0, 0, 0]
+        # as the response went: the energy Series are keyed by their index, a string in JSON
+        assert result['runs'] == json.loads(json.dumps(jsonable_encoder(runs)))
+        uncertainty = service.propagate_uncertainty(service.uncertainty_input(substrate, runs))
+        assert result['uncertainty'] == jsonable_encoder(uncertainty.__root__)
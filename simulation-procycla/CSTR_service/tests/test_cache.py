@@ -0,0 +1,114 @@
+"""
+Tests of the result cache: single-flight submissions, hits served as
+copies, the size bound and the disk tier, stopped runs never cached, and
+the all-or-nothing admission of a /cstr/batch request.
+"""
+import json
+from concurrent.futures import Future
+from os import path
+import pytest
+from fastapi.testclient import TestClient
+from CSTR_service.main import app
+from CSTR_service.core.schemas.cstr_result import CSTRResult
+from CSTR_service.core.service.cache import ResultCache, cache
+from CSTR_service.core.service.executor import Executor, executor
+from CSTR_service.core.exceptions.executor_exception import ExecutorBusyException
+
+BODY_PATH = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'CSTR_body.json')
+
+
+class Submit:
+    """submit() argument of ResultCache.submit, counting its calls."""
+
+    def __init__(self):
+        self.futures = []
+
+    def __call__(self):
+        self.futures.append(Future())
+        return self.futures[-1]
+
+
+def test_key_ignores_the_callbacks():
+    user_input = {'Bo': 278.4, 'Kh': 0.5}
+    assert cache.key(dict(user_input, progress_url='a', result_url='b', checkpoint_id='c')) == cache.key(user_input)
+    assert cache.key(dict(user_input, Kh=0.6)) != cache.key(user_input)
+
+
+def test_identical_runs_in_flight_are_shared():
+    results = ResultCache(1 << 20)
+    submit = Submit()
+    future = results.submit('key', submit)
+    assert results.submit('key', submit) is future
+    assert len(submit.futures) == 1
+    future.set_result({'q_gas': [1.0]})
+    assert results.inflight == {}
+
+
+def test_hits_are_copies():
+    results = ResultCache(1 << 20)
+    submit = Submit()
+    results.submit('key', submit).set_result({'q_gas': [1.0]})
+    hit = results.submit('key', submit).result()
+    assert len(submit.futures) == 1
+    assert hit == {'q_gas': [1.0]}
+    hit['q_gas'].append(2.0)
+    assert results.submit('key', submit).result() == {'q_gas': [1.0]}
+
+
+def test_failed_runs_are_not_cached():
+    results = ResultCache(1 << 20)
+    submit = Submit()
+    results.submit('key', submit).set_exception(ValueError())
+    results.submit('key', submit)
+    assert len(submit.futures) == 2
+
+
+def test_least_recently_used_results_are_evicted():
+    # room for three pickled results
+    results = ResultCache(250)
+    submit = Submit()
+    for key in ('a', 'b', 'c'):
+        results.submit(key, submit).set_result('x'*60)
+    results.submit('a', submit)
+    results.submit('d', submit).set_result('x'*60)
+    assert list(results.entries) == ['c', 'a', 'd']
+    assert results.size <= results.max_bytes
+
+
+def test_disk_tier_outlives_the_memory_tier(tmp_path):
+    submit = Submit()
+    ResultCache(1 << 20, str(tmp_path), 1 << 20).submit('key', submit).set_result({'q_gas': [1.0]})
+    assert ResultCache(1 << 20, str(tmp_path), 1 << 20).submit('key', submit).result() == {'q_gas': [1.0]}
+    assert len(submit.futures) == 1
+
+
+@pytest.mark.parametrize('status_code, cacheable', [(0, True), (1, True), (2, False)])
+def test_stopped_runs_are_not_cacheable(status_code, cacheable):
+    run = CSTRResult(status_code=status_code, trh=20.0, execution_days=3, results=[], stopped_by='max_rhs_evals' if status_code == 2 else None)
+    assert cache.cacheable(run) is cacheable
+
+
+def test_reservations_are_all_or_nothing():
+    pool = Executor(1, 3)
+    reservation = pool.reserve(3)
+    with pytest.raises(ExecutorBusyException):
+        pool.reserve(2)
+    assert pool.reserved == 3
+    reservation.close()
+    assert pool.reserved == 0
+    pool.reserve(4).close()
+
+
+def test_batch_over_the_queue_is_rejected_whole():
+    with open(BODY_PATH) as f:
+        reactor = {name: value for name, value in json.load(f).items() if name not in ('Bo', 'Kh', 'uncertainty')}
+    # three runs per substrate, one more substrate than the queue takes
+    substrate = dict(Bo=278.4, Kh=0.5, BoSE=2.0, KhSE=0.05, BoKhCovariance=0.01, NSamples=5)
+    substrates = [dict(substrate, Bo=substrate['Bo'] + i) for i in range(executor.capacity//3 + 1)]
+    with TestClient(app) as client:
+        pending = executor.pending
+        response = client.post('/api/v1/cstr/batch', json=dict(reactor, substrates=substrates))
+        assert response.status_code == 429
+        assert 'Retry-After' in response.headers
+        assert executor.pending == pending
+        assert executor.reserved == 0
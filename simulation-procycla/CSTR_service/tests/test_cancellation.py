@@ -0,0 +1,97 @@
+"""
+Tests of the cancellation of shared runs: a run is only cancelled when its
+last waiter disconnects, batch waiters included, and a batch never builds
+bands from a run that did not converge. A run cancelled or stopped by its
+budget returns its partial result with status_code 2 and is never cached.
+"""
+import asyncio
+import json
+from concurrent.futures import Future
+from os import path
+import pytest
+from fastapi.testclient import TestClient
+from CSTR_service.main import app
+from CSTR_service.core.exceptions.cstr_exception import CSTRException
+from CSTR_service.core.schemas.cstr_data import CSTRData
+from CSTR_service.core.schemas.cstr_result import CSTRResult
+from CSTR_service.core.simulation.ADM1 import ADM1
+from CSTR_service.core.simulation.budget import CancelToken
+from CSTR_service.core.service.cache import cache
+from CSTR_service.core.service.cancellation import CancellationRegistry
+from CSTR_service.core.service.cstr_service import CSTRService, adm1_key
+
+BODY_PATH = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'CSTR_body.json')
+
+
+class Request:
+    """Starlette request stub whose client disconnected from the start."""
+
+    async def is_disconnected(self):
+        return True
+
+
+@pytest.fixture
+def registry():
+    registry = CancellationRegistry(poll_interval=0.01)
+    registry.token('run')
+    yield registry
+    registry.manager.shutdown()
+
+
+def test_last_waiter_cancels_the_run(registry):
+    assert asyncio.run(registry.wait(Request(), Future(), 'run')) is None
+    assert registry.flags['run']
+    assert registry.waiters == {}
+
+
+def test_run_shared_with_a_batch_is_not_cancelled(registry):
+    registry.join('run')
+    assert asyncio.run(registry.wait(Request(), Future(), 'run')) is None
+    assert not registry.flags['run']
+    assert registry.waiters == {'run': 1}
+    assert registry.leave('run')
+    assert registry.waiters == {}
+
+
+def test_waiters_outlive_the_release_of_their_run(registry):
+    registry.join('run')
+    registry.release('run')
+    assert registry.waiters == {'run': 1}
+    assert registry.leave('run')
+
+
+@pytest.mark.parametrize('status_code, stopped_by', [(1, None), (2, 'cancelled'), (2, 'max_rhs_evals')])
+def test_unconverged_runs_have_no_bands(status_code, stopped_by):
+    run = CSTRResult(status_code=status_code, trh=20.0, execution_days=3, results=[], stopped_by=stopped_by)
+    service = CSTRService(adm1=None)
+    with pytest.raises(CSTRException, match='status_code {}'.format(status_code)):
+        service.check_converged('off', run)
+    with pytest.raises(CSTRException, match='sensitivity run'):
+        service.sensitivity_uncertainty({}, run)
+
+
+@pytest.fixture(scope='module')
+def user_input():
+    with open(BODY_PATH) as f:
+        return CSTRData(**dict(json.load(f), uncertainty='off')).dict()
+
+
+@pytest.mark.parametrize('mode', ['dynamic', 'steady_state'])
+def test_cancelled_run_returns_its_partial_result(user_input, mode):
+    run = CSTRService(ADM1()).run_adm1(dict(user_input, mode=mode), token=CancelToken({'run': True}, 'run'))
+    assert run.status_code == 2
+    assert run.stopped_by == 'cancelled'
+
+
+@pytest.mark.parametrize('budget, value', [('max_rhs_evals', 2000), ('max_wall_seconds', 1e-3)])
+def test_run_stopped_by_its_budget_is_not_cached(user_input, budget, value):
+    data = dict(user_input, **{budget: value})
+    with TestClient(app) as client:
+        response = client.post('/api/v1/cstr/run', json=data)
+    assert response.status_code == 200
+    run = response.json()
+    assert run['status_code'] == 2
+    assert run['stopped_by'] == budget
+    simulate_results = next(result['value'] for result in run['results'] if result['name'] == 'simulate_results')
+    assert len(simulate_results['pH']) == run['execution_days'] + 1
+    assert adm1_key(data) not in cache.entries
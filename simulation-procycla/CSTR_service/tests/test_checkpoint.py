@@ -0,0 +1,98 @@
+"""
+Tests of the checkpoints of dynamic runs on CSTR_body.json: a run killed
+or stopped by its budget and resumed gives the result of an uninterrupted
+run, checkpoints of other inputs are ignored, and old ones expire.
+"""
+import json
+import os
+import time
+from os import path
+import numpy as np
+import pytest
+from CSTR_service.core.simulation.ADM1 import ADM1
+from CSTR_service.core.simulation.budget import Budget
+from CSTR_service.core.simulation.checkpoint import Checkpoint, CheckpointStore
+
+BODY_PATH = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'CSTR_body.json')
+
+
+class Killed(Exception):
+    """A worker lost in the middle of a run."""
+
+
+@pytest.fixture(scope='module')
+def adm1():
+    return ADM1()
+
+
+@pytest.fixture(scope='module')
+def user_input():
+    with open(BODY_PATH) as f:
+        return dict(json.load(f), uncertainty='off', progress_url=None, result_url=None)
+
+
+@pytest.fixture(scope='module')
+def uninterrupted(adm1, user_input):
+    return adm1.dynamic_simulation(user_input)
+
+
+def kill_at(day):
+    def progress(days_simulated):
+        if days_simulated == day:
+            raise Killed()
+    return progress
+
+
+def assert_same_run(result, expected):
+    assert result['status_code'] == expected['status_code']
+    assert result['days_simulated'] == expected['days_simulated']
+    # the resumed days are integrated from t=0 again, LSODA takes other steps within its rtol
+    for name in ('simulate_results', 'gasflow'):
+        for column, values in expected['result'][name].items():
+            np.testing.assert_allclose(result['result'][name][column], values, rtol=1e-4, err_msg=column)
+
+
+def test_killed_run_resumes_from_its_last_checkpoint(adm1, user_input, uninterrupted, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'run.npz'), 'inputs', 10)
+    with pytest.raises(Killed):
+        adm1.dynamic_simulation(user_input, progress=kill_at(57), checkpoint=checkpoint)
+    assert checkpoint.load()[0] == 50
+
+    days = []
+    result = adm1.dynamic_simulation(user_input, progress=days.append, checkpoint=checkpoint)
+    assert days[0] == 51
+    assert_same_run(result, uninterrupted)
+    # a finished run leaves no checkpoint behind
+    assert not os.path.exists(checkpoint.file)
+
+
+def test_run_stopped_by_its_budget_goes_on_when_resubmitted(adm1, user_input, uninterrupted, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'run.npz'), 'inputs', 10)
+    stopped = adm1.dynamic_simulation(user_input, checkpoint=checkpoint, budget=Budget(max_rhs_evals=2000))
+    assert stopped['status_code'] == 2
+    assert stopped['stopped_by'] == 'max_rhs_evals'
+    # the checkpoint is forced at the stop, off the checkpoint interval
+    assert checkpoint.load()[0] == stopped['days_simulated']
+
+    result = adm1.dynamic_simulation(user_input, checkpoint=checkpoint)
+    assert_same_run(result, uninterrupted)
+
+
+def test_checkpoint_of_other_inputs_is_not_resumed(adm1, user_input, tmp_path):
+    with pytest.raises(Killed):
+        adm1.dynamic_simulation(user_input, progress=kill_at(25), checkpoint=Checkpoint(str(tmp_path / 'run.npz'), 'inputs', 10))
+    assert Checkpoint(str(tmp_path / 'run.npz'), 'other inputs', 10).load() is None
+
+
+def test_store_removes_expired_checkpoints(tmp_path):
+    for name in ('old.npz', 'old.npz.tmp', 'new.npz', 'old.txt'):
+        (tmp_path / name).touch()
+    old = time.time() - 8*86400
+    for name in ('old.npz', 'old.npz.tmp', 'old.txt'):
+        os.utime(tmp_path / name, (old, old))
+
+    store = CheckpointStore(str(tmp_path), 10, 7*86400)
+    assert store.get('run', 'inputs').file == str(tmp_path / 'run.npz')
+    assert sorted(os.listdir(tmp_path)) == ['new.npz', 'old.txt']
+    assert store.get(None, 'inputs') is None
+    assert CheckpointStore(None, 10, 7*86400).get('run', 'inputs') is None
@@ -0,0 +1,90 @@
+"""
+Tests of the response formats of /cstr/run on CSTR_body.json: the fields
+selector and the columnar .npz, against the JSON of the same run.
+"""
+import io
+import json
+from os import path
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from CSTR_service.main import app
+from CSTR_service.core.exceptions.cstr_exception import CSTRException
+from CSTR_service.core.schemas.cstr_result import CSTRResult, ResultDict
+from CSTR_service.core.service.encoding import NPZ_MEDIA_TYPE, select_fields, to_npz
+
+BODY_PATH = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'CSTR_body.json')
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope='module')
+def user_input():
+    with open(BODY_PATH) as f:
+        return dict(json.load(f), uncertainty='off', mode='steady_state')
+
+
+@pytest.fixture(scope='module')
+def run(client, user_input):
+    response = client.post('/api/v1/cstr/run', json=user_input)
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.fixture
+def result():
+    return CSTRResult(status_code=2, trh=23.3, execution_days=2, stopped_by='max_rhs_evals', results=[
+        ResultDict(name='simulate_results', value={'S_su': [0.1, 0.2, 0.3], 'pH': [7.0, 7.1, 7.2]}),
+        ResultDict(name='gasflow', value={'q_gas': [0.0, 1.5, 2.5]})])
+
+
+def test_select_fields_keeps_the_named_columns(result):
+    selected = select_fields(result, ['pH', 'q_gas'])
+    assert [(item.name, item.value) for item in selected.results] == [('simulate_results', {'pH': [7.0, 7.1, 7.2]}), ('gasflow', {'q_gas': [0.0, 1.5, 2.5]})]
+    assert [item.name for item in select_fields(result, ['pH']).results] == ['simulate_results']
+    assert len(result.results[0].value) == 2
+
+
+def test_select_fields_rejects_unknown_names(result):
+    with pytest.raises(CSTRException, match='Unknown fields qgas'):
+        select_fields(result, ['q_gas', 'qgas'])
+
+
+@pytest.mark.parametrize('dtype', ['float64', 'float32'])
+def test_npz_round_trip(result, dtype):
+    with np.load(io.BytesIO(to_npz(result, dtype))) as npz:
+        assert sorted(npz.files) == ['execution_days', 'gasflow/q_gas', 'simulate_results/S_su', 'simulate_results/pH', 'status_code', 'stopped_by', 'trh']
+        assert (npz['status_code'], npz['trh'], npz['execution_days'], str(npz['stopped_by'])) == (2, 23.3, 2, 'max_rhs_evals')
+        for item in result.results:
+            for name, column in item.value.items():
+                assert npz['{}/{}'.format(item.name, name)].dtype == dtype
+                np.testing.assert_array_equal(npz['{}/{}'.format(item.name, name)], np.array(column, dtype=dtype))
+
+
+def test_run_with_unknown_fields_is_a_bad_request(client, user_input):
+    response = client.post('/api/v1/cstr/run', json=user_input, params={'fields': 'q_gas,qgas'})
+    assert response.status_code == 400
+    assert 'qgas' in response.json()['detail']
+
+
+def test_run_fields_match_the_full_result(client, user_input, run):
+    selected = client.post('/api/v1/cstr/run', json=user_input, params={'fields': 'q_gas,pH'}).json()
+    columns = {(item['name'], name): column for item in run['results'] for name, column in item['value'].items()}
+    assert {(item['name'], name): column for item in selected['results'] for name, column in item['value'].items()} == \
+           {key: columns[key] for key in (('simulate_results', 'pH'), ('gasflow', 'q_gas'))}
+
+
+def test_run_as_npz_matches_its_json(client, user_input, run):
+    response = client.post('/api/v1/cstr/run', json=user_input, params={'fields': 'q_gas,pH', 'dtype': 'float32'}, headers={'Accept': NPZ_MEDIA_TYPE})
+    assert response.status_code == 200
+    assert response.headers['content-type'] == NPZ_MEDIA_TYPE
+    columns = {(item['name'], name): column for item in run['results'] for name, column in item['value'].items()}
+    with np.load(io.BytesIO(response.content)) as npz:
+        assert npz['status_code'] == run['status_code']
+        assert npz['execution_days'] == run['execution_days']
+        for result, name in (('gasflow', 'q_gas'), ('simulate_results', 'pH')):
+            np.testing.assert_array_equal(npz['{}/{}'.format(result, name)], np.array(columns[(result, name)], dtype='float32'))
@@ -0,0 +1,76 @@
+"""
+Tests of the job API on CSTR_body.json: the expected days of dynamic and
+steady-state jobs, the result of a finished job and the cancellation of a
+job before its end.
+"""
+import json
+import time
+from os import path
+import pytest
+from fastapi.testclient import TestClient
+from CSTR_service.main import app
+from CSTR_service.core.service.jobs import jobs
+
+BODY_PATH = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'CSTR_body.json')
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope='module')
+def user_input():
+    with open(BODY_PATH) as f:
+        return dict(json.load(f), uncertainty='off')
+
+
+def wait(client, job_id, timeout=120):
+    """Polls a job until it ends, with the days simulated seen along the way."""
+    days = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get('/api/v1/cstr/jobs/{}'.format(job_id)).json()
+        days.append(job['days_simulated'])
+        if job['status'] in ('finished', 'failed', 'cancelled'):
+            return job, days
+        time.sleep(0.05)
+    raise TimeoutError(job_id)
+
+
+def test_dynamic_job_reports_its_progress_and_result(client, user_input):
+    response = client.post('/api/v1/cstr/jobs', json=user_input)
+    assert response.status_code == 202
+    assert response.json()['expected_days'] == int(user_input['V_liq']/user_input['q_ad']*jobs.max_trh) + 1
+
+    job, days = wait(client, response.json()['id'])
+    assert job['status'] == 'finished'
+    assert job['error'] is None
+    assert days == sorted(days)
+    assert job['days_simulated'] == job['result']['execution_days'] <= job['expected_days']
+    assert job['result']['status_code'] == 0
+
+
+def test_steady_state_job_expects_its_seed_days_and_iterations(client, user_input):
+    response = client.post('/api/v1/cstr/jobs', json=dict(user_input, mode='steady_state'))
+    assert response.json()['expected_days'] == jobs.seed_days + jobs.max_iter
+    job, _ = wait(client, response.json()['id'])
+    assert job['status'] == 'finished'
+
+
+def test_cancelled_job_ends_with_its_partial_result(client, user_input):
+    job_id = client.post('/api/v1/cstr/jobs', json=user_input).json()['id']
+    response = client.post('/api/v1/cstr/jobs/{}/cancel'.format(job_id))
+    assert response.status_code == 202
+    job, _ = wait(client, job_id)
+    assert job['status'] == 'cancelled'
+    # queued, the job never started; running, it stopped before its next day
+    if job['result'] is not None:
+        assert job['result']['status_code'] == 2
+        assert job['result']['stopped_by'] == 'cancelled'
+
+
+def test_unknown_job_is_not_found(client):
+    assert client.get('/api/v1/cstr/jobs/unknown').status_code == 404
+    assert client.post('/api/v1/cstr/jobs/unknown/cancel').status_code == 404
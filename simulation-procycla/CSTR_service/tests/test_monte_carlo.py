@@ -0,0 +1,70 @@
+"""
+Tests of /cstr/monte-carlo on CSTR_body.json: seeded requests are
+reproducible, the bands are ordered and bracket the nominal run, and the
+sampling stops early once the bands converge.
+"""
+import json
+from os import path
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from CSTR_service.main import app
+from CSTR_service.core.simulation.ADM1 import ADM1
+from CSTR_service.core.service.cstr_service import CSTRService
+
+BODY_PATH = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'CSTR_body.json')
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope='module')
+def data():
+    with open(BODY_PATH) as f:
+        body = {name: value for name, value in json.load(f).items() if name != 'uncertainty'}
+    return dict(body, BoSE=10.0, KhSE=0.05, BoKhCovariance=0.1, mode='steady_state', samples=32, seed=1)
+
+
+@pytest.fixture(scope='module')
+def result(client, data):
+    response = client.post('/api/v1/cstr/monte-carlo', json=data)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_seeded_requests_are_reproducible(client, data, result):
+    assert client.post('/api/v1/cstr/monte-carlo', json=data).json() == result
+    assert client.post('/api/v1/cstr/monte-carlo', json=dict(data, seed=2)).json() != result
+
+
+def test_bands_bracket_the_nominal_run(data, result):
+    assert result['samples'] == data['samples']
+    assert result['failed'] == 0
+    nominal = ADM1().steady_state_simulation(dict(data, uncertainty='off', progress_url=None, result_url=None))['result']
+    final = {'q_gas': nominal['gasflow']['q_gas'][-1], 'pH': nominal['simulate_results']['pH'][-1]}
+    for band in result['bands']:
+        assert band['percentiles'] == [2.5, 50.0, 97.5]
+        values = np.array(band['values'])
+        assert np.all(np.diff(values, axis=0) >= 0)
+        assert values[0, -1] <= final[band['name']] <= values[-1, -1]
+
+
+def test_sampling_stops_once_the_bands_converge(client, data):
+    result = client.post('/api/v1/cstr/monte-carlo', json=dict(data, samples=512, tol=1.0)).json()
+    assert result['converged']
+    # the bands of two rounds are compared
+    assert result['samples'] < 512
+
+
+def test_samples_are_positive():
+    draws = CSTRService(ADM1()).draw_samples(np.random.default_rng(0), [1.0, 0.5], [[1.0, 0.0], [0.0, 1.0]], 100)
+    assert len(draws) == 100
+    assert np.all(np.array(draws) > 0)
+
+
+def test_short_curves_hold_their_last_value():
+    band = CSTRService(ADM1()).percentile_band([[1.0, 2.0, 3.0], [1.0, 4.0]], [0, 100])
+    np.testing.assert_array_equal(band, [[1.0, 2.0, 3.0], [1.0, 4.0, 4.0]])
@@ -0,0 +1,35 @@
+"""
+Tests of the ProgressReporter across a fork: a forked worker gets a lock and
+queues of its own.
+"""
+import os
+import time
+from CSTR_service.core.service.progress import ProgressReporter
+
+UNREACHABLE = 'http://127.0.0.1:9/'
+
+
+def wait_child(pid, timeout=10.0):
+    """Exit status of the child pid, None when it is still running after timeout (and killed)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            return os.waitstatus_to_exitcode(status)
+        time.sleep(0.01)
+    os.kill(pid, 9)
+    os.waitpid(pid, 0)
+    return None
+
+
+def test_worker_forked_while_the_lock_is_held():
+    reporter = ProgressReporter(timeout=0.1, min_interval=0.0, max_queue=10)
+    # a pending result of the parent, its sender thread holding the lock
+    reporter.results.append((UNREACHABLE, {'status_code': 0}))
+    with reporter.condition:
+        pid = os.fork()
+        if pid == 0:
+            inherited = len(reporter.results) + len(reporter.latest)
+            reporter.progress({'days_simulated': 1}, UNREACHABLE)
+            os._exit(inherited)
+    assert wait_child(pid) == 0
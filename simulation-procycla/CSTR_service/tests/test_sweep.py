@@ -0,0 +1,76 @@
+"""
+Tests of /cstr/sweep on CSTR_body.json: the layout of the table, every line
+stopping at its first failed point, and warm-started points against runs
+from initial_values.csv.
+"""
+import json
+from os import path
+import pytest
+from fastapi.testclient import TestClient
+from CSTR_service.main import app
+from CSTR_service.core.simulation.ADM1 import ADM1
+
+BODY_PATH = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'CSTR_body.json')
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope='module')
+def data():
+    with open(BODY_PATH) as f:
+        body = {name: value for name, value in json.load(f).items() if name != 'uncertainty'}
+    # up to six times the load of the body, past its failure boundary
+    return dict(body, ranges={'q_ad': {'start': body['q_ad']*0.5, 'stop': body['q_ad']*6, 'points': 8},
+                              'Bo': {'start': 200.0, 'stop': 350.0, 'points': 2}})
+
+
+@pytest.fixture(scope='module')
+def table(client, data):
+    response = client.post('/api/v1/cstr/sweep', json=data)
+    assert response.status_code == 200
+    return response.json()
+
+
+def lines(table, points):
+    """Rows of the table grouped by line, as dicts."""
+    rows = [dict(zip(table, row)) for row in zip(*table.values())]
+    return [rows[i:i + points] for i in range(0, len(rows), points)]
+
+
+def test_table_has_a_row_per_grid_point(table):
+    assert all(len(column) == 16 for column in table.values())
+    for line, Bo in zip(lines(table, 8), (200.0, 350.0)):
+        assert [row['Bo'] for row in line] == [Bo]*8
+        assert [row['q_ad'] for row in line] == sorted(row['q_ad'] for row in line)
+
+
+def test_lines_stop_at_their_first_failure(table):
+    for line in lines(table, 8):
+        codes = [row['status_code'] for row in line]
+        failure = codes.index(1)
+        assert failure > 0
+        assert codes == [0]*failure + [1] + [2]*(len(codes) - failure - 1)
+        assert all(row['pH'] >= 6.0 for row in line[:failure])
+        assert all(row[name] is None for row in line[failure + 1:] for name in ('days_simulated', 'q_gas', 'CH4', 'pH'))
+        gas = [row['q_gas'] for row in line[:failure]]
+        assert gas == sorted(gas)
+
+
+def test_warm_started_points_match_cold_runs(data, table):
+    adm1 = ADM1()
+    for row in lines(table, 8)[1][1:3]:
+        user_input = dict(data, q_ad=row['q_ad'], Bo=row['Bo'], uncertainty='off', progress_url=None, result_url=None)
+        result = adm1.steady_state_simulation(user_input)
+        assert row['q_gas'] == pytest.approx(result['result']['gasflow']['q_gas'][-1], rel=1e-6)
+        assert row['pH'] == pytest.approx(result['result']['simulate_results']['pH'][-1], abs=1e-6)
+
+
+def test_sweep_over_max_points_is_rejected(client, data):
+    ranges = {'q_ad': {'start': 0.001, 'stop': 0.01, 'points': 30}, 'COD': {'start': 10.0, 'stop': 80.0, 'points': 30}}
+    response = client.post('/api/v1/cstr/sweep', json=dict(data, ranges=ranges))
+    assert response.status_code == 400
+    assert 'at most' in response.json()['detail']
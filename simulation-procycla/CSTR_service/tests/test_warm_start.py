@@ -0,0 +1,121 @@
+"""
+Tests of the warm starts: the nearest-neighbour lookup of WarmStartCache,
+warm starts only for 'off' runs that ask for one, and a warm-started run
+converging sooner to the operating point of a cold one.
+"""
+import json
+from concurrent.futures import Future
+from os import path
+import pytest
+from fastapi.testclient import TestClient
+from CSTR_service.main import app
+from CSTR_service.core.schemas.cstr_data import CSTRData
+from CSTR_service.core.schemas.cstr_result import CSTRResult, ResultDict
+from CSTR_service.core.service import cstr_service
+from CSTR_service.core.service.cache import ResultCache
+from CSTR_service.core.service.warm_start import WarmStartCache, WARM_START_INPUTS
+
+BODY_PATH = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'CSTR_body.json')
+
+
+@pytest.fixture(scope='module')
+def user_input():
+    with open(BODY_PATH) as f:
+        return CSTRData(**dict(json.load(f), uncertainty='off')).dict()
+
+
+def test_nearest_state_within_max_distance(user_input):
+    states = WarmStartCache(2, 0.25)
+    assert states.nearest(user_input) is None
+    states.store('a', user_input, [1.0])
+    states.store('b', dict(user_input, q_ad=user_input['q_ad']*1.2), [2.0])
+    assert states.nearest(dict(user_input, q_ad=user_input['q_ad']*1.05)) == [1.0]
+    assert states.nearest(dict(user_input, q_ad=user_input['q_ad']*1.15)) == [2.0]
+    # log-distances: twice the load is 0.69 away
+    assert states.nearest(dict(user_input, q_ad=user_input['q_ad']*2)) is None
+
+
+def test_least_recently_used_states_are_evicted(user_input):
+    states = WarmStartCache(2, 0.25)
+    for key, COD in (('a', 60.0), ('b', 63.0), ('c', 66.0)):
+        states.store(key, dict(user_input, COD=COD), [COD])
+    assert list(states.entries) == ['b', 'c']
+    assert len(states.entries['b'][0]) == len(WARM_START_INPUTS)
+
+
+def test_max_states_0_disables_the_cache(user_input):
+    states = WarmStartCache(0, 0.25)
+    states.store('a', user_input, [1.0])
+    assert states.nearest(user_input) is None
+
+
+class Spy:
+    """Executor and warm-start cache of submit_adm1, recording their calls."""
+
+    def __init__(self, status_code=0):
+        self.status_code = status_code
+        self.submitted = []
+        self.looked_up = []
+        self.stored = []
+
+    def submit(self, fn, user_input, token, reservation=None):
+        self.submitted.append(user_input)
+        future = Future()
+        future.set_result(CSTRResult(status_code=self.status_code, trh=20.0, execution_days=3, results=[
+            ResultDict(name='simulate_results', value={'S_su': [0.1, 0.2], 'pH': [7.0, 7.1]})]))
+        return future
+
+    def nearest(self, user_input):
+        self.looked_up.append(user_input)
+        return [0.2, 7.1]
+
+    def store(self, key, user_input, state):
+        self.stored.append(state)
+
+
+@pytest.fixture
+def spy(monkeypatch):
+    spy = Spy()
+    monkeypatch.setattr(cstr_service, 'executor', spy)
+    monkeypatch.setattr(cstr_service, 'warm_starts', spy)
+    monkeypatch.setattr(cstr_service, 'cache', ResultCache(1 << 20))
+    return spy
+
+
+def test_warm_start_is_opt_in(spy, user_input):
+    cstr_service.submit_adm1(user_input).result()
+    assert spy.looked_up == []
+    assert 'state_zero' not in spy.submitted[0]
+    # converged off runs are stored for later runs either way
+    assert spy.stored == [[0.2, 7.1]]
+
+    cstr_service.submit_adm1(dict(user_input, warm_start=True, q_ad=user_input['q_ad']*1.1)).result()
+    assert len(spy.looked_up) == 1
+    assert spy.submitted[1]['state_zero'] == [0.2, 7.1]
+
+
+@pytest.mark.parametrize('uncertainty', ['bo', 'kh', 'sensitivity'])
+def test_delta_runs_never_warm_start(spy, user_input, uncertainty):
+    cstr_service.submit_adm1(dict(user_input, uncertainty=uncertainty, warm_start=True)).result()
+    assert spy.looked_up == []
+    assert 'state_zero' not in spy.submitted[0]
+    assert spy.stored == []
+
+
+def test_unconverged_runs_are_not_stored(spy, user_input):
+    spy.status_code = 1
+    cstr_service.submit_adm1(user_input).result()
+    assert spy.stored == []
+
+
+def test_warm_started_run_converges_sooner(user_input):
+    nearby = dict(user_input, q_ad=user_input['q_ad']*1.05, progress_url=None, result_url=None)
+    with TestClient(app) as client:
+        assert client.post('/api/v1/cstr/run', json=user_input).status_code == 200
+        cold = client.post('/api/v1/cstr/run', json=nearby).json()
+        warm = client.post('/api/v1/cstr/run', json=dict(nearby, warm_start=True)).json()
+    assert warm['status_code'] == cold['status_code'] == 0
+    assert warm['execution_days'] < cold['execution_days']
+    final = [{result['name']: result['value'] for result in run['results']} for run in (warm, cold)]
+    assert final[0]['gasflow']['q_gas'][-1] == pytest.approx(final[1]['gasflow']['q_gas'][-1], rel=1e-2)
+    assert final[0]['simulate_results']['pH'][-1] == pytest.approx(final[1]['simulate_results']['pH'][-1], abs=1e-2)